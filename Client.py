@@ -3,8 +3,16 @@ import tkinter.messagebox
 from PIL import Image, ImageTk
 import socket, threading, sys, traceback, os, time
 from RtpPacket import RtpPacket
-from FragmentationHandler import FragmentationHandler, FragmentationHeader
+from FragmentationHandler import FragmentationHandler
+from FrameAssembler import FrameAssembler
 from NetworkAnalytics import NetworkAnalytics
+from JitterBuffer import JitterBuffer
+from SocketOptions import DEFAULT_RCVBUF, SocketOptions, discover_mtu, rtp_receiver_socket
+from FrameDecoder import FrameDecoder
+from JpegRtp import FORMAT_FRAGMENTED
+from StructuredLogging import get_logger
+
+log = get_logger("Client")
 
 CACHE_FILE_NAME = "cache-"
 CACHE_FILE_EXT = ".jpg"
@@ -20,7 +28,9 @@ class Client:
     PAUSE = 2
     TEARDOWN = 3
 
-    def __init__(self, master, serveraddr, serverport, rtpport, filename, hd_mode=False):
+    def __init__(self, master, serveraddr, serverport, rtpport, filename, hd_mode=False,
+                 cache_frames=False, max_latency=0.3, speed=1.0, fast_start=0.25,
+                 socket_options=None, mtu=None, payload_format=FORMAT_FRAGMENTED):
         self.master = master
         self.master.protocol("WM_DELETE_WINDOW", self.handler)
         self.serverAddr = serveraddr
@@ -38,19 +48,51 @@ class Client:
         
         # HD streaming support
         self.hd_mode = hd_mode
-        self.fragmentation_handler = FragmentationHandler()
+        # Debug mode: round-trip every frame through cache-<session>.jpg
+        self.cache_frames = cache_frames
+        self.speed = speed  # Requested playback speed (RTSP Scale)
+        self.fast_start = fast_start  # Seconds of media requested up front on PLAY
+        # RTP socket options; a large receive buffer absorbs HD frame bursts
+        self.socket_options = socket_options or SocketOptions(rcvbuf=DEFAULT_RCVBUF)
+        # Path MTU to ask the server to packetize for: None for Ethernet's
+        # 1500, "auto" for the kernel's path MTU towards the server
+        if mtu == "auto":
+            mtu = discover_mtu((self.serverAddr, self.serverPort))
+        self.fragmentation_handler = FragmentationHandler(mtu or FragmentationHandler.STANDARD_MTU)
+        # Payload format asked for at SETUP; the server's reply settles it
+        self.payload_format = payload_format
         self.network_analytics = NetworkAnalytics()
-        self.last_seq_num = -1
         
-        # Frame reassembly buffer
-        self.reassembly_buffer = {}
+        # Frame assembly from sequence numbers and marker bits; frames with
+        # missing packets are dropped before they reach the decoder
+        self.frame_assembler = FrameAssembler(on_drop=self.network_analytics.record_frame_loss)
         
-        # Low-latency playback buffer
-        self.frame_queue = []
-        self.max_queue_size = 3
+        # Adaptive playout buffer keyed by RTP timestamp; once the backlog
+        # exceeds max_latency it jumps to the newest frame (catch-up mode)
+        self.jitter_buffer = JitterBuffer(
+            max_delay=max_latency / 2,
+            catch_up_threshold=max_latency,
+            on_skip=self.network_analytics.record_frames_skipped,
+        )
         self.queue_lock = threading.Lock()
         self.display_started = False
+        self.max_display_interval = 0.033  # Poll bound while waiting for frames
+        self.decode_poll_interval = 0.005   # Poll while a decode is in flight
+
+        # Decode and resize off the Tk main thread; the cache-file debug
+        # mode shares one file so it gets a single worker
+        self.display_height = 288
+        self.frame_decoder = FrameDecoder(
+            workers=1 if cache_frames else 2,
+            target_size=(512, self.display_height),
+            opener=self.openCachedFrame if cache_frames else None,
+            on_skip=self.network_analytics.record_frames_skipped,
+        )
+        # The RTP listener runs from the first PLAY to TEARDOWN; while paused
+        # it keeps draining the socket but drops what arrives
         self.rtp_thread_stop_event = threading.Event()
+        self.rtp_receiving = threading.Event()
+        self.rtp_listener = None
 
         # Analytics display
         self.stats_update_interval = 1.0 # seconds
@@ -96,7 +138,9 @@ class Client:
             self.sendRtspRequest(self.SETUP)
 
     def exitClient(self):
+        self.rtp_thread_stop_event.set()
         self.sendRtspRequest(self.TEARDOWN)
+        self.frame_decoder.shutdown()
         self.master.destroy()
         try:
             os.remove(CACHE_FILE_NAME + str(self.sessionId) + CACHE_FILE_EXT)
@@ -105,74 +149,53 @@ class Client:
 
     def pauseMovie(self):
         if self.state == self.PLAYING:
-            self.rtp_thread_stop_event.set()
+            self.rtp_receiving.clear()
             self.sendRtspRequest(self.PAUSE)
             
             # Reset flags for playback restart
             with self.queue_lock:
                 self.display_started = False  # allow playback to restart
-                self.frame_queue.clear()      # optionally clear old frames
+            # Media clock restarts from the resume point; the learned delay stays
+            self.jitter_buffer.reset(keep_delay=True)
 
                 
     def playMovie(self):
         if self.state == self.READY:
-            self.rtp_thread_stop_event.clear()
             self.playEvent.clear()  # reset event for new playback
 
-            threading.Thread(target=self.listenRtp, daemon=True).start()
+            # The server may front-load the first frames; they must not skew the clock
+            self.jitter_buffer.expect_burst(self.fast_start)
+            self.rtp_receiving.set()
+            if self.rtp_listener is None:
+                self.rtp_listener = threading.Thread(target=self.listenRtp, daemon=True)
+                self.rtp_listener.start()
             self.sendRtspRequest(self.PLAY)
 
     def listenRtp(self):
         """Listen for RTP packets with fragmentation support and low-latency buffering."""
-        print("RTP Listener started.")
+        log.info("RTP listener started", port=self.rtpPort)
         while not self.rtp_thread_stop_event.is_set():
             try:
-                data = self.rtpSocket.recv(20480)
+                data = self.rtpSocket.recv(65536)  # Any negotiated packet size
+                if not self.rtp_receiving.is_set():
+                    # Paused: still in flight from before PAUSE; the sequence
+                    # numbers dropped here must not hold up the next frame
+                    self.frame_assembler.reset()
+                    continue
                 if data:
                     rtpPacket = RtpPacket()
                     rtpPacket.decode(data)
-                    currFrameNbr = rtpPacket.seqNum()
-                    payload = rtpPacket.getPayload()
-                    
-                    # Disable false packet loss reporting (fragmentation causes seq gaps)
-                    if self.last_seq_num >= 0 and currFrameNbr < self.last_seq_num:
-                        print("Out-of-order packet detected")
-                    self.last_seq_num = currFrameNbr
-
-                    # Try to extract fragmentation header
-                    frag_header = FragmentationHeader()
-                    if len(payload) >= FragmentationHeader.HEADER_SIZE:
-                        if frag_header.decode(payload[:FragmentationHeader.HEADER_SIZE]):
-                            # Fragmented payload
-                            frame_payload = payload[FragmentationHeader.HEADER_SIZE:]
-                            
-                            # Try to reassemble
-                            complete_frame = self.fragmentation_handler.add_fragment(
-                                frag_header.fragment_id, 
-                                frag_header, 
-                                frame_payload
-                            )
-                            
-                            if complete_frame:
-                                # Frame is complete
-                                self.frameNbr = frag_header.fragment_id
-                                self.network_analytics.record_frame_received(
-                                    frag_header.fragment_id, 
-                                    len(complete_frame)
-                                )
-                                self.add_to_queue(complete_frame)
-                        else:
-                            # Not fragmented, use as-is
-                            if currFrameNbr > self.frameNbr:
-                                self.frameNbr = currFrameNbr
-                                self.network_analytics.record_frame_received(currFrameNbr, len(payload))
-                                self.add_to_queue(payload)
-                    else:
-                        # Small payload, not fragmented
-                        if currFrameNbr > self.frameNbr:
-                            self.frameNbr = currFrameNbr
-                            self.network_analytics.record_frame_received(currFrameNbr, len(payload))
-                            self.add_to_queue(payload)
+                    # Frames come out whole: seq-contiguous up to the marker packet,
+                    # joined by the payload format the payload type names
+                    assembled = self.frame_assembler.add(rtpPacket)
+                    if assembled is not None:
+                        frame, rtp_timestamp, send_time = assembled
+                        self.frameNbr += 1
+                        self.network_analytics.record_frame_received(
+                            self.frameNbr, len(frame),
+                            rtp_timestamp=rtp_timestamp, send_time=send_time
+                        )
+                        self.add_to_queue(frame, rtp_timestamp, send_time)
                     
                     # Update statistics display
                     current_time = time.time()
@@ -184,7 +207,7 @@ class Client:
                 continue
             except Exception as e:
                 if self.teardownAcked == 1:
-                    print("RTP Listener stopping due to Teardown.")
+                    log.info("RTP listener stopping due to teardown")
                     self.rtpSocket.shutdown(socket.SHUT_RDWR)
                     self.rtpSocket.close()
                     break
@@ -192,28 +215,20 @@ class Client:
                 if self.rtp_thread_stop_event.is_set():
                     break
 
-        print("RTP Listener stopped.")
+        log.info("RTP listener stopped")
     
-    def add_to_queue(self, frame_data):
-        """Add frame to low-latency queue (Client-Side Caching Logic)."""
+    def add_to_queue(self, frame_data, rtp_timestamp, send_time=None):
+        """Add a complete frame to the jitter buffer and start playout."""
+        self.jitter_buffer.push(rtp_timestamp, frame_data, send_time)
         with self.queue_lock:
-            # 1. Quản lý kích thước queue (FIFO)
-            if len(self.frame_queue) >= self.max_queue_size:
-                self.frame_queue.pop(0)  # Remove oldest
-            self.frame_queue.append(frame_data)
-            
-            if (len(self.frame_queue) == self.max_queue_size) and (not self.display_started):
-                print(f"Pre-buffer complete: starting playback with {self.max_queue_size} frames.")
+            if not self.display_started:
                 self.display_started = True
-                # Bắt đầu vòng lặp hiển thị frame trên luồng chính (Main Thread)
-                self.master.after(1, self.display_queued_frames) 
+                # Playout delay is handled by the jitter buffer deadlines
+                self.master.after(1, self.display_queued_frames)
     
     def get_queued_frame(self):
-        """Get next frame from queue (FIFO)."""
-        with self.queue_lock:
-            if self.frame_queue:
-                return self.frame_queue.pop(0)
-        return None
+        """Get the frame due for display, if any."""
+        return self.jitter_buffer.pop()
 
     def writeFrame(self, data):
         cachename = CACHE_FILE_NAME + str(self.sessionId) + CACHE_FILE_EXT
@@ -221,28 +236,50 @@ class Client:
             file.write(data)
         return cachename
 
-    def updateMovie(self, imageFile):
+    def openCachedFrame(self, data):
+        """Open a frame via the cache file (debug mode)."""
+        return Image.open(self.writeFrame(data))
+
+    def displaySize(self):
+        """Return the (width, height) frames are scaled to."""
+        width = self.label.winfo_width()
+        return (width if width > 1 else 512, self.display_height)
+
+    def updateMovie(self, image):
         """Update movie display with low-latency frame."""
         try:
-            photo = ImageTk.PhotoImage(Image.open(imageFile))
-            self.label.configure(image=photo, height=288)
+            photo = ImageTk.PhotoImage(image)
+            self.label.configure(image=photo, height=self.display_height)
             self.label.image = photo
         except Exception as e:
-            print(f"Error updating movie: {e}")
+            log.warning("error updating movie", error=e)
     
     def display_queued_frames(self):
         """Display queued frames for low-latency playback."""
-        frame_data = self.get_queued_frame()
-        if frame_data:
-            try:
-                cache_name = self.writeFrame(frame_data)
-                self.updateMovie(cache_name)
-            except Exception as e:
-                print(f"Error displaying frame: {e}")
+        frame = self.get_queued_frame()
+        if frame:
+            self.frame_decoder.set_target_size(self.displaySize())
+            self.frame_decoder.submit(frame.data, frame.send_time)
         
-        # Schedule next display
+        # Main thread only blits images the decode workers have finished
+        decoded = self.frame_decoder.take_ready()
+        if decoded:
+            self.updateMovie(decoded.image)
+            self.network_analytics.record_frame_displayed(decoded.send_time)
+        
+        # Wake up at the next playout deadline
         if self.state == self.PLAYING and not self.playEvent.isSet():
-            self.master.after(33, self.display_queued_frames) # ~30 FPS
+            wait = self.jitter_buffer.time_until_next()
+            if wait is None:
+                wait = self.max_display_interval
+            if self.frame_decoder.pending():
+                wait = min(wait, self.decode_poll_interval)
+            delay_ms = max(1, int(min(wait, self.max_display_interval) * 1000))
+            self.master.after(delay_ms, self.display_queued_frames)
+        else:
+            # Let the next arriving frame restart playout
+            with self.queue_lock:
+                self.display_started = False
     
     def update_stats_display(self):
         """Update network statistics display."""
@@ -252,7 +289,10 @@ class Client:
             f"Packet Loss: {stats['packet_loss_rate']} | "
             f"Latency: {stats['average_latency_ms']}ms | "
             f"Bitrate: {stats['current_bitrate_mbps']}Mbps | "
-            f"Jitter: {stats['jitter_ms']}ms"
+            f"Jitter: {stats['interarrival_jitter_ms']}ms | "
+            f"Skipped: {stats['frames_skipped']} | "
+            f"Dropped: {self.frame_assembler.frames_dropped} | "
+            f"G2G p95: {stats['glass_to_glass_p95_ms']}ms"
         )
         self.stats_label.config(text=stats_text)
 
@@ -272,12 +312,20 @@ class Client:
             self.rtspSeq += 1
             # Add resolution header for HD mode
             resolution_header = "\nResolution: 1080p" if self.hd_mode else ""
-            request = f"SETUP {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nTransport: RTP/UDP; client_port={self.rtpPort}{resolution_header}"
+            # Blocksize: RTP payload bytes per packet that fit our path MTU
+            blocksize = FragmentationHandler.blocksize_for_mtu(self.fragmentation_handler.mtu)
+            format_header = (f"\nPayload-Format: {self.payload_format}"
+                             if self.payload_format != FORMAT_FRAGMENTED else "")
+            request = (f"SETUP {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nTransport: RTP/UDP; "
+                       f"client_port={self.rtpPort}{resolution_header}\nBlocksize: {blocksize}"
+                       f"{format_header}")
             self.requestSent = self.SETUP
 
         elif requestCode == self.PLAY and self.state == self.READY:
             self.rtspSeq += 1
-            request = f"PLAY {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nSession: {self.sessionId}"
+            scale_header = f"\nScale: {self.speed:g}" if self.speed != 1.0 else ""
+            fast_start_header = f"\nFast-Start: {self.fast_start:g}" if self.fast_start > 0 else ""
+            request = f"PLAY {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nSession: {self.sessionId}{scale_header}{fast_start_header}"
             self.requestSent = self.PLAY
 
         elif requestCode == self.PAUSE and self.state == self.PLAYING:
@@ -293,7 +341,7 @@ class Client:
             return
 
         self.rtspSocket.send(request.encode())
-        print("\nData sent:\n" + request)
+        log.debug("RTSP request sent", request=request)
 
     def recvRtspReply(self):
         while True:
@@ -310,6 +358,11 @@ class Client:
         seqNum = int(lines[1].split(" ")[1])
 
         if seqNum == self.rtspSeq:
+            status = int(lines[0].split(" ")[1])
+            if status != 200:
+                # Errors carry no session; the request simply did not happen
+                log.warning("RTSP request failed", status=lines[0].split(" ", 1)[1].strip())
+                return
             session = int(lines[2].split(" ")[1])
             if self.sessionId == 0:
                 self.sessionId = session
@@ -317,9 +370,26 @@ class Client:
                 if int(lines[0].split(" ")[1]) == 200:
                     if self.requestSent == self.SETUP:
                         self.state = self.READY
+                        # The server may have settled on smaller packets
+                        for line in lines:
+                            if line.startswith("Blocksize:"):
+                                try:
+                                    blocksize = int(line.split(":", 1)[1])
+                                except ValueError:
+                                    log.warning("ignoring malformed Blocksize", header=line)
+                                    break
+                                self.fragmentation_handler.set_blocksize(blocksize)
+                        # Servers that do not know the header send the fragmented format
+                        self.payload_format = next(
+                            (line.split(":", 1)[1].strip() for line in lines
+                             if line.startswith("Payload-Format:")), FORMAT_FRAGMENTED)
                         self.openRtpPort()
                     elif self.requestSent == self.PLAY:
                         self.state = self.PLAYING
+                        # The server echoes the burst it grants (none if absent)
+                        granted = next((line.split(":", 1)[1] for line in lines
+                                        if line.startswith("Fast-Start:")), "0")
+                        self.jitter_buffer.expect_burst(float(granted))
                     elif self.requestSent == self.PAUSE:
                         self.state = self.READY
                     elif self.requestSent == self.TEARDOWN:
@@ -327,14 +397,15 @@ class Client:
                         self.teardownAcked = 1
 
     def openRtpPort(self):
-        self.rtpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.rtpSocket.settimeout(0.5)
         try:
-            self.rtpSocket.bind(("", self.rtpPort))
-        except:
+            self.rtpSocket = rtp_receiver_socket(self.rtpPort, self.socket_options)
+        except OSError:
             tkinter.messagebox.showwarning(
                 "Unable to Bind", f"Unable to bind PORT={self.rtpPort}"
             )
+            # Unbound, so listenRtp just times out until TEARDOWN
+            self.rtpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rtpSocket.settimeout(0.5)
 
     def handler(self):
         self.pauseMovie()
@@ -1,6 +1,9 @@
 import sys
 from tkinter import Tk
 from Client import Client
+from JpegRtp import FORMAT_FRAGMENTED
+from SocketOptions import DEFAULT_RCVBUF, SocketOptions
+from StructuredLogging import setup_logging
 
 if __name__ == "__main__":
     try:
@@ -8,17 +11,36 @@ if __name__ == "__main__":
         serverPort = sys.argv[2]
         rtpPort = sys.argv[3]
         fileName = sys.argv[4]
-        hd_mode = False
-        if len(sys.argv) > 5 and sys.argv[5].lower() == "--hd":
-            hd_mode = True
+        options = [arg.lower() for arg in sys.argv[5:]]
+        hd_mode = "--hd" in options
+        cache_frames = "--cache-frames" in options
+        speed = float(next((arg.split("=", 1)[1] for arg in options
+                            if arg.startswith("--speed=")), 1.0))
+        fast_start = float(next((arg.split("=", 1)[1] for arg in options
+                                 if arg.startswith("--fast-start=")), 0.25))
+        # e.g. --rtp-socket=rcvbuf=8388608,dscp=af41
+        socket_options = SocketOptions.from_spec(
+            next((arg.split("=", 1)[1] for arg in options if arg.startswith("--rtp-socket=")), ""),
+            base=SocketOptions(rcvbuf=DEFAULT_RCVBUF))
+        # --mtu=9000 for jumbo frames, --mtu=auto to use the path MTU to the server
+        mtu = next((arg.split("=", 1)[1] for arg in options if arg.startswith("--mtu=")), None)
+        if mtu is not None and mtu != "auto":
+            mtu = int(mtu)
+        # --payload-format=rfc2435 receives standard RTP/JPEG (RFC 2435)
+        payload_format = next((arg.split("=", 1)[1] for arg in options
+                               if arg.startswith("--payload-format=")), FORMAT_FRAGMENTED)
     except:
         print(
-            "[Usage: ClientLauncher.py Server_name Server_port RTP_port Video_file [--hd]]\n"
+            "[Usage: ClientLauncher.py Server_name Server_port RTP_port Video_file [--hd] [--cache-frames] [--speed=N] [--fast-start=S] [--rtp-socket=SPEC] [--mtu=N|auto] [--payload-format=fragmented|rfc2435]]\n"
         )
 
+    setup_logging()
     root = Tk()
 
     # Create a new client
-    app = Client(root, serverAddr, serverPort, rtpPort, fileName, hd_mode=hd_mode)
+    app = Client(root, serverAddr, serverPort, rtpPort, fileName, hd_mode=hd_mode,
+                 cache_frames=cache_frames, speed=speed, fast_start=fast_start,
+                 socket_options=socket_options, mtu=mtu,
+                 payload_format=payload_format)
     app.master.title(f"RTPClient {'(HD Mode)' if hd_mode else ''}")
     root.mainloop()
@@ -0,0 +1,190 @@
+"""
+ContainerStream.py - Length-prefixed binary MJPEG container
+Layout: a 24-byte file header (magic "RTPF", version, header size,
+width, height, fps as a fraction, frame count) followed by frames, each
+an 8-byte header (32-bit size, 32-bit 90 kHz timestamp) and the JPEG
+data. A frame is read together with the next frame's header, so playback
+costs one readinto() per frame
+"""
+import struct
+from fractions import Fraction
+from typing import Optional, Tuple
+
+from FrameCache import FRAME_CACHE, file_identity
+from FrameSource import CONTAINER_MAGIC, FrameSource
+from RtpPacket import mediaTimestamp
+
+CONTAINER_VERSION = 1
+
+# magic, version, header size, width, height, fps numerator, fps denominator, frame count
+FILE_HEADER = struct.Struct("<4sHHHHIII")
+# size, RTP timestamp
+FRAME_HEADER = struct.Struct("<II")
+
+
+class ContainerStream(FrameSource):
+    """Reads the binary container with a single readinto() per frame."""
+
+    def __init__(self, filename, cache=FRAME_CACHE):
+        """
+        Open a container file.
+
+        Args:
+            filename: Path to the container
+            cache: Shared FrameCache (None reads every frame from disk)
+
+        Raises:
+            IOError: If the file cannot be opened
+            ValueError: If the file is not a container
+        """
+        self.filename = filename
+        try:
+            # Unbuffered: readinto() goes straight to the kernel into our buffer
+            self.file = open(filename, 'rb', buffering=0)
+        except IOError as e:
+            raise IOError(f"Cannot open video file: {filename}") from e
+        header = self.file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            self.file.close()
+            raise ValueError(f"Truncated container header: {filename}")
+        (magic, version, header_size, width, height,
+         fps_num, fps_den, self.frame_count) = FILE_HEADER.unpack(header)
+        if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+            self.file.close()
+            raise ValueError(f"Not a version {CONTAINER_VERSION} container: {filename}")
+        self.resolution = (width, height)
+        self.fps = fps_num / fps_den if fps_den else None
+        self.frameNum = 0
+        self.timestamp = 0
+        self.cache = cache
+        self.identity = file_identity(filename, self.file) if cache is not None else None
+        self.position = header_size  # Offset of the next frame header
+        self.file.seek(header_size)
+        self.pending: Optional[Tuple[int, int]] = None  # Next frame's (size, timestamp)
+        self.resync = True  # Next frame header still has to be read on its own
+
+    def _readinto(self, buffer) -> int:
+        """Fill buffer from the file; fewer bytes only at end of file."""
+        view = memoryview(buffer)
+        total = 0
+        while total < len(view):
+            n = self.file.readinto(view[total:])
+            if not n:
+                break
+            total += n
+        return total
+
+    def nextFrame(self):
+        """
+        Get the next frame.
+
+        Returns:
+            Frame data (bytearray), or None at end of file
+        """
+        if self.cache is not None:
+            cached = self.cache.get((self.identity, self.frameNum + 1))
+            if cached:
+                data, (self.position, timestamp) = cached
+                self.resync = True
+                if not data:
+                    return None  # Empty entry marks the end of the file
+                self.frameNum += 1
+                self.timestamp = timestamp
+                return data
+
+        if self.resync:
+            self.file.seek(self.position)
+            header = bytearray(FRAME_HEADER.size)
+            if self._readinto(header) < FRAME_HEADER.size:
+                self.pending = None
+            else:
+                self.pending = FRAME_HEADER.unpack(header)
+            self.resync = False
+
+        if self.pending is None:
+            if self.cache is not None:
+                self.cache.put((self.identity, self.frameNum + 1), b'', (self.position, 0))
+            return None
+
+        size, timestamp = self.pending
+        # Frame data plus the following frame's header in one read
+        buffer = bytearray(size + FRAME_HEADER.size)
+        got = self._readinto(buffer)
+        if got < size:
+            # Truncated final frame (e.g. a file still being written)
+            self.pending = None
+            self.resync = True
+            return None
+        if got == len(buffer):
+            self.pending = FRAME_HEADER.unpack_from(buffer, size)
+        else:
+            self.pending = None
+        del buffer[size:]
+
+        self.frameNum += 1
+        self.timestamp = timestamp
+        self.position += FRAME_HEADER.size + size
+        if self.cache is not None:
+            self.cache.put((self.identity, self.frameNum), buffer, (self.position, timestamp))
+        return buffer
+
+    def frameNbr(self):
+        """Get current frame number."""
+        return self.frameNum
+
+    def frameTimestamp(self) -> int:
+        """RTP timestamp stored with the last frame returned."""
+        return self.timestamp
+
+
+class ContainerWriter:
+    """Writes the binary container; use as a context manager."""
+
+    def __init__(self, filename, resolution: Tuple[int, int], fps: float):
+        """
+        Create a container file.
+
+        Args:
+            filename: Output path
+            resolution: (width, height) recorded in the header
+            fps: Frame rate recorded in the header and used for timestamps
+        """
+        self.file = open(filename, 'wb')
+        self.resolution = resolution
+        self.fps = fps
+        ratio = Fraction(fps).limit_denominator(1001)
+        self.fps_fraction = (ratio.numerator, ratio.denominator)
+        self.frame_count = 0
+        self._write_header()
+
+    def _write_header(self):
+        self.file.write(FILE_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, FILE_HEADER.size,
+                                         self.resolution[0], self.resolution[1],
+                                         self.fps_fraction[0], self.fps_fraction[1],
+                                         self.frame_count))
+
+    def write(self, data, timestamp: Optional[int] = None):
+        """
+        Append a frame.
+
+        Args:
+            data: Encoded JPEG frame
+            timestamp: 90 kHz RTP timestamp (default: from the frame index and fps)
+        """
+        if timestamp is None:
+            timestamp = mediaTimestamp(self.frame_count + 1, self.fps)
+        self.file.write(FRAME_HEADER.pack(len(data), timestamp & 0xFFFFFFFF))
+        self.file.write(data)
+        self.frame_count += 1
+
+    def close(self):
+        """Record the frame count and close the file."""
+        self.file.seek(0)
+        self._write_header()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,7 @@
 """
 FragmentationHandler.py - Handle frame fragmentation and reassembly
-For frames exceeding MTU (1500 bytes), split into multiple RTP packets
+For frames exceeding the path MTU (1500 bytes unless negotiated), split
+into multiple RTP packets
 """
 import struct
 from typing import Optional, List, Tuple
@@ -60,25 +61,50 @@ class FragmentationHeader:
 class FragmentationHandler:
     """Handles frame fragmentation and reassembly."""
     
-    # Standard Ethernet MTU is 1500 bytes
-    # RTP header is 12 bytes, fragmentation header is 10 bytes
-    # So maximum payload is 1500 - 12 - 10 = 1478 bytes
+    # Standard Ethernet MTU is 1500 bytes; an IP packet carries 20 bytes of
+    # IPv4 and 8 of UDP header, then the RTP header (12 bytes, plus 16 for
+    # the send-time extension) and the 10-byte fragmentation header.
+    # So maximum payload is 1500 - 28 - 28 - 10 = 1434 bytes
     STANDARD_MTU = 1500
+    JUMBO_MTU = 9000
+    MIN_MTU = 576       # Every IPv4 host must accept this much
+    MAX_MTU = 65535
+    IP_UDP_HEADER_SIZE = 28
     RTP_HEADER_SIZE = 12
-    MAX_PAYLOAD_SIZE = STANDARD_MTU - RTP_HEADER_SIZE - FragmentationHeader.HEADER_SIZE
+    RTP_EXTENSION_SIZE = 16
+    MAX_PAYLOAD_SIZE = (STANDARD_MTU - IP_UDP_HEADER_SIZE - RTP_HEADER_SIZE - RTP_EXTENSION_SIZE
+                        - FragmentationHeader.HEADER_SIZE)
     
     def __init__(self, mtu: int = STANDARD_MTU):
         """
         Initialize fragmentation handler.
         
         Args:
-            mtu: Maximum transmission unit in bytes
+            mtu: Maximum transmission unit of the path in bytes (IP packet size)
         """
         self.mtu = mtu
-        self.max_payload_size = mtu - self.RTP_HEADER_SIZE - FragmentationHeader.HEADER_SIZE
+        self.max_payload_size = self.blocksize_for_mtu(mtu) - FragmentationHeader.HEADER_SIZE
         self.fragment_counter = 0
         self.reassembly_buffer = {}  # frame_id -> (data_parts, expected_size)
     
+    @classmethod
+    def blocksize_for_mtu(cls, mtu: int) -> int:
+        """
+        RTP payload bytes (fragmentation header included) that fit one IP
+        packet of mtu bytes: the RTSP Blocksize for that MTU.
+        """
+        mtu = max(cls.MIN_MTU, min(mtu, cls.MAX_MTU))
+        return mtu - cls.IP_UDP_HEADER_SIZE - cls.RTP_HEADER_SIZE - cls.RTP_EXTENSION_SIZE
+    
+    def set_blocksize(self, blocksize: int):
+        """Use a negotiated RTSP Blocksize (RTP payload bytes per packet)."""
+        # Kept within what MIN_MTU..MAX_MTU packets can carry
+        blocksize = max(self.blocksize_for_mtu(self.MIN_MTU),
+                        min(blocksize, self.blocksize_for_mtu(self.MAX_MTU)))
+        self.max_payload_size = blocksize - FragmentationHeader.HEADER_SIZE
+        self.mtu = (blocksize + self.IP_UDP_HEADER_SIZE + self.RTP_HEADER_SIZE
+                    + self.RTP_EXTENSION_SIZE)
+    
     def fragment_frame(self, frame_data: bytes, frame_id: int) -> List[Tuple[bytes, bytes]]:
         """
         Fragment a frame into multiple packets.
@@ -164,6 +190,36 @@ class FragmentationHandler:
         
         return None
     
+    @staticmethod
+    def join_fragments(payloads: List[bytes]) -> Optional[bytes]:
+        """
+        Join one frame's payloads, already complete and in sequence order.
+        
+        Args:
+            payloads: FragmentationHeader + slice per packet
+        
+        Returns:
+            Frame data, or None if the headers do not describe one whole frame
+        """
+        size = FragmentationHeader.HEADER_SIZE
+        header = FragmentationHeader()
+        parts = []
+        offset = 0
+        for index, payload in enumerate(payloads):
+            if not header.decode(payload):
+                return None
+            if index == 0:
+                frame_id, frame_size = header.fragment_id, header.frame_size
+            if (header.fragment_id != frame_id or header.frame_size != frame_size
+                    or header.fragment_offset != offset
+                    or header.more_fragments != (index < len(payloads) - 1)):
+                return None
+            parts.append(payload[size:])
+            offset += len(payload) - size
+        if offset != frame_size:
+            return None
+        return b''.join(parts)
+    
     def get_stats(self) -> dict:
         """Get fragmentation statistics."""
         return {
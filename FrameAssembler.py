@@ -0,0 +1,189 @@
+"""
+FrameAssembler.py - RTP packets to frames by sequence number and marker bit
+Packets are grouped by RTP timestamp and a frame is complete when its
+marker packet has arrived and every sequence number from the end of the
+previous frame up to the marker is present. The payload type says how a
+frame's payloads join (PT 96: FragmentationHeader slices of a JFIF file,
+PT 26: RFC 2435), so nothing is guessed from payload bytes; frames with
+gaps or inconsistent payloads never reach the decoder
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from FragmentationHandler import FragmentationHandler
+from JpegRtp import PT_FRAGMENTED, PT_JPEG, JpegDepacketizer
+from RtpPacket import RtpPacket
+
+SEQ_MOD = 1 << 16
+# Frames kept open while waiting for late or reordered packets
+MAX_PENDING_FRAMES = 8
+
+
+def seq_delta(seq: int, reference: int) -> int:
+    """Signed distance from reference to seq in 16-bit sequence space."""
+    return (seq - reference + SEQ_MOD // 2) % SEQ_MOD - SEQ_MOD // 2
+
+
+class _PendingFrame:
+    """Packets received so far for one RTP timestamp."""
+
+    __slots__ = ('timestamp', 'packets', 'first', 'end')
+
+    def __init__(self, timestamp: int):
+        self.timestamp = timestamp
+        self.packets: Dict[int, Tuple[int, bytes, Optional[float]]] = {}
+        self.first: Optional[int] = None  # Lowest extended seq received
+        self.end: Optional[int] = None    # Extended seq of the marker packet
+
+
+class FrameAssembler:
+    """Receiver state machine from RTP packets to complete frames."""
+
+    def __init__(self, on_drop: Optional[Callable[[int], None]] = None):
+        """
+        Initialize assembler.
+
+        Args:
+            on_drop: Called with the RTP timestamp of every frame given up
+                (missing packets or malformed payloads)
+        """
+        self.on_drop = on_drop
+        self.jpeg = JpegDepacketizer()
+        self.pending: Dict[int, _PendingFrame] = {}
+        self.highest: Optional[int] = None   # Highest extended seq seen
+        self.last_end: Optional[int] = None  # Last seq of the frames closed so far
+        self.boundary_known = False          # last_end is a marker: the next frame starts after it
+        self.packets = 0
+        self.packets_lost = 0
+        self.late_packets = 0
+        self.duplicate_packets = 0
+        self.frames = 0
+        self.frames_dropped = 0
+        self.frames_malformed = 0
+
+    def reset(self):
+        """Forget sequence state (after PAUSE the server's packets were dropped)."""
+        self.pending.clear()
+        self.highest = None
+        self.last_end = None
+        self.boundary_known = False
+
+    def _extend(self, seq: int) -> int:
+        """Unwrap a 16-bit sequence number next to the highest one seen."""
+        if self.highest is None:
+            self.highest = seq
+            return seq
+        extended = self.highest + seq_delta(seq, self.highest % SEQ_MOD)
+        if extended > self.highest:
+            self.packets_lost += extended - self.highest - 1
+            self.highest = extended
+        elif extended < self.highest:
+            self.packets_lost -= 1  # Reordered: fills a gap counted as lost
+        return extended
+
+    def add(self, packet: RtpPacket) -> Optional[Tuple[bytes, int, Optional[float]]]:
+        """
+        Add a received packet.
+
+        Args:
+            packet: Decoded RTP packet
+
+        Returns:
+            (frame, RTP timestamp, send time of its first packet) when this
+            packet completes an intact frame, else None
+        """
+        self.packets += 1
+        seq = self._extend(packet.seqNum())
+        if self.last_end is not None and seq <= self.last_end:
+            self.late_packets += 1  # Its frame was already delivered or given up
+            return None
+        timestamp = packet.timestamp()
+        frame = self.pending.get(timestamp)
+        if frame is None:
+            if len(self.pending) >= MAX_PENDING_FRAMES:
+                self._drop(min(self.pending.values(), key=lambda f: f.first))
+            frame = self.pending[timestamp] = _PendingFrame(timestamp)
+        elif seq in frame.packets:
+            self.duplicate_packets += 1
+            self.packets_lost += 1  # Not the gap it seemed to fill
+            return None
+        frame.packets[seq] = (packet.payloadType(), packet.getPayload(), packet.sendTime())
+        if frame.first is None or seq < frame.first:
+            frame.first = seq
+        if packet.marker():
+            frame.end = seq
+        if frame.end is None or frame.end - frame.first + 1 != len(frame.packets):
+            return None
+        # Contiguous up to the marker; the head is known when the previous frame's end is
+        start = self._start(frame)
+        if start is not None and frame.first != start:
+            return None  # Leading packets still missing (lost or reordered)
+        return self._close(frame)
+
+    def _start(self, frame: _PendingFrame) -> Optional[int]:
+        """First seq of a frame if the end of the frame before it is known."""
+        older = [f for f in self.pending.values() if f is not frame and f.first < frame.first]
+        if not older:
+            return self.last_end + 1 if self.boundary_known else None
+        previous = max(older, key=lambda f: f.first)
+        return previous.end + 1 if previous.end is not None else None
+
+    def _close(self, frame: _PendingFrame) -> Optional[Tuple[bytes, int, Optional[float]]]:
+        """Deliver a complete frame; anything older is given up."""
+        del self.pending[frame.timestamp]
+        for older in [f for f in self.pending.values() if f.first < frame.first]:
+            self._drop(older)
+        self.last_end = frame.end
+        self.boundary_known = True
+        packets = [frame.packets[seq] for seq in sorted(frame.packets)]
+        data = self._join(frame.timestamp, packets)
+        if data is None:
+            self.frames_malformed += 1
+            self._dropped(frame.timestamp)
+            return None
+        self.frames += 1
+        return data, frame.timestamp, packets[0][2]
+
+    def _join(self, timestamp: int,
+              packets: List[Tuple[int, bytes, Optional[float]]]) -> Optional[bytes]:
+        """A frame's payloads joined by its payload format, or None if malformed."""
+        payload_type = packets[0][0]
+        if any(pt != payload_type for pt, _, _ in packets):
+            return None
+        payloads = [payload for _, payload, _ in packets]
+        if payload_type == PT_FRAGMENTED:
+            data = FragmentationHandler.join_fragments(payloads)
+            if data is None or not data.startswith(b"\xff\xd8"):
+                return None  # Not a JPEG file
+            return data
+        if payload_type == PT_JPEG:
+            last = len(payloads) - 1
+            for index, payload in enumerate(payloads):
+                data = self.jpeg.add(timestamp, index == last, payload)
+            return data
+        return None
+
+    def _drop(self, frame: _PendingFrame):
+        del self.pending[frame.timestamp]
+        last = frame.end if frame.end is not None else max(frame.packets)
+        if self.last_end is None or last > self.last_end:
+            self.last_end = last
+            # Without its marker nobody knows where the next frame starts
+            self.boundary_known = frame.end is not None
+        self._dropped(frame.timestamp)
+
+    def _dropped(self, timestamp: int):
+        self.frames_dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(timestamp)
+
+    def get_stats(self) -> Dict:
+        """Get assembly statistics; lost packets as in RFC 3550 (expected - received)."""
+        return {
+            'packets': self.packets,
+            'packets_lost': max(0, self.packets_lost),
+            'late_packets': self.late_packets,
+            'duplicate_packets': self.duplicate_packets,
+            'frames': self.frames,
+            'frames_dropped': self.frames_dropped,
+            'frames_malformed': self.frames_malformed,
+        }
@@ -0,0 +1,113 @@
+"""
+FrameCache.py - Process-wide LRU cache of encoded frames
+Sessions playing the same file share frames read from disk. Entries are
+keyed by (file identity, frame index) and also remember where the next
+frame starts, so a stream served from the cache can resume reading the
+file at the right offset on its next miss
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# 256 MB holds roughly 10 s of 1080p MJPEG for a handful of titles
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_identity(path: str, fileobj) -> Tuple[str, int, int]:
+    """Key part identifying a file's content: (real path, size, mtime)."""
+    st = os.fstat(fileobj.fileno())
+    return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+class FrameCache:
+    """Byte-bounded LRU cache of (frame data, next frame offset)."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize frame cache.
+
+        Args:
+            max_bytes: Upper bound on cached frame bytes (0 disables caching)
+        """
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[tuple, Tuple[bytes, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[Tuple[bytes, int]]:
+        """
+        Look up a frame.
+
+        Args:
+            key: (file identity, frame index)
+
+        Returns:
+            (frame data, resume position) or None on a miss; the position
+            is whatever the stream stored, usually the next frame's offset
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, data: bytes, next_offset):
+        """Store a frame, evicting least recently used frames to stay in bounds."""
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self.entries[key] = (data, next_offset)
+            self.bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.entries:
+            _, (data, _) = self.entries.popitem(last=False)
+            self.bytes -= len(data)
+            self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        """Change the byte bound, evicting immediately if it shrank."""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Drop all frames and reset the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.hit_rate(),
+            }
+
+
+# Process-wide cache shared by every FrameSource
+FRAME_CACHE = FrameCache()
@@ -0,0 +1,138 @@
+"""
+FrameDecoder.py - Off-main-thread JPEG decode and resize for the client
+Worker threads decode at reduced size with PIL draft() mode and scale to the
+display widget, so the Tk main thread only has to blit ready images
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Optional, Tuple
+
+from PIL import Image
+
+from StructuredLogging import get_logger
+
+log = get_logger("FrameDecoder")
+
+
+class DecodedFrame:
+    """A frame decoded and scaled for display."""
+
+    __slots__ = ('sequence', 'image', 'send_time')
+
+    def __init__(self, sequence: int, image, send_time: Optional[float]):
+        self.sequence = sequence
+        self.image = image
+        self.send_time = send_time
+
+
+def decode_jpeg(data: bytes, target_size: Tuple[int, int],
+                opener: Optional[Callable] = None):
+    """
+    Decode a JPEG frame directly at (close to) the target size.
+
+    Args:
+        data: Encoded JPEG frame
+        target_size: (width, height) box the image must fit in
+        opener: Callable returning an unloaded PIL image for data
+            (defaults to decoding from memory)
+
+    Returns:
+        PIL image no larger than target_size, aspect ratio preserved
+    """
+    image = opener(data) if opener else Image.open(BytesIO(data))
+    width, height = target_size
+    # Let libjpeg scale by 1/2, 1/4 or 1/8 during decode (DCT scaling)
+    image.draft('RGB', (width, height))
+    scale = min(width / image.width, height / image.height)
+    if scale < 1:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        return image.resize(size, Image.BILINEAR)
+    image.load()
+    return image
+
+
+class FrameDecoder:
+    """Thread pool that decodes frames ahead of the display loop."""
+
+    def __init__(self, workers: int = 2, target_size: Tuple[int, int] = (512, 288),
+                 opener: Optional[Callable] = None,
+                 on_skip: Optional[Callable[[int], None]] = None):
+        """
+        Initialize frame decoder.
+
+        Args:
+            workers: Number of decode threads (Pillow releases the GIL)
+            target_size: Initial (width, height) of the display widget
+            opener: Optional image opener passed to decode_jpeg
+            on_skip: Called with the number of frames dropped undecoded
+        """
+        self.target_size = target_size
+        self.opener = opener
+        self.on_skip = on_skip
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='FrameDecoder')
+        self.lock = threading.Lock()
+        self.next_sequence = 0
+        self.last_taken = -1
+        self.ready: Optional[DecodedFrame] = None
+        self.in_flight = 0
+        self.frames_decoded = 0
+        self.decode_errors = 0
+        self.frames_skipped = 0
+
+    def set_target_size(self, size: Tuple[int, int]):
+        """Update the display size used for subsequent frames."""
+        self.target_size = size
+
+    def submit(self, data: bytes, send_time: Optional[float] = None):
+        """Queue a frame for decoding; the result is picked up by take_ready()."""
+        with self.lock:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            self.in_flight += 1
+        self.executor.submit(self._decode, sequence, data, send_time, self.target_size)
+
+    def _decode(self, sequence: int, data: bytes, send_time: Optional[float],
+                target_size: Tuple[int, int]):
+        """Worker: decode one frame and publish it if it is the newest."""
+        with self.lock:
+            # A newer frame is already queued: this one would never be shown
+            if sequence < self.next_sequence - 1:
+                self.in_flight -= 1
+                self.frames_skipped += 1
+                if self.on_skip:
+                    self.on_skip(1)
+                return
+        try:
+            image = decode_jpeg(data, target_size, self.opener)
+        except Exception as e:
+            log.warning("error decoding frame", error=e)
+            with self.lock:
+                self.in_flight -= 1
+                self.decode_errors += 1
+            return
+        with self.lock:
+            self.in_flight -= 1
+            self.frames_decoded += 1
+            # Workers can finish out of order; never publish an older frame
+            if self.ready is None or sequence > self.ready.sequence:
+                if sequence > self.last_taken:
+                    self.ready = DecodedFrame(sequence, image, send_time)
+
+    def take_ready(self) -> Optional[DecodedFrame]:
+        """Return the newest decoded frame not yet taken, or None."""
+        with self.lock:
+            frame = self.ready
+            self.ready = None
+            if frame is not None:
+                self.last_taken = frame.sequence
+            return frame
+
+    def pending(self) -> int:
+        """Number of frames still being decoded."""
+        return self.in_flight
+
+    def shutdown(self):
+        """Stop the worker threads."""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,150 @@
+"""
+FramePrefetcher.py - Background read-ahead for VideoStream/HDVideoStream
+A daemon thread keeps the next frames read and parsed in a bounded queue,
+using large sequential reads with posix_fadvise hints, so the RTP sender
+takes frames from memory and a slow or cold disk no longer stalls its
+frame cadence
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from StructuredLogging import get_logger
+
+log = get_logger("FramePrefetcher")
+
+# Chunk size for marker-scanning streams while prefetching
+SEQUENTIAL_READ_SIZE = 256 * 1024
+
+
+def advise_sequential(fileobj):
+    """Tell the kernel a file will be read sequentially (no-op where unsupported)."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fileobj.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    except (OSError, AttributeError, ValueError):
+        pass
+
+
+class FramePrefetcher:
+    """Wraps a stream; nextFrame()/frameNbr() read from a prefilled queue."""
+
+    def __init__(self, stream, depth: int = 16, packetizer=None, packetize_frames: int = 0):
+        """
+        Initialize prefetcher and start reading ahead.
+
+        Args:
+            stream: VideoStream or HDVideoStream, used only by the
+                prefetch thread from now on
+            depth: Frames kept ready ahead of the sender
+            packetizer: Called as packetizer(data, frame_number) to build
+                RTP payloads ahead of time
+            packetize_frames: How many leading frames to pre-packetize
+        """
+        self.stream = stream
+        self.depth = depth
+        self.packetizer = packetizer
+        self.packetize_frames = packetize_frames if packetizer else 0
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.eof = False
+        self.eof_value = None
+        self.closed = False
+        self.frame_number = 0
+        self.timestamp = None
+        self.payloads = None
+        self.stalls = 0
+        self.stall_time = 0.0
+
+        advise_sequential(stream.file)
+        if hasattr(stream, 'read_size'):
+            stream.read_size = SEQUENTIAL_READ_SIZE
+
+        self.thread = threading.Thread(target=self._run, name="FramePrefetcher", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        stream = self.stream
+        while True:
+            with self.condition:
+                while len(self.queue) >= self.depth and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+            try:
+                data = stream.nextFrame()
+            except Exception as e:
+                log.warning("prefetch read failed", file=getattr(stream, 'filename', None), error=e)
+                data = None
+            payloads = None
+            if data and stream.frameNbr() <= self.packetize_frames:
+                payloads = self.packetizer(data, stream.frameNbr())
+            with self.condition:
+                if data:
+                    self.queue.append((stream.frameNbr(), data, stream.frameTimestamp(), payloads))
+                else:
+                    self.eof = True
+                    self.eof_value = data
+                self.condition.notify_all()
+                if self.eof:
+                    return
+
+    def nextFrame(self):
+        """Next frame from the read-ahead queue; waits only if the queue ran dry."""
+        with self.condition:
+            if not self.queue and not self.eof:
+                # Underrun: the disk fell behind the sender
+                self.stalls += 1
+                start = time.monotonic()
+                while not self.queue and not self.eof and not self.closed:
+                    self.condition.wait()
+                self.stall_time += time.monotonic() - start
+            if not self.queue:
+                return self.eof_value
+            self.frame_number, data, self.timestamp, self.payloads = self.queue.popleft()
+            self.condition.notify_all()
+            return data
+
+    def frameNbr(self):
+        """Number of the last frame returned by nextFrame()."""
+        return self.frame_number
+
+    def frameTimestamp(self):
+        """Stored timestamp of the last frame returned by nextFrame(), if any."""
+        return self.timestamp
+
+    def framePayloads(self):
+        """RTP payloads pre-built for the last frame returned, or None."""
+        return self.payloads
+
+    def buffered(self) -> int:
+        """Frames currently ready."""
+        return len(self.queue)
+
+    def get_stats(self) -> Dict:
+        """Get read-ahead statistics."""
+        return {
+            'buffered_frames': len(self.queue),
+            'depth': self.depth,
+            'stalls': self.stalls,
+            'stall_time_ms': self.stall_time * 1000,
+            'eof': self.eof,
+        }
+
+    def close(self):
+        """Stop the prefetch thread and close the underlying stream."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout=1.0)
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+        else:
+            self.stream.file.close()
+
+    def __getattr__(self, name):
+        # fps, filename, resolution, ... come from the wrapped stream
+        return getattr(self.stream, name)
@@ -0,0 +1,196 @@
+"""
+FrameScheduler.py - Real-time send schedule from media timestamps
+Each frame is due at the previous frame's send time plus its 90 kHz
+timestamp delta divided by the playback speed, on the monotonic clock.
+Frames that fall behind are sent back to back until the schedule is met
+again; an overrun longer than the catch-up limit moves the schedule
+instead of bursting, so recovery is the same on every run. A fast-start
+burst sends the first frames after PLAY ahead of the grid
+"""
+import time
+from typing import Dict, Optional
+
+from RtpPacket import MEDIA_CLOCK_RATE
+
+# A frame counts as late when it goes out this long after its send time
+LATE_TOLERANCE = 0.002
+# Furthest behind the schedule may fall before it is moved (seconds)
+MAX_CATCH_UP = 0.25
+# Share of a frame interval a fragmented frame's packets are spread over
+PACKET_SPREAD = 0.5
+# Shorter waits are skipped: they cost more than they smooth
+MIN_WAIT = 0.0005
+# Timestamp jumps beyond this are treated as a discontinuity (one frame)
+MAX_TIMESTAMP_STEP = 10 * MEDIA_CLOCK_RATE
+# Fast-start bursts go out at this multiple of real time
+BURST_RATE = 4.0
+# Playback speeds accepted from the RTSP Scale header
+MIN_SPEED = 0.1
+MAX_SPEED = 16.0
+
+
+def parse_scale(value: str) -> Optional[float]:
+    """RTSP Scale header value as a speed, or None if unusable."""
+    try:
+        speed = float(value)
+    except ValueError:
+        return None
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        return None
+    return speed
+
+
+class FrameScheduler:
+    """Send times for one session's frames."""
+
+    def __init__(self, fps: float, speed: float = 1.0, max_catch_up: float = MAX_CATCH_UP,
+                 clock=time.monotonic):
+        """
+        Initialize scheduler.
+
+        Args:
+            fps: Nominal frame rate (used for discontinuities and packet spread)
+            speed: Playback speed multiplier
+            max_catch_up: Seconds behind schedule before it is moved
+            clock: Monotonic time source
+        """
+        self.interval = 1.0 / fps
+        self.speed = speed
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.next_due: Optional[float] = None
+        self.last_timestamp: Optional[int] = None
+        self.out_timestamp = 0
+        self.frames = 0
+        self.late_frames = 0
+        self.resyncs = 0
+        self.max_lateness = 0.0
+        self.burst_left = 0.0
+        self.burst_bytes_left: Optional[int] = None
+        self.burst_origin = 0.0
+        self.burst_sent = 0.0
+        self.burst_frames = 0
+
+    def start(self, burst: float = 0.0, burst_bytes: Optional[int] = None):
+        """
+        Begin (or resume) a schedule: the next frame is due now.
+
+        Args:
+            burst: Seconds of media to send ahead at BURST_RATE so the
+                receiver can start playing at once (0 for none)
+            burst_bytes: Byte budget for the burst (None for no limit)
+        """
+        self.last_timestamp = None
+        self.burst_left = burst
+        self.burst_bytes_left = burst_bytes
+        self.burst_sent = 0.0
+
+    def set_speed(self, speed: float):
+        """Change speed; it applies from the next timestamp delta on."""
+        self.speed = speed
+
+    def schedule(self, timestamp: int, size: int = 0):
+        """
+        Send time of the next frame.
+
+        Args:
+            timestamp: The frame's 90 kHz media timestamp
+            size: Frame bytes, charged to the fast-start byte budget
+
+        Returns:
+            (monotonic send time, 90 kHz RTP timestamp to send). The RTP
+            timestamp starts at the first media timestamp and then
+            advances at wall-clock rate, so it reflects speed and pauses
+        """
+        media_step = 0.0
+        if self.last_timestamp is None:
+            due = self.clock()
+            self.burst_origin = due
+            if self.next_due is None:
+                self.out_timestamp = timestamp & 0xFFFFFFFF
+                step = 0
+            else:
+                # Resumed: time stood still on the media clock, not on the wire
+                step = max(due - self.next_due, self.interval) * MEDIA_CLOCK_RATE * self.speed
+        else:
+            step = (timestamp - self.last_timestamp) & 0xFFFFFFFF
+            if step >= 0x80000000 or step > MAX_TIMESTAMP_STEP:
+                # Backwards or far forwards: keep the nominal frame spacing
+                step = int(self.interval * MEDIA_CLOCK_RATE)
+            media_step = step / MEDIA_CLOCK_RATE / self.speed
+            due = self.next_due + media_step
+        self.last_timestamp = timestamp
+        self.next_due = due
+        if step:
+            self.out_timestamp = (self.out_timestamp + int(round(step / self.speed))) & 0xFFFFFFFF
+        if self.burst_left > 0:
+            due = self._burst_due(due, media_step, size)
+        return due, self.out_timestamp
+
+    def _burst_due(self, due: float, media_step: float, size: int) -> float:
+        """Send time of a frame inside the fast-start burst (ends the burst when spent)."""
+        self.burst_sent += media_step
+        if self.burst_sent >= self.burst_left or (
+                self.burst_bytes_left is not None and size > self.burst_bytes_left):
+            self.burst_left = 0.0
+            return due
+        if self.burst_bytes_left is not None:
+            self.burst_bytes_left -= size
+        self.burst_frames += 1
+        # The grid (and the RTP clock) stay as they are: burst frames only leave early
+        return min(due, self.burst_origin + self.burst_sent / BURST_RATE)
+
+    def packet_time(self, due: float, index: int, count: int) -> float:
+        """Send time of packet index of count in a frame due at due."""
+        if count <= 1:
+            return due
+        return due + index * self.interval * PACKET_SPREAD / self.speed / count
+
+    def wait(self, until: float, event) -> bool:
+        """
+        Sleep until a send time unless the session is stopped first.
+
+        Args:
+            until: Monotonic send time
+            event: Session stop event (PAUSE/TEARDOWN)
+
+        Returns:
+            True if the event was set
+        """
+        remaining = until - self.clock()
+        if remaining < MIN_WAIT:
+            return event.is_set()
+        return event.wait(remaining)
+
+    def frame_sent(self, due: float) -> float:
+        """
+        Account for a frame whose sending started now.
+
+        Args:
+            due: The frame's send time from schedule()
+
+        Returns:
+            Lateness in seconds (negative when early)
+        """
+        now = self.clock()
+        lateness = now - due
+        self.frames += 1
+        if lateness > LATE_TOLERANCE:
+            self.late_frames += 1
+            self.max_lateness = max(self.max_lateness, lateness)
+            if lateness > self.max_catch_up:
+                # Too far behind to catch up smoothly: continue from here
+                self.next_due = now
+                self.resyncs += 1
+        return lateness
+
+    def get_stats(self) -> Dict:
+        """Get schedule statistics."""
+        return {
+            'frames': self.frames,
+            'late_frames': self.late_frames,
+            'resyncs': self.resyncs,
+            'burst_frames': self.burst_frames,
+            'max_lateness_ms': self.max_lateness * 1000,
+            'speed': self.speed,
+        }
@@ -0,0 +1,183 @@
+"""
+FrameSource.py - Common interface and format autodetection for media sources
+Every source yields encoded JPEG frames through nextFrame()/frameNbr();
+open_source() picks the implementation from the file's magic bytes, and
+convert() rewrites classic or raw MJPEG files into the binary container
+"""
+import sys
+from typing import Optional, Tuple
+
+from FrameCache import FRAME_CACHE
+
+FORMAT_CONTAINER = "container"  # Binary container (ContainerStream)
+FORMAT_CLASSIC = "classic"      # 5-digit ASCII length prefix (VideoStream)
+FORMAT_MJPEG = "mjpeg"          # Concatenated JPEGs (HDVideoStream)
+FORMAT_LIVE = "live"            # Growing file, FIFO or stdin (LiveSource)
+
+CONTAINER_MAGIC = b"RTPF"
+JPEG_SOI = b"\xff\xd8"
+
+
+class FrameSource:
+    """Base class for media sources.
+
+    Subclasses implement nextFrame() and frameNbr(); fps and resolution
+    are None when the format does not carry them. Live sources set live,
+    and their nextFrame() returns None when no frame arrived in time.
+    """
+
+    fps: Optional[float] = None
+    resolution: Optional[Tuple[int, int]] = None
+    live = False
+
+    def nextFrame(self):
+        """Return the next encoded frame, or a falsy value at end of stream."""
+        raise NotImplementedError
+
+    def frameNbr(self) -> int:
+        """Number of the last frame returned (1-based)."""
+        raise NotImplementedError
+
+    def frameTimestamp(self) -> Optional[int]:
+        """Stored 90 kHz timestamp of the last frame, or None if the format has none."""
+        return None
+
+    def close(self):
+        """Close the underlying file."""
+        if getattr(self, 'file', None):
+            self.file.close()
+
+
+def detect_format(path: str) -> str:
+    """
+    Identify a media file by its first bytes ("live:" names and FIFOs
+    are live sources and are not read).
+
+    Raises:
+        ValueError: If the format is not recognized
+    """
+    from LiveSource import is_live_path
+    if is_live_path(path):
+        return FORMAT_LIVE
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(CONTAINER_MAGIC):
+        return FORMAT_CONTAINER
+    if head.startswith(JPEG_SOI):
+        return FORMAT_MJPEG
+    if len(head) >= 7 and head[:5].isdigit() and head[5:7] == JPEG_SOI:
+        return FORMAT_CLASSIC
+    raise ValueError(f"Unrecognized media format: {path}")
+
+
+def open_source(path: str, fps: Optional[float] = None,
+                resolution: Optional[Tuple[int, int]] = None, cache=FRAME_CACHE) -> FrameSource:
+    """
+    Open a media file with the source matching its format.
+
+    Args:
+        path: Media file, or "live:<path>" / "live:-" for live ingest
+        fps: Frame rate for formats that do not store one
+        resolution: (width, height) for formats that do not store one
+        cache: FrameCache to share frames through (None reads every
+            frame from disk)
+
+    Raises:
+        IOError: If the file cannot be opened
+        ValueError: If the format is not recognized
+    """
+    kind = detect_format(path)
+    if kind == FORMAT_LIVE:
+        from LiveSource import live_source
+        return live_source(path, fps=fps, resolution=resolution)
+    if kind == FORMAT_CONTAINER:
+        from ContainerStream import ContainerStream
+        return ContainerStream(path, cache=cache)
+    if kind == FORMAT_CLASSIC:
+        from VideoStream import VideoStream
+        source = VideoStream(path, cache=cache)
+        source.fps = fps
+        source.resolution = resolution
+        return source
+    from HDVideoStream import HDVideoStream
+    return HDVideoStream(path, resolution=resolution or HDVideoStream.RESOLUTION_720P,
+                         fps=fps or 30, cache=cache)
+
+
+def jpeg_dimensions(data) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG's SOFn marker, or None if there is none."""
+    i = 2
+    end = len(data) - 9
+    while i < end:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xDA:  # Start of scan: no SOF before the image data
+            return None
+        i += 2 + length
+    return None
+
+
+def convert(src: str, dst: str, fps: Optional[float] = None,
+            resolution: Optional[Tuple[int, int]] = None) -> int:
+    """
+    Rewrite a classic or raw MJPEG file as a binary container.
+
+    Args:
+        src: Source media file (any recognized format)
+        dst: Output container file
+        fps: Frame rate to record (default: the source's, else 20 for
+            classic files and 30 for raw MJPEG, as the server streams them)
+        resolution: Resolution to record (default: read from the first
+            frame's SOF marker)
+
+    Returns:
+        Number of frames written
+    """
+    from ContainerStream import ContainerWriter
+
+    source = open_source(src, fps=fps, cache=None)
+    try:
+        if fps is None:
+            fps = source.fps or 20
+        first = source.nextFrame()
+        if resolution is None:
+            resolution = (jpeg_dimensions(first) if first else None) or source.resolution or (0, 0)
+        with ContainerWriter(dst, resolution, fps) as writer:
+            data = first
+            while data:
+                writer.write(data)
+                data = source.nextFrame()
+            return writer.frame_count
+    finally:
+        source.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:]
+                   if arg.startswith("--") and "=" in arg)
+    if len(args) == 2 and args[0] == "info":
+        source = open_source(args[1], cache=None)
+        frames = 0
+        while source.nextFrame():
+            frames += 1
+        source.close()
+        print(f"{args[1]}: {detect_format(args[1])}, {frames} frames, "
+              f"fps={source.fps}, resolution={source.resolution}")
+    elif len(args) == 3 and args[0] == "convert":
+        count = convert(args[1], args[2],
+                        fps=float(options["fps"]) if "fps" in options else None)
+        print(f"Wrote {count} frames to {args[2]}")
+    else:
+        print("[Usage: FrameSource.py info Video_file | "
+              "FrameSource.py convert Video_file Output_file [--fps=N]]\n")
@@ -5,15 +5,18 @@ Handles efficient frame reading with JPEG marker scanning
 import os
 from datetime import datetime
 
+from FrameCache import FRAME_CACHE, file_identity
+from FrameSource import FrameSource
 
-class HDVideoStream:
+
+class HDVideoStream(FrameSource):
     """Handles HD video streaming by scanning for JPEG markers (Standard MJPEG)."""
     
     # Resolution presets
     RESOLUTION_720P = (1280, 720)
     RESOLUTION_1080P = (1920, 1080)
     
-    def __init__(self, filename, resolution=RESOLUTION_720P, fps=30):
+    def __init__(self, filename, resolution=RESOLUTION_720P, fps=30, cache=FRAME_CACHE):
         """
         Initialize HD video stream.
         
@@ -21,6 +24,7 @@ class HDVideoStream:
             filename: Path to video file
             resolution: Tuple of (width, height) - default 720p
             fps: Frames per second
+            cache: Shared FrameCache (None reads every frame from disk)
         """
         self.filename = filename
         self.resolution = resolution
@@ -30,6 +34,10 @@ class HDVideoStream:
         self.total_bytes_read = 0
         self.start_time = datetime.now()
         self.buffer = bytearray()  # Buffer for processing
+        self.read_size = 4096  # Bytes per file read (raised by FramePrefetcher)
+        self.cache = cache
+        self.position = 0  # File offset of the next frame when served from cache
+        self.resync = False  # File/buffer lag behind frames served from cache
         
         try:
             self.file = open(filename, 'rb')
@@ -37,6 +45,7 @@ class HDVideoStream:
             self.file.seek(0, 2)  # Seek to end
             self.file_size = self.file.tell()
             self.file.seek(0)  # Reset to start
+            self.identity = file_identity(filename, self.file) if cache is not None else None
         except IOError as e:
             raise IOError(f"Cannot open video file: {filename}") from e
     
@@ -47,15 +56,34 @@ class HDVideoStream:
         Returns:
             Frame data (bytes) or None if EOF
         """
+        if self.cache is not None:
+            cached = self.cache.get((self.identity, self.frameNum + 1))
+            if cached:
+                data, self.position = cached
+                self.resync = True
+                if not data:
+                    return None  # Empty entry marks the end of the file
+                self.frameNum += 1
+                self.total_bytes_read += len(data)
+                return data
+            if self.resync:
+                # Continue scanning from where the cached frame ended
+                self.file.seek(self.position)
+                self.buffer.clear()
+                self.resync = False
+        
         # Read chunks until we find JPEG end marker (FFD9)
         while b'\xff\xd9' not in self.buffer:
-            chunk = self.file.read(4096)
+            chunk = self.file.read(self.read_size)
             if not chunk:
                 # End of file
                 if self.buffer:
                     end_idx = self.buffer.find(b'\xff\xd9')
                     if end_idx != -1:
                         break
+                if self.cache is not None:
+                    self.cache.put((self.identity, self.frameNum + 1), b'',
+                                   self.file.tell() - len(self.buffer))
                 return None
             self.buffer += chunk
         
@@ -74,7 +102,11 @@ class HDVideoStream:
             final_data = frame_data[start_idx:]
             self.frameNum += 1
             self.total_bytes_read += len(final_data)
-            return bytes(final_data)
+            final_data = bytes(final_data)
+            if self.cache is not None:
+                self.cache.put((self.identity, self.frameNum), final_data,
+                               self.file.tell() - len(self.buffer))
+            return final_data
         else:
             # If no valid start marker found, try to get next frame
             return self.nextFrame()
@@ -108,7 +140,8 @@ class HDVideoStream:
         """Get progress as percentage (0-100)."""
         if self.file_size == 0:
             return 0
-        return (self.file.tell() / self.file_size) * 100
+        position = self.position if self.resync else self.file.tell()
+        return (position / self.file_size) * 100
     
     def getCurrentBitrate(self):
         """Calculate current bitrate in Mbps."""
@@ -130,6 +163,7 @@ class HDVideoStream:
             self.frameNum = 0
             self.total_bytes_read = 0
             self.buffer.clear()
+            self.resync = False
     
     def close(self):
         """Close the video file."""
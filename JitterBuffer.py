@@ -0,0 +1,273 @@
+"""
+JitterBuffer.py - Adaptive playout buffer for received frames
+Orders complete frames by RTP timestamp and schedules each one against the
+90 kHz media clock, with a target delay that follows measured jitter
+"""
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from RtpPacket import MEDIA_CLOCK_RATE
+
+
+class BufferedFrame:
+    """A complete frame waiting for its playout deadline."""
+
+    __slots__ = ('timestamp', 'data', 'send_time', 'arrival_time', 'playout_time')
+
+    def __init__(self, timestamp: int, data: bytes, send_time: Optional[float],
+                 arrival_time: float):
+        self.timestamp = timestamp  # Extended (unwrapped) RTP timestamp
+        self.data = data
+        self.send_time = send_time
+        self.arrival_time = arrival_time
+        self.playout_time = 0.0
+
+    def __lt__(self, other):
+        return self.timestamp < other.timestamp
+
+
+class JitterBuffer:
+    """Adaptive jitter buffer keyed by RTP timestamp."""
+
+    # Frames used for the sliding minimum transit delay (clock offset)
+    OFFSET_WINDOW = 64
+
+    def __init__(self, min_delay: float = 0.02, max_delay: float = 0.5,
+                 jitter_multiplier: float = 3.0, max_frames: int = 64,
+                 catch_up_threshold: Optional[float] = None,
+                 on_skip: Optional[Callable[[int], None]] = None):
+        """
+        Initialize jitter buffer.
+
+        Args:
+            min_delay: Lower bound of target playout delay in seconds
+            max_delay: Upper bound of target playout delay in seconds
+            jitter_multiplier: Target delay as a multiple of measured jitter
+            max_frames: Hard bound on buffered frames (oldest dropped first)
+            catch_up_threshold: Queued delay in seconds beyond which playout
+                jumps to the newest frame (None disables catch-up)
+            on_skip: Called with the number of frames a catch-up jump
+                discarded without display
+        """
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter_multiplier = jitter_multiplier
+        self.max_frames = max_frames
+        self.catch_up_threshold = catch_up_threshold
+        self.on_skip = on_skip
+        self.lock = threading.Lock()
+        self.heap: List[BufferedFrame] = []
+        self.burst = 0.0
+        self.reset()
+
+    def reset(self, keep_delay: bool = False):
+        """
+        Drop all frames and forget the media clock mapping.
+
+        Args:
+            keep_delay: Keep the jitter estimate and target delay learned so
+                far (resuming the same stream after a pause)
+        """
+        with self.lock:
+            self.heap.clear()
+            self.last_timestamp = None  # Last extended timestamp seen
+            self.last_arrival = None
+            self.last_played = None     # Extended timestamp of last frame played
+            if not keep_delay:
+                self.jitter = 0.0       # RFC 3550 style estimate, seconds
+                self.target_delay = self.min_delay
+            # Sliding minimum of (arrival - media time): the fastest transit
+            self.offsets = deque()
+            self.offset_seq = 0
+            # Frames before this extended timestamp belong to a fast-start burst
+            self.first_timestamp = None
+            self.burst_end = None
+            self.frames_played = 0
+            # Arrived after their slot, or overtaken in pop() by a newer due frame
+            self.frames_dropped_late = 0
+            self.frames_dropped_overflow = 0
+            # Discarded by a catch-up jump while not yet due (reported to on_skip)
+            self.frames_skipped = 0
+            self.catch_ups = 0
+
+    def expect_burst(self, seconds: float):
+        """
+        Announce that the sender will front-load the first seconds of media
+        after the next reset (fast start). Those frames arrive ahead of real
+        time, so only the first one sets the clock mapping. Calling it again
+        once the sender's answer is known corrects the current burst.
+
+        Args:
+            seconds: Media seconds sent early (0 for none)
+        """
+        with self.lock:
+            self.burst = seconds
+            if self.first_timestamp is not None:
+                self.burst_end = self._burst_end()
+
+    def _burst_end(self) -> Optional[int]:
+        """Extended timestamp at which the announced burst ends."""
+        if self.burst <= 0:
+            return None
+        return self.first_timestamp + int(self.burst * MEDIA_CLOCK_RATE)
+
+    def _unwrap(self, rtp_timestamp: int) -> int:
+        """Extend a 32-bit RTP timestamp using the previous one as reference."""
+        if self.last_timestamp is None:
+            return rtp_timestamp
+        delta = ((rtp_timestamp - self.last_timestamp + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        return self.last_timestamp + delta
+
+    def _update_clock(self, timestamp: int, arrival: float):
+        """Update jitter, target delay and the media-to-local clock offset."""
+        media_time = timestamp / MEDIA_CLOCK_RATE
+        if self.last_timestamp is None:
+            self.first_timestamp = timestamp
+            self.burst_end = self._burst_end()
+        elif self._in_burst(timestamp):
+            # Early by design: neither jitter nor a faster transit
+            if timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+                self.last_arrival = None
+            return
+        if (self.last_timestamp is not None and self.last_arrival is not None
+                and timestamp > self.last_timestamp):
+            d = (arrival - self.last_arrival) - (timestamp - self.last_timestamp) / MEDIA_CLOCK_RATE
+            self.jitter += (abs(d) - self.jitter) / 16
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+            self.last_arrival = arrival
+
+        self.target_delay = min(self.max_delay,
+                                max(self.min_delay, self.jitter * self.jitter_multiplier))
+
+        # Monotonic deque: front always holds the window minimum
+        offset = arrival - media_time
+        while self.offsets and self.offsets[-1][1] >= offset:
+            self.offsets.pop()
+        self.offsets.append((self.offset_seq, offset))
+        if self.offsets[0][0] <= self.offset_seq - self.OFFSET_WINDOW:
+            self.offsets.popleft()
+        self.offset_seq += 1
+
+    def _in_burst(self, timestamp: int) -> bool:
+        """True for a frame of the fast-start burst (a backlog by design)."""
+        return self.burst_end is not None and timestamp < self.burst_end
+
+    def _playout_time(self, timestamp: int) -> float:
+        """Local monotonic time at which a frame should be shown."""
+        return timestamp / MEDIA_CLOCK_RATE + self.offsets[0][1] + self.target_delay
+
+    def push(self, rtp_timestamp: int, data: bytes, send_time: Optional[float] = None,
+             arrival: Optional[float] = None) -> bool:
+        """
+        Add a complete frame.
+
+        Args:
+            rtp_timestamp: 32-bit RTP timestamp of the frame
+            data: Encoded frame
+            send_time: Sender send time, carried through for latency reporting
+            arrival: Local monotonic arrival time (defaults to now)
+
+        Returns:
+            False if the frame arrived after its slot was played and was dropped
+        """
+        if arrival is None:
+            arrival = time.monotonic()
+        with self.lock:
+            timestamp = self._unwrap(rtp_timestamp)
+            if self.last_played is not None and timestamp <= self.last_played:
+                self.frames_dropped_late += 1
+                return False
+
+            self._update_clock(timestamp, arrival)
+            heapq.heappush(self.heap, BufferedFrame(timestamp, data, send_time, arrival))
+
+            if len(self.heap) > self.max_frames:
+                heapq.heappop(self.heap)
+                self.frames_dropped_overflow += 1
+            return True
+
+    def queued_delay(self, now: Optional[float] = None) -> float:
+        """
+        Seconds of playback backlog: media time spanned by buffered frames
+        plus how far the oldest one is already past its deadline.
+        """
+        if now is None:
+            now = time.monotonic()
+        if not self.heap:
+            return 0.0
+        oldest = self.heap[0].timestamp
+        span = (self.last_timestamp - oldest) / MEDIA_CLOCK_RATE
+        return span + max(0.0, now - self._playout_time(oldest))
+
+    def _skip(self, count: int):
+        """Account for frames a catch-up jump discarded before they were due."""
+        self.frames_skipped += count
+        if self.on_skip:
+            self.on_skip(count)
+
+    def pop(self, now: Optional[float] = None) -> Optional[BufferedFrame]:
+        """
+        Return the frame due for display, or None if nothing is due yet.
+
+        When several frames are past their deadline only the newest is
+        returned; the older ones missed their slot and are dropped as late. In
+        catch-up mode a backlog above the threshold jumps straight to the
+        newest buffered frame. After a fast-start burst was announced the
+        first frame is shown as soon as it arrives.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            due = None
+            if self.last_played is None and self.burst_end is not None:
+                # The burst is the cushion: show its first frame at once
+                if self.heap:
+                    due = heapq.heappop(self.heap)
+            else:
+                if (self.catch_up_threshold is not None and len(self.heap) > 1
+                        and not self._in_burst(self.heap[0].timestamp)
+                        and self.queued_delay(now) > self.catch_up_threshold):
+                    due = max(self.heap)
+                    self._skip(len(self.heap) - 1)
+                    self.heap.clear()
+                    self.catch_ups += 1
+                while self.heap and self._playout_time(self.heap[0].timestamp) <= now:
+                    if due is not None:
+                        self.frames_dropped_late += 1
+                    due = heapq.heappop(self.heap)
+            if due is None:
+                return None
+            due.playout_time = self._playout_time(due.timestamp)
+            self.last_played = due.timestamp
+            self.frames_played += 1
+            return due
+
+    def time_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the next frame is due, or None if the buffer is empty."""
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if not self.heap:
+                return None
+            return max(0.0, self._playout_time(self.heap[0].timestamp) - now)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def get_stats(self) -> Dict:
+        """Get jitter buffer statistics."""
+        return {
+            'buffered_frames': len(self.heap),
+            'target_delay_ms': self.target_delay * 1000,
+            'jitter_ms': self.jitter * 1000,
+            'frames_played': self.frames_played,
+            'frames_dropped_late': self.frames_dropped_late,
+            'frames_dropped_overflow': self.frames_dropped_overflow,
+            'frames_skipped': self.frames_skipped,
+            'catch_ups': self.catch_ups,
+        }
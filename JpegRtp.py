@@ -0,0 +1,376 @@
+"""
+JpegRtp.py - RFC 2435 JPEG-over-RTP payload format
+The sender strips the JFIF headers and sends only the entropy-coded scan
+behind an 8-byte JPEG header (type, Q, size, fragment offset), with the
+quantization tables in-band when they are not the standard scaled ones.
+The receiver rebuilds the headers from those fields. Baseline 4:2:2 and
+4:2:0 YCbCr with the standard Huffman tables is all the format carries
+"""
+import struct
+import sys
+from typing import Dict, List, Optional
+
+# Session payload formats, negotiated with the Payload-Format header
+FORMAT_FRAGMENTED = "fragmented"  # Whole JFIF files behind a FragmentationHeader
+FORMAT_RFC2435 = "rfc2435"
+PAYLOAD_FORMATS = (FORMAT_FRAGMENTED, FORMAT_RFC2435)
+
+# Static payload type for JPEG (RFC 3551), and the dynamic one marking
+# FragmentationHeader payloads so receivers never guess the format
+PT_JPEG = 26
+PT_FRAGMENTED = 96
+PAYLOAD_TYPES = {FORMAT_FRAGMENTED: PT_FRAGMENTED, FORMAT_RFC2435: PT_JPEG}
+
+# type-specific, fragment offset (24 bits), type, Q, width / 8, height / 8
+_MAIN_HEADER = struct.Struct("!BBHBBBB")
+# restart interval, F/L bits + restart count
+_RESTART_HEADER = struct.Struct("!HH")
+# MBZ, precision, length
+_QTABLE_HEADER = struct.Struct("!BBH")
+
+MAIN_HEADER_SIZE = _MAIN_HEADER.size
+# Q values from 128 on carry their tables in the first packet; 255 says
+# they may change every frame
+Q_DYNAMIC = 255
+# Types 64-127 are types 0-63 with restart markers
+RESTART_TYPE_FLAG = 64
+# Restart header for a frame that is not split on restart intervals
+_RESTART_WHOLE_FRAME = 0xFFFF
+
+# Baseline SOF sampling factors of the Y component for types 0 and 1
+_Y_SAMPLING = {0: 0x21, 1: 0x22}
+
+# RFC 2435 Appendix A: tables scaled by Q 1-99, in zigzag order
+_LUMA_QUANTIZER = bytes([
+    16, 11, 12, 14, 12, 10, 16, 14, 13, 14, 18, 17, 16, 19, 24, 40,
+    26, 24, 22, 22, 24, 49, 35, 37, 29, 40, 58, 51, 61, 60, 57, 51,
+    56, 55, 64, 72, 92, 78, 64, 68, 87, 69, 55, 56, 80, 109, 81, 87,
+    95, 98, 103, 104, 103, 62, 77, 113, 121, 112, 100, 120, 92, 101, 103, 99,
+])
+_CHROMA_QUANTIZER = bytes([17, 18, 18, 24, 21, 24, 47, 26, 26, 47, 99, 66, 56, 66] + [99] * 50)
+
+# JPEG Annex K.3 Huffman tables: (class, id) -> (code counts, symbols)
+_DC_SYMBOLS = bytes(range(12))
+_STANDARD_HUFFMAN = {
+    (0, 0): (bytes([0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]), _DC_SYMBOLS),
+    (0, 1): (bytes([0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0]), _DC_SYMBOLS),
+    (1, 0): (bytes([0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d]), bytes([
+        0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+        0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08, 0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+        0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16, 0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+        0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+        0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+        0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+        0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+        0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+        0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+        0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+        0xf9, 0xfa,
+    ])),
+    (1, 1): (bytes([0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77]), bytes([
+        0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21, 0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+        0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91, 0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+        0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34, 0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+        0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+        0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+        0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+        0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+        0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+        0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+        0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+        0xf9, 0xfa,
+    ])),
+}
+
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def make_qtables(q: int) -> bytes:
+    """Luma + chroma tables for a Q factor 1-99 (RFC 2435 Appendix A)."""
+    q = max(1, min(q, 99))
+    scale = 5000 // q if q < 50 else 200 - q * 2
+    return bytes(max(1, min((value * scale + 50) // 100, 255))
+                 for value in _LUMA_QUANTIZER + _CHROMA_QUANTIZER)
+
+
+_Q_FOR_TABLES: Dict[bytes, int] = {}
+
+
+def _q_for_tables(tables: bytes) -> Optional[int]:
+    """Q factor whose scaled standard tables equal these, if any."""
+    if not _Q_FOR_TABLES:
+        for q in range(99, 0, -1):
+            _Q_FOR_TABLES.setdefault(make_qtables(q), q)
+    return _Q_FOR_TABLES.get(tables)
+
+
+class JpegScan:
+    """What RFC 2435 keeps of a baseline JPEG."""
+
+    __slots__ = ('type', 'width', 'height', 'tables', 'restart_interval', 'start', 'end')
+
+    def __init__(self):
+        self.type = 0
+        self.width = 0
+        self.height = 0
+        self.tables = b''           # Y table then chroma table, zigzag order
+        self.restart_interval = 0
+        self.start = 0              # Entropy-coded data: jpeg[start:end]
+        self.end = 0
+
+
+def parse_jpeg(jpeg: bytes) -> JpegScan:
+    """
+    Walk a JPEG's header segments (not its scan).
+
+    Raises:
+        ValueError: If the image cannot be sent as RFC 2435
+    """
+    if jpeg[:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG (no SOI)")
+    scan = JpegScan()
+    qtables: Dict[int, bytes] = {}
+    components = None
+    pos = 2
+    while True:
+        if pos + 4 > len(jpeg) or jpeg[pos] != 0xFF:
+            raise ValueError("malformed JPEG header")
+        marker = jpeg[pos + 1]
+        if marker == 0xFF:      # Fill byte
+            pos += 1
+            continue
+        length = (jpeg[pos + 2] << 8) | jpeg[pos + 3]
+        segment = jpeg[pos + 4:pos + 2 + length]
+        if marker == 0xDB:      # DQT, possibly several tables
+            i = 0
+            while i < len(segment):
+                if segment[i] >> 4:
+                    raise ValueError("16-bit quantization tables")
+                qtables[segment[i] & 0x0F] = bytes(segment[i + 1:i + 65])
+                i += 65
+        elif marker == 0xC4:    # DHT: only the standard tables can be rebuilt
+            i = 0
+            while i < len(segment):
+                counts = bytes(segment[i + 1:i + 17])
+                symbols = bytes(segment[i + 17:i + 17 + sum(counts)])
+                if _STANDARD_HUFFMAN.get((segment[i] >> 4, segment[i] & 0x0F)) != (counts, symbols):
+                    raise ValueError("non-standard Huffman tables")
+                i += 17 + len(symbols)
+        elif marker == 0xDD:    # DRI
+            scan.restart_interval = (segment[0] << 8) | segment[1]
+        elif marker == 0xC0:    # SOF0, baseline
+            precision, height, width, count = struct.unpack_from("!BHHB", segment)
+            if precision != 8 or count != 3:
+                raise ValueError("not 8-bit YCbCr")
+            components = [tuple(segment[6 + 3 * i:9 + 3 * i]) for i in range(3)]
+            sampling = {value: key for key, value in _Y_SAMPLING.items()}.get(components[0][1])
+            if sampling is None or components[1][1] != 0x11 or components[2][1] != 0x11:
+                raise ValueError("chroma subsampling other than 4:2:2 or 4:2:0")
+            if components[1][2] != components[2][2]:
+                raise ValueError("Cb and Cr use different quantization tables")
+            if width > 2040 or height > 2040:
+                raise ValueError("larger than 2040x2040")
+            scan.type, scan.width, scan.height = sampling, width, height
+        elif marker in _SOF_MARKERS:
+            raise ValueError("not baseline JPEG")
+        elif marker == 0xDA:    # SOS: the scan follows the header
+            if components is None:
+                raise ValueError("scan before frame header")
+            selectors = [segment[2 + 2 * i] for i in range(segment[0])]
+            if segment[0] != 3 or selectors != [0x00, 0x11, 0x11]:
+                raise ValueError("non-standard Huffman table selection")
+            scan.start = pos + 2 + length
+            break
+        pos += 2 + length
+
+    try:
+        scan.tables = qtables[components[0][2]] + qtables[components[1][2]]
+    except KeyError:
+        raise ValueError("missing quantization table") from None
+    if scan.restart_interval:
+        scan.type |= RESTART_TYPE_FLAG
+    scan.end = jpeg.rfind(b"\xff\xd9", scan.start)
+    if scan.end < 0:
+        scan.end = len(jpeg)
+    return scan
+
+
+def packetize(jpeg: bytes, blocksize: int) -> List[bytes]:
+    """
+    RTP payloads of one frame.
+
+    Args:
+        jpeg: Complete baseline JPEG
+        blocksize: Most RTP payload bytes per packet
+
+    Returns:
+        Payloads in order; the last one ends the frame (marker bit)
+
+    Raises:
+        ValueError: If the image cannot be sent as RFC 2435
+    """
+    scan = parse_jpeg(jpeg)
+    q = _q_for_tables(scan.tables)
+    extra = b''
+    if scan.type & RESTART_TYPE_FLAG:
+        extra = _RESTART_HEADER.pack(scan.restart_interval, _RESTART_WHOLE_FRAME)
+    first = extra
+    if q is None:
+        q = Q_DYNAMIC
+        first = extra + _QTABLE_HEADER.pack(0, 0, len(scan.tables)) + scan.tables
+    width, height = (scan.width + 7) // 8, (scan.height + 7) // 8
+
+    data = memoryview(jpeg)[scan.start:scan.end]
+    payloads = []
+    offset = 0
+    while offset < len(data) or not payloads:
+        headers = first if offset == 0 else extra
+        chunk = data[offset:offset + blocksize - MAIN_HEADER_SIZE - len(headers)]
+        if not len(chunk):
+            raise ValueError("blocksize too small")
+        main = _MAIN_HEADER.pack(0, offset >> 16, offset & 0xFFFF, scan.type, q, width, height)
+        payloads.append(main + headers + chunk)
+        offset += len(chunk)
+    return payloads
+
+
+def build_header(jpeg_type: int, width: int, height: int, tables: bytes,
+                 restart_interval: int = 0) -> bytes:
+    """
+    JPEG headers (SOI through SOS) for a frame received as RFC 2435.
+
+    Args:
+        jpeg_type: RFC 2435 type without the restart flag (0 or 1)
+        width: Width in pixels
+        height: Height in pixels
+        tables: One or two 64-byte quantization tables, zigzag order
+        restart_interval: MCUs between restart markers (0 for none)
+    """
+    out = bytearray(b"\xff\xd8")
+    chroma_table = 1 if len(tables) >= 128 else 0
+    for table_id in range(chroma_table + 1):
+        out += b"\xff\xdb\x00\x43" + bytes([table_id]) + tables[64 * table_id:64 * table_id + 64]
+    if restart_interval:
+        out += b"\xff\xdd\x00\x04" + struct.pack("!H", restart_interval)
+    out += struct.pack("!BBHBHHB", 0xFF, 0xC0, 17, 8, height, width, 3)
+    out += bytes([1, _Y_SAMPLING[jpeg_type], 0, 2, 0x11, chroma_table, 3, 0x11, chroma_table])
+    for (table_class, table_id), (counts, symbols) in sorted(_STANDARD_HUFFMAN.items()):
+        out += struct.pack("!BBHB", 0xFF, 0xC4, 19 + len(symbols), (table_class << 4) | table_id)
+        out += counts + symbols
+    out += b"\xff\xda\x00\x0c\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00"
+    return bytes(out)
+
+
+class JpegDepacketizer:
+    """Rebuilds JPEG frames from RFC 2435 payloads, one frame at a time."""
+
+    def __init__(self):
+        self.timestamp: Optional[int] = None
+        self.header: Optional[bytes] = None
+        self.parts: Dict[int, bytes] = {}
+        self.known_tables: Dict[int, bytes] = {}  # Q 128-254 tables seen before
+        self.frames = 0
+        self.frames_dropped = 0
+
+    def _start(self, timestamp: int):
+        if self.parts:
+            self.frames_dropped += 1  # Previous frame never saw its marker
+        self.timestamp = timestamp
+        self.header = None
+        self.parts = {}
+
+    def add(self, timestamp: int, marker: bool, payload: bytes) -> Optional[bytes]:
+        """
+        Add one packet's payload.
+
+        Args:
+            timestamp: RTP timestamp (one per frame)
+            marker: RTP marker bit, set on the frame's last packet
+            payload: RTP payload
+
+        Returns:
+            The complete JPEG when this packet ends an intact frame
+        """
+        if timestamp != self.timestamp:
+            self._start(timestamp)
+        if len(payload) < MAIN_HEADER_SIZE:
+            return self._finish(marker, valid=False)
+        _, offset_high, offset_low, jpeg_type, q, width, height = _MAIN_HEADER.unpack_from(payload)
+        offset = (offset_high << 16) | offset_low
+        pos = MAIN_HEADER_SIZE
+        restart_interval = 0
+        if jpeg_type & RESTART_TYPE_FLAG:
+            restart_interval = _RESTART_HEADER.unpack_from(payload, pos)[0]
+            pos += _RESTART_HEADER.size
+        if offset == 0:
+            tables = None
+            if q < 128:
+                tables = make_qtables(q)
+            elif len(payload) >= pos + _QTABLE_HEADER.size:
+                _, precision, length = _QTABLE_HEADER.unpack_from(payload, pos)
+                pos += _QTABLE_HEADER.size
+                if precision == 0 and length:
+                    tables = bytes(payload[pos:pos + length])
+                    pos += length
+                    if q != Q_DYNAMIC:
+                        self.known_tables[q] = tables
+                elif q != Q_DYNAMIC:
+                    tables = self.known_tables.get(q)
+            if tables is None or jpeg_type & ~RESTART_TYPE_FLAG not in _Y_SAMPLING:
+                return self._finish(marker, valid=False)
+            self.header = build_header(jpeg_type & ~RESTART_TYPE_FLAG, width * 8, height * 8,
+                                       tables, restart_interval)
+        self.parts[offset] = payload[pos:]
+        return self._finish(marker)
+
+    def _finish(self, marker: bool, valid: bool = True) -> Optional[bytes]:
+        """Complete the frame on its marker packet; anything incomplete is dropped."""
+        if not valid:
+            self.parts[-1] = b''  # Poison the frame; it is dropped at its end
+        if not marker:
+            return None
+        parts, self.parts = self.parts, {}
+        header, self.header = self.header, None
+        expected = 0
+        for offset in sorted(parts):
+            if offset != expected:
+                break
+            expected += len(parts[offset])
+        else:
+            if header is not None:
+                self.frames += 1
+                data = b"".join(parts[offset] for offset in sorted(parts))
+                if not data.endswith(b"\xff\xd9"):
+                    data += b"\xff\xd9"
+                return header + data
+        self.frames_dropped += 1
+        return None
+
+    def get_stats(self) -> Dict:
+        """Get depacketizer statistics."""
+        return {'frames': self.frames, 'frames_dropped': self.frames_dropped}
+
+
+def sdp(port: int, address: str = "127.0.0.1") -> str:
+    """Session description for standard players receiving an RFC 2435 session on port."""
+    return "\n".join([
+        "v=0",
+        f"o=- 0 0 IN IP4 {address}",
+        "s=RTSP streaming session",
+        f"c=IN IP4 {address}",
+        "t=0 0",
+        f"m=video {port} RTP/AVP {PT_JPEG}",
+        f"a=rtpmap:{PT_JPEG} JPEG/90000",
+        "",
+    ])
+
+
+if __name__ == "__main__":
+    # e.g. JpegRtp.py 25000 > session.sdp; ffplay -protocol_whitelist file,udp,rtp session.sdp
+    # then SETUP the stream with "Payload-Format: rfc2435" and client_port=25000
+    try:
+        rtp_port = int(sys.argv[1])
+    except (IndexError, ValueError):
+        print("[Usage: JpegRtp.py RTP_port [Address]]\n")
+        sys.exit(1)
+    sys.stdout.write(sdp(rtp_port, sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1"))
@@ -0,0 +1,211 @@
+"""
+LatencyHistogram.py - Fixed-memory, mergeable latency histogram
+Log-linear buckets in the style of HDR histograms: values are grouped by
+power of two, each split into 64 linear sub-buckets, so any recorded value
+is reproduced within ~1.6% while memory stays constant for the whole session
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+
+class LatencyHistogram:
+    """Log-bucket histogram of non-negative integer samples (e.g. microseconds)."""
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS          # Exact values below this
+    SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1          # Linear steps per octave
+
+    def __init__(self, highest_value: int = 60_000_000):
+        """
+        Initialize histogram.
+
+        Args:
+            highest_value: Largest trackable value; larger samples are
+                clamped into the top bucket (default 60 s in microseconds)
+        """
+        self.highest_value = highest_value
+        self.bucket_count = self._index(highest_value) + 1
+        self.reset()
+
+    def reset(self):
+        """Clear all samples."""
+        self.counts = array('Q', bytes(8 * self.bucket_count))
+        self.total_count = 0
+        self.total_sum = 0
+        self.min_value = None
+        self.max_value = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        """Bucket index for a value."""
+        if value < cls.SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return shift * cls.SUB_BUCKET_HALF + (value >> shift)
+
+    @classmethod
+    def _bucket_value(cls, index: int) -> int:
+        """Representative (midpoint) value of a bucket."""
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+        shift = index // cls.SUB_BUCKET_HALF - 1
+        sub = index - shift * cls.SUB_BUCKET_HALF
+        return (sub << shift) + ((1 << shift) >> 1)
+
+    @classmethod
+    def _bucket_upper(cls, index: int) -> int:
+        """Largest value that falls into a bucket."""
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+        shift = index // cls.SUB_BUCKET_HALF - 1
+        sub = index - shift * cls.SUB_BUCKET_HALF
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value: float, count: int = 1):
+        """
+        Record a sample.
+
+        Args:
+            value: Sample value; negatives count as 0
+            count: Number of occurrences
+        """
+        value = min(max(0, int(value)), self.highest_value)
+        self.counts[self._index(value)] += count
+        self.total_count += count
+        self.total_sum += value * count
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if value > self.max_value:
+            self.max_value = value
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's samples into this one."""
+        if other.bucket_count != self.bucket_count:
+            raise ValueError("Cannot merge histograms with different ranges")
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        if other.min_value is not None:
+            if self.min_value is None or other.min_value < self.min_value:
+                self.min_value = other.min_value
+        self.max_value = max(self.max_value, other.max_value)
+
+    def percentile(self, percent: float) -> float:
+        """Value at the given percentile (0-100), 0 when empty."""
+        return self.percentiles((percent,))[percent]
+
+    def percentiles(self, percents: Iterable[float] = (50, 95, 99)) -> Dict[float, float]:
+        """
+        Values at several percentiles in a single pass over the buckets.
+
+        Returns:
+            {percent: value}
+        """
+        percents = sorted(percents)
+        result = {p: 0.0 for p in percents}
+        if self.total_count == 0:
+            return result
+        targets = [(p, max(1, -(-p * self.total_count // 100))) for p in percents]
+        seen = 0
+        t = 0
+        for index, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            while t < len(targets) and seen >= targets[t][1]:
+                value = self._bucket_value(index)
+                result[targets[t][0]] = min(max(value, self.min_value), self.max_value)
+                t += 1
+            if t == len(targets):
+                break
+        return result
+
+    def copy(self) -> 'LatencyHistogram':
+        """Cheap point-in-time copy (one buffer copy, no locking)."""
+        histogram = LatencyHistogram.__new__(LatencyHistogram)
+        histogram.highest_value = self.highest_value
+        histogram.bucket_count = self.bucket_count
+        histogram.counts = array('Q', self.counts)
+        histogram.total_count = self.total_count
+        histogram.total_sum = self.total_sum
+        histogram.min_value = self.min_value
+        histogram.max_value = self.max_value
+        return histogram
+
+    def cumulative_counts(self, bounds: Iterable[int]) -> List[int]:
+        """
+        Number of samples at or below each bound, in one pass.
+
+        Args:
+            bounds: Ascending upper bounds (for e.g. Prometheus buckets)
+
+        Returns:
+            Cumulative count per bound; samples are attributed by bucket,
+            so a bound inside a bucket counts that bucket only if the
+            bucket's upper edge is within the bound
+        """
+        bounds = list(bounds)
+        result = [0] * len(bounds)
+        seen = 0
+        b = 0
+        for index, c in enumerate(self.counts):
+            if not c:
+                continue
+            upper = self._bucket_upper(index)
+            while b < len(bounds) and upper > bounds[b]:
+                result[b] = seen
+                b += 1
+            if b == len(bounds):
+                return result
+            seen += c
+        while b < len(bounds):
+            result[b] = seen
+            b += 1
+        return result
+
+    def mean(self) -> float:
+        """Mean of recorded samples."""
+        return self.total_sum / self.total_count if self.total_count else 0.0
+
+    def buckets(self) -> List[tuple]:
+        """Non-empty buckets as (inclusive upper bound, count), ascending."""
+        result = []
+        for index, c in enumerate(self.counts):
+            if c:
+                result.append((self._bucket_upper(index), c))
+        return result
+
+    def to_dict(self) -> Dict:
+        """Sparse, JSON-friendly form for shipping between processes."""
+        return {
+            'highest_value': self.highest_value,
+            'counts': {i: c for i, c in enumerate(self.counts) if c},
+            'sum': self.total_sum,
+            'min': self.min_value,
+            'max': self.max_value,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencyHistogram':
+        """Rebuild a histogram produced by to_dict()."""
+        histogram = cls(data['highest_value'])
+        for index, c in data['counts'].items():
+            histogram.counts[int(index)] = c
+            histogram.total_count += c
+        histogram.total_sum = data['sum']
+        histogram.min_value = data['min']
+        histogram.max_value = data['max']
+        return histogram
+
+
+def merge_histograms(histograms: Iterable[LatencyHistogram]) -> Optional[LatencyHistogram]:
+    """Merge histograms from several sessions or processes into a new one."""
+    merged = None
+    for histogram in histograms:
+        if merged is None:
+            merged = LatencyHistogram(histogram.highest_value)
+        merged.merge(histogram)
+    return merged
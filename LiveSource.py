@@ -0,0 +1,468 @@
+"""
+LiveSource.py - Live MJPEG ingest from a growing file, FIFO or stdin
+One ingest thread per source scans incoming bytes for JPEG frames
+incrementally and fans each frame out to every subscribed session.
+Subscribers hold only a few frames; when one lags, its oldest frames are
+dropped so ingest-to-send latency stays bounded. Sessions can only
+subscribe to sources the server was started with (--live); any other
+ingest stops when its last subscriber leaves
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from FrameSource import FrameSource
+from RtpPacket import MEDIA_CLOCK_RATE
+from StructuredLogging import get_logger
+
+log = get_logger("LiveSource")
+
+LIVE_PREFIX = "live:"
+STDIN_PATH = "-"
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+READ_SIZE = 64 * 1024
+# A "frame" larger than this is garbage without an end marker: resync
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Frames queued per subscriber before the oldest is dropped
+SUBSCRIBER_DEPTH = 2
+# Longest a stalled subscriber's nextFrame() blocks, so the sender can
+# notice PAUSE/TEARDOWN
+FRAME_WAIT = 0.1
+# Fallback change polling for growing files where inotify is unavailable
+POLL_INTERVAL = 0.01
+
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+
+
+def is_live_path(path: str) -> bool:
+    """True for "live:..." names and for FIFOs, which can only be read live."""
+    if path.startswith(LIVE_PREFIX):
+        return True
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+class MjpegScanner:
+    """Incremental JPEG frame splitter; each byte is scanned once."""
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self.buffer = bytearray()
+        self.in_frame = False  # buffer starts with an SOI marker
+        self.scanned = 0  # EOI search resumes here
+        self.max_frame_size = max_frame_size
+        self.discarded = 0  # Garbage bytes skipped between frames
+
+    def feed(self, chunk) -> List[bytes]:
+        """
+        Add bytes and return the frames they completed.
+
+        Args:
+            chunk: Newly read bytes
+
+        Returns:
+            Complete frames (SOI through EOI), oldest first
+        """
+        buffer = self.buffer
+        buffer += chunk
+        frames = []
+        while True:
+            if not self.in_frame:
+                start = buffer.find(JPEG_SOI)
+                if start < 0:
+                    # Keep a trailing 0xFF: it may begin a marker split across reads
+                    keep = 1 if buffer.endswith(b"\xff") else 0
+                    self.discarded += len(buffer) - keep
+                    del buffer[:len(buffer) - keep]
+                    break
+                self.discarded += start
+                del buffer[:start]
+                self.in_frame = True
+                self.scanned = len(JPEG_SOI)
+            end = buffer.find(JPEG_EOI, self.scanned)
+            if end < 0:
+                if len(buffer) > self.max_frame_size:
+                    log.warning("no end marker, resyncing", bytes=len(buffer))
+                    self.discarded += len(buffer)
+                    buffer.clear()
+                    self.in_frame = False
+                else:
+                    self.scanned = max(len(JPEG_SOI), len(buffer) - 1)
+                break
+            end += len(JPEG_EOI)
+            frames.append(bytes(buffer[:end]))
+            del buffer[:end]
+            self.in_frame = False
+        return frames
+
+    def reset(self):
+        """Drop partial data (e.g. after the file was truncated)."""
+        self.buffer.clear()
+        self.in_frame = False
+        self.scanned = 0
+
+
+def _inotify_fd(path: str) -> Optional[int]:
+    """Non-blocking inotify descriptor watching a file for writes, or None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(path), _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class LiveIngest:
+    """Reads one live source and fans frames out to subscribers."""
+
+    def __init__(self, path: str, fps: float = 30, resolution: Optional[Tuple[int, int]] = None,
+                 from_start: bool = False):
+        """
+        Start ingesting.
+
+        Args:
+            path: Growing MJPEG file, FIFO, or "-" for stdin
+            fps: Nominal capture rate reported to sessions
+            resolution: Capture resolution reported to sessions
+            from_start: Read a growing file from the beginning instead of
+                only frames written from now on
+        """
+        self.path = path
+        self.key = _source_key(path)
+        self.fps = fps
+        self.resolution = resolution
+        self.pinned = False  # Started with --live: kept running without subscribers
+        self.scanner = MjpegScanner()
+        self.subscribers: List["LiveSubscription"] = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.ended = False
+        self.frames = 0
+        self.bytes = 0
+        self.last_frame: Optional[Tuple[bytes, float]] = None  # (data, ingest time)
+
+        self.fifo_writer = None
+        self.watch_fd = None
+        if path == STDIN_PATH:
+            self.fd = sys.stdin.fileno()
+            self.kind = "stdin"
+        elif stat.S_ISFIFO(os.stat(path).st_mode):
+            self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            # Our own writer end keeps the FIFO from hitting EOF while the
+            # camera process restarts
+            self.fifo_writer = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            self.kind = "fifo"
+        else:
+            self.fd = os.open(path, os.O_RDONLY)
+            if not from_start:
+                os.lseek(self.fd, 0, os.SEEK_END)
+            self.watch_fd = _inotify_fd(path)
+            self.kind = "file"
+
+        self.thread = threading.Thread(target=self._run, name=f"LiveIngest:{path}", daemon=True)
+        self.thread.start()
+        log.info("live ingest started", path=path, kind=self.kind,
+                 inotify=self.watch_fd is not None)
+
+    def subscribe(self, depth: int = SUBSCRIBER_DEPTH) -> "LiveSubscription":
+        """New session view; it sees frames ingested from now on."""
+        subscription = LiveSubscription(self, depth)
+        with self.lock:
+            last = self.last_frame
+            # MJPEG frames stand alone: start with the current picture if
+            # it is still fresh instead of waiting a whole frame interval
+            if last is not None and time.monotonic() - last[1] < 2.0 / self.fps:
+                subscription._push(*last)
+            self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: "LiveSubscription") -> bool:
+        """Remove a subscriber; returns False if it was not subscribed."""
+        with self.lock:
+            if subscription not in self.subscribers:
+                return False
+            self.subscribers.remove(subscription)
+            return True
+
+    def _publish(self, frame: bytes):
+        now = time.monotonic()
+        self.frames += 1
+        self.bytes += len(frame)
+        with self.lock:
+            self.last_frame = (frame, now)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription._push(frame, now)
+
+    def _wait_readable(self, fd: int) -> bool:
+        readable, _, _ = select.select([fd], [], [], 0.5)
+        return bool(readable)
+
+    def _wait_for_growth(self):
+        """Block until a growing file changes (or a poll interval passes)."""
+        if self.watch_fd is None:
+            self.stopped.wait(POLL_INTERVAL)
+            return
+        if self._wait_readable(self.watch_fd):
+            try:
+                os.read(self.watch_fd, 4096)  # Drain the events
+            except BlockingIOError:
+                pass
+
+    def _run(self):
+        try:
+            while not self.stopped.is_set():
+                if self.kind != "file" and not self._wait_readable(self.fd):
+                    continue
+                try:
+                    chunk = os.read(self.fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                if chunk:
+                    for frame in self.scanner.feed(chunk):
+                        self._publish(frame)
+                elif self.kind == "stdin":
+                    break  # Upstream closed the pipe
+                elif self.kind == "file":
+                    if os.fstat(self.fd).st_size < os.lseek(self.fd, 0, os.SEEK_CUR):
+                        # Truncated or rewritten in place: follow from the start
+                        os.lseek(self.fd, 0, os.SEEK_SET)
+                        self.scanner.reset()
+                        continue
+                    self._wait_for_growth()
+        except OSError as e:
+            log.warning("live ingest failed", path=self.path, error=e)
+        finally:
+            self.ended = True
+            with self.lock:
+                subscribers = list(self.subscribers)
+            for subscription in subscribers:
+                subscription._wake()
+            log.info("live ingest ended", path=self.path, frames=self.frames)
+
+    def get_stats(self) -> Dict:
+        """Get ingest statistics."""
+        with self.lock:
+            subscribers = len(self.subscribers)
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'discarded_bytes': self.scanner.discarded,
+            'subscribers': subscribers,
+            'ended': self.ended,
+        }
+
+    def stop(self):
+        """Stop ingesting and release the source (once; later calls do nothing)."""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join(timeout=1.0)
+        for fd in (self.watch_fd, self.fifo_writer, None if self.kind == "stdin" else self.fd):
+            if fd is not None:
+                os.close(fd)
+        self.watch_fd = self.fifo_writer = None
+
+
+class LiveSubscription(FrameSource):
+    """One session's view of a live ingest, as a FrameSource."""
+
+    live = True
+
+    def __init__(self, ingest: LiveIngest, depth: int):
+        self.ingest = ingest
+        self.filename = LIVE_PREFIX + ingest.path
+        self.fps = ingest.fps
+        self.resolution = ingest.resolution
+        self.depth = depth
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.frameNum = 0
+        self.timestamp = 0
+        self.dropped = 0
+        self.max_latency = 0.0
+
+    def _push(self, frame: bytes, ingested: float):
+        with self.condition:
+            if len(self.queue) >= self.depth:
+                # Consumer is behind: the oldest frame is already stale
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append((frame, ingested))
+            self.condition.notify()
+
+    def _wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def nextFrame(self, timeout: float = FRAME_WAIT):
+        """
+        Wait for the next live frame.
+
+        Args:
+            timeout: Longest wait in seconds
+
+        Returns:
+            Frame data, or None if none arrived in time or the source ended
+        """
+        with self.condition:
+            if not self.queue and not self.closed and not self.ingest.ended:
+                self.condition.wait(timeout)
+            if not self.queue:
+                return None
+            frame, ingested = self.queue.popleft()
+        self.frameNum += 1
+        # Capture clock: frames keep their real spacing, drops included
+        self.timestamp = int(ingested * MEDIA_CLOCK_RATE) & 0xFFFFFFFF
+        self.max_latency = max(self.max_latency, time.monotonic() - ingested)
+        return frame
+
+    def frameNbr(self) -> int:
+        return self.frameNum
+
+    def frameTimestamp(self) -> int:
+        """90 kHz timestamp of the last frame, from its ingest time."""
+        return self.timestamp
+
+    @property
+    def ended(self) -> bool:
+        """True once the subscription is closed, or the source has ended and
+        every queued frame was taken: nextFrame() no longer waits."""
+        return self.closed or (self.ingest.ended and not self.queue)
+
+    def get_stats(self) -> Dict:
+        """Get delivery statistics for this session."""
+        return {
+            'frames': self.frameNum,
+            'dropped': self.dropped,
+            'queued': len(self.queue),
+            'max_latency_ms': self.max_latency * 1000,
+        }
+
+    def close(self):
+        """Stop receiving frames; the ingest keeps running for other sessions."""
+        with self.condition:
+            self.closed = True
+            self.queue.clear()
+            self.condition.notify_all()
+        _release(self.ingest, self)
+
+
+_ingests: Dict[str, LiveIngest] = {}
+_served = set()  # Keys of the sources started with start_ingest() (--live)
+_ingests_lock = threading.Lock()
+
+
+def _strip_prefix(path: str) -> str:
+    return path[len(LIVE_PREFIX):] if path.startswith(LIVE_PREFIX) else path
+
+
+def _source_key(path: str) -> str:
+    """One key per source, however a client spells its path."""
+    return path if path == STDIN_PATH else os.path.realpath(path)
+
+
+def _open_ingest(path: str, fps: Optional[float],
+                 resolution: Optional[Tuple[int, int]]) -> LiveIngest:
+    """Running ingest for a source, started if needed (caller holds _ingests_lock)."""
+    key = _source_key(path)
+    ingest = _ingests.get(key)
+    if ingest is None or ingest.ended:
+        try:
+            ingest = LiveIngest(path, fps=fps or 30, resolution=resolution)
+        except OSError as e:
+            raise IOError(f"Cannot open live source: {path}") from e
+        ingest.pinned = key in _served
+        previous = _ingests.get(key)
+        _ingests[key] = ingest
+        if previous is not None and not previous.subscribers:
+            previous.stop()  # Ended; nobody left to release it
+    return ingest
+
+
+def _release(ingest: LiveIngest, subscription: LiveSubscription):
+    """Unsubscribe; the last subscriber out stops an ingest nobody pinned."""
+    with _ingests_lock:
+        if not ingest.unsubscribe(subscription) or ingest.subscribers:
+            return
+        current = _ingests.get(ingest.key) is ingest
+        if ingest.pinned and current:
+            return
+        if current:
+            del _ingests[ingest.key]
+    ingest.stop()
+
+
+def start_ingest(path: str, fps: Optional[float] = None,
+                 resolution: Optional[Tuple[int, int]] = None) -> LiveIngest:
+    """
+    Serve a live source (--live): start its ingest now and keep it running
+    until stop_all(), whether or not any session is subscribed.
+
+    Args:
+        path: "live:<path>", a FIFO path, or "live:-" (or "-") for stdin
+        fps: Nominal capture rate (default 30)
+        resolution: Capture resolution, if known
+
+    Raises:
+        IOError: If the source cannot be opened
+    """
+    path = _strip_prefix(path)
+    with _ingests_lock:
+        _served.add(_source_key(path))
+        ingest = _open_ingest(path, fps, resolution)
+        ingest.pinned = True
+    return ingest
+
+
+def live_source(path: str, fps: Optional[float] = None,
+                resolution: Optional[Tuple[int, int]] = None,
+                depth: int = SUBSCRIBER_DEPTH, start: bool = False) -> LiveSubscription:
+    """
+    Subscribe a session to a live source.
+
+    Args:
+        depth: Frames buffered for this subscriber before dropping
+        start: Open a source that start_ingest() did not; its ingest stops
+            with the last subscriber. Sessions never set this, so a client
+            cannot make the server tail an arbitrary file or read stdin
+
+    Raises:
+        IOError: If the source is not served or cannot be opened
+    """
+    path = _strip_prefix(path)
+    with _ingests_lock:
+        if not start and _source_key(path) not in _served:
+            raise IOError(f"Not a served live source: {path}")
+        return _open_ingest(path, fps, resolution).subscribe(depth)
+
+
+def stop_all():
+    """Stop every running ingest (server shutdown, tests)."""
+    with _ingests_lock:
+        ingests = list(_ingests.values())
+        _ingests.clear()
+        _served.clear()
+    for ingest in ingests:
+        ingest.stop()
@@ -0,0 +1,196 @@
+"""
+MetricsExporter.py - Prometheus text-format metrics for the streaming server
+Collects cheap snapshots from every session's NetworkAnalytics and serves
+them over HTTP at /metrics
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from FrameCache import FRAME_CACHE
+from LatencyHistogram import LatencyHistogram, merge_histograms
+
+
+# (snapshot key, metric suffix, type, help)
+SESSION_METRICS = (
+    ('bytes_sent', 'bytes_sent_total', 'counter', 'Bytes sent over RTP'),
+    ('packets_sent', 'packets_sent_total', 'counter', 'RTP packets sent'),
+    ('packets_lost', 'packets_lost_total', 'counter', 'RTP packets lost or failed'),
+    ('send_errors', 'send_errors_total', 'counter', 'Socket send errors'),
+    ('frames_lost', 'frames_lost_total', 'counter', 'Frames lost'),
+    ('pacing_lag_seconds', 'pacing_lag_seconds', 'gauge', 'Seconds the sender is behind schedule'),
+    ('max_pacing_lag_seconds', 'max_pacing_lag_seconds', 'gauge', 'Worst pacing lag seen'),
+    ('late_frames', 'late_frames_total', 'counter', 'Frames sent after their scheduled time'),
+)
+
+# Exposition buckets for latency histograms, in seconds
+HISTOGRAM_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+# (FrameCache stats key, metric suffix, type, help)
+FRAME_CACHE_METRICS = (
+    ('hits', 'frame_cache_hits_total', 'counter', 'Frames served from the shared frame cache'),
+    ('misses', 'frame_cache_misses_total', 'counter', 'Frames read from disk'),
+    ('evictions', 'frame_cache_evictions_total', 'counter', 'Frames evicted from the cache'),
+    ('bytes', 'frame_cache_bytes', 'gauge', 'Bytes held by the frame cache'),
+)
+
+HISTOGRAM_HELP = {
+    'latency': 'Frame latency',
+    'one_way': 'One-way delay from the RTP send-time extension, above the smallest transit',
+    'glass_to_glass': 'Send-to-display latency, above the smallest transit',
+    'jitter': 'Per-frame transit time variation',
+}
+
+
+class MetricsRegistry:
+    """Live sessions whose analytics are exported."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}  # session id -> NetworkAnalytics
+        # Counters of finished sessions, so aggregates stay monotonic
+        self.retired = {key: 0 for key, _, kind, _ in SESSION_METRICS if kind == 'counter'}
+        self.retired_histograms: Dict[str, LatencyHistogram] = {}
+
+    def register(self, session_id, analytics):
+        """Start exporting a session's analytics."""
+        with self.lock:
+            self.sessions[session_id] = analytics
+
+    def unregister(self, session_id):
+        """Stop exporting a session, folding its counters into the totals."""
+        with self.lock:
+            analytics = self.sessions.pop(session_id, None)
+            if analytics is None:
+                return
+            snapshot = analytics.snapshot()
+            for key in self.retired:
+                self.retired[key] += snapshot[key]
+            for name, histogram in snapshot['histograms'].items():
+                if name in self.retired_histograms:
+                    self.retired_histograms[name].merge(histogram)
+                else:
+                    self.retired_histograms[name] = histogram
+
+    def collect(self):
+        """Snapshot every live session (registry lock held only to copy the list)."""
+        with self.lock:
+            sessions = list(self.sessions.items())
+            retired = dict(self.retired)
+            retired_histograms = {n: h.copy() for n, h in self.retired_histograms.items()}
+        return [(sid, analytics.snapshot()) for sid, analytics in sessions], retired, retired_histograms
+
+
+# Process-wide default registry used by ServerWorker
+REGISTRY = MetricsRegistry()
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(registry: MetricsRegistry = REGISTRY, prefix: str = 'rtp') -> str:
+    """Render all metrics in Prometheus text exposition format."""
+    snapshots, retired, retired_histograms = registry.collect()
+    lines: List[str] = []
+
+    lines.append(f"# HELP {prefix}_active_sessions Sessions currently registered")
+    lines.append(f"# TYPE {prefix}_active_sessions gauge")
+    lines.append(f"{prefix}_active_sessions {len(snapshots)}")
+
+    for key, suffix, kind, help_text in SESSION_METRICS:
+        # Per-session series
+        name = f"{prefix}_session_{suffix}"
+        lines.append(f"# HELP {name} {help_text} (per session)")
+        lines.append(f"# TYPE {name} {kind}")
+        for session_id, snapshot in snapshots:
+            lines.append(f'{name}{{session="{session_id}"}} {_format_value(snapshot[key])}')
+
+        # Server-wide aggregate
+        name = f"{prefix}_{suffix}"
+        if kind == 'counter':
+            total = retired[key] + sum(snapshot[key] for _, snapshot in snapshots)
+        else:
+            total = max((snapshot[key] for _, snapshot in snapshots), default=0.0)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_format_value(total)}")
+
+    for hist_name, help_text in HISTOGRAM_HELP.items():
+        histograms = [snapshot['histograms'][hist_name] for _, snapshot in snapshots]
+        if hist_name in retired_histograms:
+            histograms.append(retired_histograms[hist_name])
+        merged = merge_histograms(histograms) or LatencyHistogram()
+
+        # Histograms record microseconds; exposition uses seconds
+        name = f"{prefix}_{hist_name}_seconds"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        bounds = [int(b * 1_000_000) for b in HISTOGRAM_BUCKETS]
+        for le, count in zip(HISTOGRAM_BUCKETS, merged.cumulative_counts(bounds)):
+            lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {merged.total_count}')
+        lines.append(f"{name}_sum {merged.total_sum / 1_000_000!r}")
+        lines.append(f"{name}_count {merged.total_count}")
+
+    cache_stats = FRAME_CACHE.get_stats()
+    for key, suffix, kind, help_text in FRAME_CACHE_METRICS:
+        name = f"{prefix}_{suffix}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {cache_stats[key]}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics from the exporter's registry."""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics(self.registry).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are periodic; keep them out of the server output
+        pass
+
+
+class MetricsExporter:
+    """Background HTTP server for the metrics endpoint."""
+
+    def __init__(self, port: int, registry: MetricsRegistry = REGISTRY, host: str = ''):
+        """
+        Initialize metrics exporter.
+
+        Args:
+            port: TCP port to serve /metrics on
+            registry: Registry of sessions to export
+            host: Interface to bind (all by default)
+        """
+        handler = type('BoundMetricsHandler', (MetricsHandler,), {'registry': registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Shut the HTTP server down."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -3,13 +3,21 @@ NetworkAnalytics.py - Network performance monitoring and analysis
 Tracks frame loss, bandwidth usage, latency, and other metrics
 """
 import time
+from array import array
 from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from RtpPacket import MEDIA_CLOCK_RATE
+from LatencyHistogram import LatencyHistogram
 
 
 class FrameStatistics:
-    """Statistics for a single frame."""
+    """Statistics for a single frame (a snapshot of one FrameStatsRing slot)."""
+    
+    __slots__ = ('frame_id', 'frame_size', 'sent_time', 'received_time',
+                 'fragment_count', 'fragments_received', 'lost_fragments',
+                 'is_complete', 'latency_ms', 'window_seq')
     
     def __init__(self, frame_id: int, frame_size: int):
         self.frame_id = frame_id
@@ -21,6 +29,7 @@ class FrameStatistics:
         self.lost_fragments = 0
         self.is_complete = False
         self.latency_ms = None
+        self.window_seq = 0  # Position in the analytics window
     
     def calculate_latency(self):
         """Calculate latency if both send and receive times are available."""
@@ -30,6 +39,174 @@ class FrameStatistics:
         return None
 
 
+class FrameStatsRing:
+    """
+    Preallocated columnar ring of per-frame statistics.
+    
+    Each field lives in its own typed array, so a 300-frame window is a
+    handful of flat buffers instead of 300 Python objects. Frames are
+    addressed by a monotonically increasing sequence number; 0 in a time
+    column means "not recorded", as does has_latency == 0 (a relative delay
+    of 0 is a real sample).
+    """
+    
+    COLUMNS = (
+        ('frame_id', 'q'),
+        ('frame_size', 'q'),
+        ('sent_time', 'd'),
+        ('received_time', 'd'),
+        ('fragment_count', 'I'),
+        ('fragments_received', 'I'),
+        ('lost_fragments', 'I'),
+        ('complete', 'B'),
+        ('latency_ms', 'd'),
+        ('has_latency', 'B'),
+    )
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array(typecode, bytes(array(typecode).itemsize * capacity)))
+        self.oldest_seq = 0
+        self.next_seq = 0
+    
+    def __len__(self):
+        return self.next_seq - self.oldest_seq
+    
+    def slot(self, seq: int) -> int:
+        return seq % self.capacity
+    
+    def contains(self, seq: int) -> bool:
+        return self.oldest_seq <= seq < self.next_seq
+    
+    def append(self, frame_id: int, frame_size: int, sent_time: float = 0.0,
+               received_time: float = 0.0, fragment_count: int = 0) -> int:
+        """Fill the next slot (the caller retires the oldest when full)."""
+        seq = self.next_seq
+        i = seq % self.capacity
+        self.frame_id[i] = frame_id
+        self.frame_size[i] = frame_size
+        self.sent_time[i] = sent_time
+        self.received_time[i] = received_time
+        self.fragment_count[i] = fragment_count
+        self.fragments_received[i] = 0
+        self.lost_fragments[i] = 0
+        self.complete[i] = 0
+        self.latency_ms[i] = 0.0
+        self.has_latency[i] = 0
+        self.next_seq += 1
+        return seq
+    
+    def pop_oldest(self) -> int:
+        seq = self.oldest_seq
+        self.oldest_seq += 1
+        return seq
+    
+    def clear(self):
+        self.oldest_seq = self.next_seq
+    
+    def get(self, seq: int) -> FrameStatistics:
+        """Materialize one slot as a FrameStatistics snapshot."""
+        i = seq % self.capacity
+        stats = FrameStatistics(self.frame_id[i], self.frame_size[i])
+        stats.sent_time = self.sent_time[i] or None
+        stats.received_time = self.received_time[i] or None
+        stats.fragment_count = self.fragment_count[i]
+        stats.fragments_received = self.fragments_received[i]
+        stats.lost_fragments = self.lost_fragments[i]
+        stats.is_complete = bool(self.complete[i])
+        stats.latency_ms = self.latency_ms[i] if self.has_latency[i] else None
+        stats.window_seq = seq
+        return stats
+    
+    def __iter__(self):
+        for seq in range(self.oldest_seq, self.next_seq):
+            yield self.get(seq)
+    
+    def column(self, name: str) -> array:
+        """Live slots of a column, oldest first, as one contiguous array."""
+        values = getattr(self, name)
+        n = len(self)
+        start = self.oldest_seq % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return values[start:end]
+        return values[start:] + values[:end - self.capacity]
+    
+    def summary(self) -> Dict:
+        """Aggregate the window from whole columns (C-level sum/count)."""
+        n = len(self)
+        latency = self.column('latency_ms')
+        latency_count = sum(self.column('has_latency'))
+        complete = sum(self.column('complete'))
+        return {
+            'frames': n,
+            'complete_frames': complete,
+            'frame_loss_rate': ((n - complete) / n * 100) if n else 0.0,
+            'bytes': sum(self.column('frame_size')),
+            'fragments': sum(self.column('fragment_count')),
+            'lost_fragments': sum(self.column('lost_fragments')),
+            'average_latency_ms': (sum(latency) / latency_count) if latency_count else 0.0,
+            'max_latency_ms': max(latency) if n else 0.0,
+        }
+
+
+class WindowedLatencyStats:
+    """
+    O(1) mean, standard deviation and max over a sliding window of samples.
+    
+    Samples are tagged with the window sequence number of their frame so the
+    owner can expire them as frames leave the window. Mean and variance use
+    Welford's algorithm with removal; the max uses a monotonic deque.
+    """
+    
+    def __init__(self):
+        self.max_candidates = deque()  # (window_seq, value), values decreasing
+        self.clear()
+    
+    def clear(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_candidates.clear()
+    
+    def add(self, window_seq: int, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        
+        # Frames usually complete in window order; a sample that completes
+        # out of order may retire a candidate slightly early
+        while self.max_candidates and self.max_candidates[-1][1] <= value:
+            self.max_candidates.pop()
+        self.max_candidates.append((window_seq, value))
+    
+    def remove(self, value: float):
+        if self.count <= 1:
+            self.count = 0
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(0.0, self.m2 - delta * (value - self.mean))
+    
+    def expire(self, window_start_seq: int):
+        """Drop max candidates belonging to frames that left the window."""
+        while self.max_candidates and self.max_candidates[0][0] < window_start_seq:
+            self.max_candidates.popleft()
+    
+    def get_max(self) -> float:
+        return self.max_candidates[0][1] if self.max_candidates else 0.0
+    
+    def get_stddev(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return (self.m2 / self.count) ** 0.5
+
+
 class NetworkAnalytics:
     """Comprehensive network analytics for video streaming."""
     
@@ -41,7 +218,14 @@ class NetworkAnalytics:
             window_size: Number of frames to keep in statistics window
         """
         self.window_size = window_size
-        self.frame_stats = deque(maxlen=window_size)
+        self.frame_stats = FrameStatsRing(window_size)
+        
+        # Incremental accumulators over frame_stats so every record and
+        # query is O(1)
+        self.frame_index = {}  # frame_id -> sequence number of newest entry
+        self.window_bytes = 0
+        self.incomplete_frames = 0
+        self.latency_window = WindowedLatencyStats()
         self.start_time = time.time()
         self.total_bytes_sent = 0
         self.total_bytes_received = 0
@@ -51,10 +235,28 @@ class NetworkAnalytics:
         
         # Performance metrics
         self.frame_loss_count = 0
+        self.frames_skipped = 0  # Catch-up jumps and superseded decodes (not late drops)
+        self.send_errors = 0
+        self.pacing_lag = 0.0      # Seconds the sender is behind schedule
+        self.max_pacing_lag = 0.0
+        self.late_frames = 0       # Frames sent after their scheduled time
         self.fragment_loss_count = 0
         self.timestamps = deque(maxlen=window_size)
         self.bandwidth_samples = deque(maxlen=100)
         
+        # Receiver timing (RTP media clock + sender send-time extension)
+        self.interarrival_jitter = 0.0  # RFC 3550 estimate, seconds
+        self.last_rtp_timestamp = None
+        self.last_arrival_time = None
+        self.min_transit = None  # Smallest arrival - send time seen, seconds
+        
+        # Session-long latency/jitter distributions (microseconds), fixed
+        # memory and mergeable across sessions and processes
+        self.latency_histogram = LatencyHistogram()        # Frame latency
+        self.one_way_histogram = LatencyHistogram()        # Send-time extension
+        self.glass_to_glass_histogram = LatencyHistogram()
+        self.jitter_histogram = LatencyHistogram()         # |transit delta|
+        
         # Adaptive bitrate control
         self.current_bitrate = 0
         self.target_bitrate = 5_000_000  # 5 Mbps default
@@ -70,16 +272,17 @@ class NetworkAnalytics:
             frame_size: Size of frame in bytes
             fragment_count: Number of fragments
         """
-        stats = FrameStatistics(frame_id, frame_size)
-        stats.sent_time = time.time()
-        stats.fragment_count = fragment_count
-        self.frame_stats.append(stats)
+        sent_time = time.time()
+        self._append_frame(frame_id, frame_size, sent_time=sent_time,
+                           fragment_count=fragment_count)
         
         self.total_bytes_sent += frame_size
         self.total_packets_sent += fragment_count
-        self.timestamps.append(stats.sent_time)
+        self.timestamps.append(sent_time)
     
-    def record_frame_received(self, frame_id: int, frame_size: int):
+    def record_frame_received(self, frame_id: int, frame_size: int,
+                              rtp_timestamp: Optional[int] = None,
+                              send_time: Optional[float] = None):
         """
         Record that a frame has been received.
         Updated to work for Client-side analytics (Receiver mode).
@@ -87,33 +290,113 @@ class NetworkAnalytics:
         Args:
             frame_id: Frame identifier
             frame_size: Size of frame in bytes
+            rtp_timestamp: 90 kHz RTP timestamp of the frame (enables jitter)
+            send_time: Sender monotonic send time from the RTP header
+                extension (enables one-way delay)
+        
+        The sender's monotonic clock has its own epoch, so arrival - send_time
+        is only a delay when both ends share a clock (same host). One-way
+        delay is therefore reported above the smallest transit seen so far,
+        as RFC 3550 compares relative transit times: queuing and jitter on
+        the path, 0 for the fastest frame. get_one_way_base() is that
+        smallest transit, the absolute floor on a single host only.
         """
         self.total_bytes_received += frame_size
         self.total_packets_received += 1
         current_time = time.time()
+        arrival = time.monotonic()
+        
+        if rtp_timestamp is not None:
+            self._update_interarrival_jitter(rtp_timestamp, arrival)
+        
+        latency_ms = None
+        if send_time is not None:
+            transit = arrival - send_time
+            if self.min_transit is None or transit < self.min_transit:
+                self.min_transit = transit
+            latency_ms = (transit - self.min_transit) * 1000
+            self.one_way_histogram.record(latency_ms * 1000)
         
         # Tìm xem frame này có thông tin gửi (Server side) hay không
-        found = False
-        for stats in self.frame_stats:
-            if stats.frame_id == frame_id:
-                stats.received_time = current_time
-                stats.is_complete = True
-                stats.calculate_latency()
-                found = True
-                break
+        ring = self.frame_stats
+        seq = self.frame_index.get(frame_id)
+        if seq is not None and not ring.complete[ring.slot(seq)]:
+            i = ring.slot(seq)
+            ring.received_time[i] = current_time
+            sent_time = ring.sent_time[i]
+            self._mark_complete(seq, (current_time - sent_time) * 1000 if sent_time else None)
         
         # --- PHẦN THÊM MỚI QUAN TRỌNG CHO CLIENT ---
         # Nếu không tìm thấy (tức là đang ở Client), tự tạo thống kê mới
-        if not found:
-            stats = FrameStatistics(frame_id, frame_size)
-            stats.received_time = current_time
-            stats.is_complete = True
-            # Ở Client, ta tạm thời không biết sent_time chính xác từ Server
-            # nên Latency sẽ khó tính chính xác, nhưng Bitrate sẽ tính được.
+        else:
+            seq = self._append_frame(frame_id, frame_size, received_time=current_time)
+            # Latency comes from the sender's send-time extension when present
+            self._mark_complete(seq, latency_ms)
             
-            self.frame_stats.append(stats)
             self.timestamps.append(current_time)  # Lưu mốc thời gian nhận để tính Bitrate
     
+    def _append_frame(self, frame_id: int, frame_size: int, sent_time: float = 0.0,
+                      received_time: float = 0.0, fragment_count: int = 0) -> int:
+        """Add a frame to the window, retiring the oldest one when full."""
+        ring = self.frame_stats
+        if len(ring) == self.window_size:
+            self._evict(ring.pop_oldest())
+        seq = ring.append(frame_id, frame_size, sent_time, received_time, fragment_count)
+        self.frame_index[frame_id] = seq
+        self.window_bytes += frame_size
+        self.incomplete_frames += 1
+        return seq
+    
+    def _evict(self, seq: int):
+        """Remove a frame's contribution from the window accumulators."""
+        ring = self.frame_stats
+        i = ring.slot(seq)
+        self.window_bytes -= ring.frame_size[i]
+        if not ring.complete[i]:
+            self.incomplete_frames -= 1
+        if ring.has_latency[i]:
+            self.latency_window.remove(ring.latency_ms[i])
+        if self.frame_index.get(ring.frame_id[i]) == seq:
+            del self.frame_index[ring.frame_id[i]]
+        self.latency_window.expire(seq + 1)
+    
+    def _mark_complete(self, seq: int, latency_ms: Optional[float]):
+        """Mark a windowed frame complete and account for its latency."""
+        ring = self.frame_stats
+        i = ring.slot(seq)
+        if not ring.complete[i]:
+            ring.complete[i] = 1
+            self.incomplete_frames -= 1
+        if latency_ms is None or latency_ms < 0:
+            return  # Not measured, or a clock stepped back: not a delay
+        ring.latency_ms[i] = latency_ms
+        ring.has_latency[i] = 1
+        self.latency_window.add(seq, latency_ms)
+        self.latency_histogram.record(latency_ms * 1000)
+    
+    def _update_interarrival_jitter(self, rtp_timestamp: int, arrival: float):
+        """Update the RFC 3550 interarrival jitter estimate."""
+        if self.last_rtp_timestamp is not None:
+            # Signed 32-bit difference handles timestamp wrap-around
+            ts_delta = ((rtp_timestamp - self.last_rtp_timestamp + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+            d = (arrival - self.last_arrival_time) - ts_delta / MEDIA_CLOCK_RATE
+            self.interarrival_jitter += (abs(d) - self.interarrival_jitter) / 16
+            self.jitter_histogram.record(abs(d) * 1_000_000)
+        self.last_rtp_timestamp = rtp_timestamp
+        self.last_arrival_time = arrival
+    
+    def record_frame_displayed(self, send_time: Optional[float]):
+        """
+        Record that a frame reached the screen (glass-to-glass latency),
+        above the smallest network transit like the one-way delay.
+        
+        Args:
+            send_time: Sender monotonic send time of the frame
+        """
+        if send_time is not None and self.min_transit is not None:
+            delay = time.monotonic() - send_time - self.min_transit
+            self.glass_to_glass_histogram.record(delay * 1_000_000)
+    
     def record_packet_loss(self, frame_id: int, packet_count: int = 1):
         """
         Record packet loss.
@@ -125,17 +408,38 @@ class NetworkAnalytics:
         self.total_packets_lost += packet_count
         self.fragment_loss_count += packet_count
         
-        # Find matching frame
-        for stats in self.frame_stats:
-            if stats.frame_id == frame_id:
-                stats.lost_fragments += packet_count
-                break
+        seq = self.frame_index.get(frame_id)
+        if seq is not None:
+            self.frame_stats.lost_fragments[self.frame_stats.slot(seq)] += packet_count
+    
+    def record_send_error(self):
+        """Record a failed socket send."""
+        self.send_errors += 1
+    
+    def record_pacing_lag(self, lag: float, late: bool = False):
+        """
+        Record how far behind its schedule the sender emitted a frame.
+        
+        Args:
+            lag: Seconds late (negative when early)
+            late: The frame missed its send time by more than the
+                scheduler's tolerance
+        """
+        self.pacing_lag = lag
+        if lag > self.max_pacing_lag:
+            self.max_pacing_lag = lag
+        if late:
+            self.late_frames += 1
     
     def record_frame_loss(self, frame_id: int):
         """Record that an entire frame was lost."""
         self.frame_loss_count += 1
         self.total_packets_lost += 1
     
+    def record_frames_skipped(self, count: int = 1):
+        """Record frames the receiver skipped to catch up (jitter buffer or decoder)."""
+        self.frames_skipped += count
+    
     def get_frame_loss_rate(self) -> float:
         """
         Get frame loss rate as percentage.
@@ -147,8 +451,16 @@ class NetworkAnalytics:
         if total_frames == 0:
             return 0.0
         
-        lost = sum(1 for s in self.frame_stats if not s.is_complete)
-        return (lost / total_frames) * 100
+        return (self.incomplete_frames / total_frames) * 100
+    
+    def get_window_summary(self) -> Dict:
+        """
+        Summarize the frame window straight from the columnar storage.
+        
+        Returns:
+            Frames, completion, bytes, fragment and latency aggregates
+        """
+        return self.frame_stats.summary()
     
     def get_packet_loss_rate(self) -> float:
         """
@@ -170,15 +482,11 @@ class NetworkAnalytics:
         Returns:
             Average latency (ms)
         """
-        latencies = [s.latency_ms for s in self.frame_stats if s.latency_ms]
-        if not latencies:
-            return 0.0
-        return sum(latencies) / len(latencies)
+        return self.latency_window.mean
     
     def get_max_latency(self) -> float:
         """Get maximum latency in milliseconds."""
-        latencies = [s.latency_ms for s in self.frame_stats if s.latency_ms]
-        return max(latencies) if latencies else 0.0
+        return self.latency_window.get_max()
     
     def get_current_bitrate(self) -> float:
         """
@@ -194,8 +502,7 @@ class NetworkAnalytics:
         if time_delta == 0:
             return 0.0
         
-        bytes_sent = sum(s.frame_size for s in list(self.frame_stats)[-self.window_size:])
-        bits = bytes_sent * 8
+        bits = self.window_bytes * 8
         mbps = (bits / time_delta) / 1_000_000
         return mbps
     
@@ -257,13 +564,44 @@ class NetworkAnalytics:
         Returns:
             Jitter in milliseconds
         """
-        latencies = [s.latency_ms for s in self.frame_stats if s.latency_ms]
-        if len(latencies) < 2:
-            return 0.0
+        return self.latency_window.get_stddev()  # Standard deviation
+    
+    def get_interarrival_jitter(self) -> float:
+        """Get RFC 3550 interarrival jitter in milliseconds."""
+        return self.interarrival_jitter * 1000
+    
+    def get_one_way_base(self) -> float:
+        """
+        Get the smallest transit (arrival - send time) seen, in milliseconds.
         
-        avg_latency = sum(latencies) / len(latencies)
-        variance = sum((l - avg_latency) ** 2 for l in latencies) / len(latencies)
-        return variance ** 0.5  # Standard deviation
+        One-way and glass-to-glass delays are measured above it. Only on a
+        single host, where both ends read the same monotonic clock, is it
+        the absolute network delay; across hosts it includes the clock offset.
+        """
+        return self.min_transit * 1000 if self.min_transit is not None else 0.0
+    
+    @staticmethod
+    def _percentiles(histogram: LatencyHistogram, percents=(50, 95, 99)) -> Dict[int, float]:
+        """Percentiles of a microsecond histogram, in milliseconds."""
+        return {p: v / 1000 for p, v in histogram.percentiles(percents).items()}
+    
+    def get_histograms(self) -> Dict[str, LatencyHistogram]:
+        """Get the session's latency and jitter histograms (microseconds)."""
+        return {
+            'latency': self.latency_histogram,
+            'one_way': self.one_way_histogram,
+            'glass_to_glass': self.glass_to_glass_histogram,
+            'jitter': self.jitter_histogram,
+        }
+    
+    def get_latency_percentiles(self) -> Dict[str, Dict[int, float]]:
+        """
+        Get p50/p95/p99 of every latency and jitter histogram.
+        
+        Returns:
+            {'one_way': {50: ms, 95: ms, 99: ms}, 'glass_to_glass': {...}, ...}
+        """
+        return {name: self._percentiles(h) for name, h in self.get_histograms().items()}
     
     def get_statistics_summary(self) -> Dict:
         """
@@ -273,12 +611,15 @@ class NetworkAnalytics:
             Dictionary with all metrics
         """
         elapsed = time.time() - self.start_time
+        g2g = self._percentiles(self.glass_to_glass_histogram)
+        latency = self._percentiles(self.latency_histogram)
         
         return {
             'elapsed_seconds': elapsed,
             'frames_sent': self.total_packets_sent,
             'frames_received': self.total_packets_received,
             'frame_loss_count': self.frame_loss_count,
+            'frames_skipped': self.frames_skipped,
             'frame_loss_rate': f"{self.get_frame_loss_rate():.2f}%",
             'packet_loss_rate': f"{self.get_packet_loss_rate():.2f}%",
             'total_bytes_sent': self.total_bytes_sent,
@@ -287,15 +628,57 @@ class NetworkAnalytics:
             'average_bitrate_mbps': f"{self.get_average_bitrate():.2f}",
             'average_latency_ms': f"{self.get_average_latency():.2f}",
             'max_latency_ms': f"{self.get_max_latency():.2f}",
+            'latency_p50_ms': f"{latency[50]:.2f}",
+            'latency_p95_ms': f"{latency[95]:.2f}",
+            'latency_p99_ms': f"{latency[99]:.2f}",
             'jitter_ms': f"{self.get_jitter():.2f}",
+            'interarrival_jitter_ms': f"{self.get_interarrival_jitter():.2f}",
+            'one_way_base_ms': f"{self.get_one_way_base():.2f}",
+            'glass_to_glass_p50_ms': f"{g2g[50]:.2f}",
+            'glass_to_glass_p95_ms': f"{g2g[95]:.2f}",
+            'glass_to_glass_p99_ms': f"{g2g[99]:.2f}",
             'recommended_bitrate_mbps': f"{self.get_adaptive_bitrate() / 1_000_000:.2f}",
         }
     
+    def snapshot(self) -> Dict:
+        """
+        Raw counters, gauges and histogram copies for metrics export.
+        
+        Only reads attributes and copies histogram buffers, so it never
+        blocks the send path.
+        """
+        return {
+            'bytes_sent': self.total_bytes_sent,
+            'bytes_received': self.total_bytes_received,
+            'packets_sent': self.total_packets_sent,
+            'packets_received': self.total_packets_received,
+            'packets_lost': self.total_packets_lost,
+            'send_errors': self.send_errors,
+            'frames_lost': self.frame_loss_count,
+            'frames_skipped': self.frames_skipped,
+            'window_bytes': self.window_bytes,
+            'interarrival_jitter_seconds': self.interarrival_jitter,
+            'pacing_lag_seconds': self.pacing_lag,
+            'max_pacing_lag_seconds': self.max_pacing_lag,
+            'late_frames': self.late_frames,
+            'histograms': {name: h.copy() for name, h in self.get_histograms().items()},
+        }
+    
     def reset(self):
         """Reset all statistics."""
         self.frame_stats.clear()
+        self.frame_index.clear()
+        self.window_bytes = 0
+        self.incomplete_frames = 0
+        self.latency_window.clear()
         self.timestamps.clear()
         self.bandwidth_samples.clear()
+        for histogram in self.get_histograms().values():
+            histogram.reset()
+        self.interarrival_jitter = 0.0
+        self.last_rtp_timestamp = None
+        self.last_arrival_time = None
+        self.min_transit = None
         self.start_time = time.time()
         self.total_bytes_sent = 0
         self.total_bytes_received = 0
@@ -303,5 +686,10 @@ class NetworkAnalytics:
         self.total_packets_received = 0
         self.total_packets_lost = 0
         self.frame_loss_count = 0
+        self.frames_skipped = 0
+        self.send_errors = 0
+        self.pacing_lag = 0.0
+        self.max_pacing_lag = 0.0
+        self.late_frames = 0
         self.fragment_loss_count = 0
         self.current_bitrate = 0
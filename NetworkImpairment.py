@@ -0,0 +1,355 @@
+"""
+NetworkImpairment.py - Deterministic network impairment for loopback testing
+Applies loss (Bernoulli or Gilbert-Elliott), delay, jitter, reordering,
+duplication and a bandwidth cap to UDP traffic, either in-process by
+wrapping a socket or as a local forwarding proxy. Every random decision
+comes from seeded generators, so a given seed replays the same pattern
+for the same packet sequence without root or netem
+"""
+import heapq
+import itertools
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from StructuredLogging import get_logger
+
+log = get_logger("NetworkImpairment")
+
+
+class BernoulliLoss:
+    """Independent loss with a fixed probability per packet."""
+
+    def __init__(self, rate: float, rng: random.Random):
+        self.rate = rate
+        self.rng = rng
+
+    def lost(self) -> bool:
+        return self.rng.random() < self.rate
+
+    @property
+    def mean_loss(self) -> float:
+        return self.rate
+
+
+class GilbertElliottLoss:
+    """Two-state Markov loss model producing bursts."""
+
+    def __init__(self, p: float, r: float, rng: random.Random,
+                 loss_good: float = 0.0, loss_bad: float = 1.0):
+        """
+        Initialize Gilbert-Elliott loss.
+
+        Args:
+            p: Probability of moving from the good to the bad state per packet
+            r: Probability of moving from the bad to the good state per packet
+                (mean burst length is 1/r packets)
+            rng: Seeded random generator
+            loss_good: Loss probability in the good state
+            loss_bad: Loss probability in the bad state
+        """
+        self.p = p
+        self.r = r
+        self.rng = rng
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def lost(self) -> bool:
+        rng = self.rng
+        if self.bad:
+            if rng.random() < self.r:
+                self.bad = False
+        elif rng.random() < self.p:
+            self.bad = True
+        return rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+    @property
+    def mean_loss(self) -> float:
+        """Long-run loss rate from the stationary state probabilities."""
+        if self.p + self.r == 0:
+            return self.loss_good
+        bad_share = self.p / (self.p + self.r)
+        return bad_share * self.loss_bad + (1 - bad_share) * self.loss_good
+
+
+class NetworkImpairment:
+    """Decides the fate of each packet: dropped, or delivered one or more times."""
+
+    def __init__(self, loss: float = 0.0, ge_p: float = 0.0, ge_r: float = 0.0,
+                 ge_loss_good: float = 0.0, ge_loss_bad: float = 1.0,
+                 delay: float = 0.0, jitter: float = 0.0,
+                 reorder: float = 0.0, reorder_gap: float = 0.01,
+                 duplicate: float = 0.0, bandwidth: Optional[float] = None,
+                 queue_delay: float = 0.2, seed: int = 0):
+        """
+        Initialize network impairment.
+
+        Args:
+            loss: Bernoulli loss probability (ignored when ge_p is set)
+            ge_p: Gilbert-Elliott good->bad probability (enables burst loss)
+            ge_r: Gilbert-Elliott bad->good probability
+            ge_loss_good: Loss probability in the good state
+            ge_loss_bad: Loss probability in the bad state
+            delay: Fixed one-way delay in seconds
+            jitter: Standard deviation of extra delay in seconds; packets
+                may overtake each other, as with netem
+            reorder: Probability a packet is held back by reorder_gap so
+                later packets overtake it
+            reorder_gap: Extra delay of a reordered packet in seconds
+            duplicate: Probability a packet is delivered twice
+            bandwidth: Link rate in bits/s (None for unlimited)
+            queue_delay: Longest a packet may wait for the capped link
+                before it is tail-dropped, in seconds
+            seed: Seed for all random decisions
+        """
+        # One generator per impairment so changing one setting does not
+        # shift the random sequence of the others
+        def rng(name):
+            return random.Random(f"{seed}:{name}")
+
+        if ge_p > 0:
+            self.loss_model = GilbertElliottLoss(ge_p, ge_r, rng("loss"), ge_loss_good, ge_loss_bad)
+        elif loss > 0:
+            self.loss_model = BernoulliLoss(loss, rng("loss"))
+        else:
+            self.loss_model = None
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.reorder_gap = reorder_gap
+        self.duplicate = duplicate
+        self.bandwidth = bandwidth
+        self.queue_delay = queue_delay
+        self.jitter_rng = rng("jitter")
+        self.reorder_rng = rng("reorder")
+        self.duplicate_rng = rng("duplicate")
+        self.link_free_at = 0.0
+
+        self.packets_in = 0
+        self.packets_lost = 0
+        self.packets_queue_dropped = 0
+        self.packets_reordered = 0
+        self.packets_duplicated = 0
+        self.packets_delivered = 0
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'NetworkImpairment':
+        """
+        Build from a comma-separated spec, e.g. "loss=0.02,delay=0.04,jitter=0.01,seed=7".
+        Keys are the constructor argument names; "dup" and "rate" are
+        accepted for duplicate and bandwidth.
+        """
+        aliases = {'dup': 'duplicate', 'rate': 'bandwidth'}
+        kwargs = {}
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            key, _, value = item.partition('=')
+            key = aliases.get(key.strip(), key.strip())
+            kwargs[key] = int(value) if key == 'seed' else float(value)
+        return cls(**kwargs)
+
+    def process(self, size: int, now: float) -> List[float]:
+        """
+        Decide what happens to one packet.
+
+        Args:
+            size: Packet size in bytes
+            now: Time the packet is sent (monotonic seconds)
+
+        Returns:
+            Delivery times, one per copy (empty if the packet is dropped)
+        """
+        self.packets_in += 1
+        # Draw every decision for every packet so the sequences stay aligned
+        lost = self.loss_model.lost() if self.loss_model else False
+        reordered = self.reorder > 0 and self.reorder_rng.random() < self.reorder
+        duplicated = self.duplicate > 0 and self.duplicate_rng.random() < self.duplicate
+        extra = abs(self.jitter_rng.gauss(0.0, self.jitter)) if self.jitter > 0 else 0.0
+
+        if lost:
+            self.packets_lost += 1
+            return []
+
+        departure = now
+        if self.bandwidth:
+            start = max(now, self.link_free_at)
+            if start - now > self.queue_delay:
+                self.packets_queue_dropped += 1
+                return []
+            self.link_free_at = start + size * 8 / self.bandwidth
+            departure = self.link_free_at
+
+        deliver = departure + self.delay + extra
+        if reordered:
+            deliver += self.reorder_gap
+            self.packets_reordered += 1
+        times = [deliver]
+        if duplicated:
+            times.append(deliver)
+            self.packets_duplicated += 1
+        self.packets_delivered += len(times)
+        return times
+
+    def get_stats(self) -> Dict:
+        """Get impairment counters."""
+        return {
+            'packets_in': self.packets_in,
+            'packets_lost': self.packets_lost,
+            'packets_queue_dropped': self.packets_queue_dropped,
+            'packets_reordered': self.packets_reordered,
+            'packets_duplicated': self.packets_duplicated,
+            'packets_delivered': self.packets_delivered,
+            'loss_rate': ((self.packets_lost + self.packets_queue_dropped) / self.packets_in
+                          if self.packets_in else 0.0),
+        }
+
+
+class DelayLine:
+    """Single background thread that sends datagrams at their delivery times."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap: List[Tuple[float, int, socket.socket, bytes, tuple]] = []
+        self.counter = itertools.count()
+        self.thread = threading.Thread(target=self._run, name="DelayLine", daemon=True)
+        self.thread.start()
+
+    def schedule(self, when: float, sock: socket.socket, data: bytes, address):
+        with self.condition:
+            heapq.heappush(self.heap, (when, next(self.counter), sock, data, address))
+            if self.heap[0][0] == when:
+                self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                wait = self.heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                _, _, sock, data, address = heapq.heappop(self.heap)
+            try:
+                if address is None:
+                    sock.send(data)  # Connected socket
+                else:
+                    sock.sendto(data, address)
+            except OSError:
+                pass  # Socket closed while the packet was in flight
+
+
+_delay_line: Optional[DelayLine] = None
+_delay_line_lock = threading.Lock()
+
+
+def delay_line() -> DelayLine:
+    """Process-wide delay line, started on first use."""
+    global _delay_line
+    with _delay_line_lock:
+        if _delay_line is None:
+            _delay_line = DelayLine()
+        return _delay_line
+
+
+class ImpairedSocket:
+    """UDP socket wrapper whose send()/sendto() go through a NetworkImpairment."""
+
+    def __init__(self, sock: socket.socket, impairment: NetworkImpairment):
+        self.sock = sock
+        self.impairment = impairment
+        self.lock = threading.Lock()
+
+    def sendto(self, data: bytes, address) -> int:
+        now = time.monotonic()
+        with self.lock:
+            times = self.impairment.process(len(data), now)
+        line = delay_line()
+        for when in times:
+            if when > now:
+                line.schedule(when, self.sock, data, address)
+            elif address is None:
+                self.sock.send(data)
+            else:
+                self.sock.sendto(data, address)
+        # Like a real network, loss is invisible to the sender
+        return len(data)
+
+    def send(self, data: bytes) -> int:
+        """Send on a connected socket."""
+        return self.sendto(data, None)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class ImpairmentProxy:
+    """Local UDP forwarder applying an impairment to everything it relays."""
+
+    def __init__(self, target: Tuple[str, int], impairment: NetworkImpairment,
+                 listen: Tuple[str, int] = ('127.0.0.1', 0)):
+        """
+        Initialize impairment proxy.
+
+        Args:
+            target: (host, port) datagrams are forwarded to
+            impairment: Impairment applied on the way
+            listen: (host, port) to receive on (port 0 picks a free one)
+        """
+        self.target = target
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(listen)
+        self.output = ImpairedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), impairment)
+        self.running = False
+        self.thread = threading.Thread(target=self._run, name="ImpairmentProxy", daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.socket.getsockname()
+
+    def start(self):
+        """Start forwarding in a daemon thread."""
+        self.running = True
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            try:
+                data = self.socket.recv(65536)
+            except OSError:
+                break
+            self.output.sendto(data, self.target)
+
+    def stop(self):
+        """Stop forwarding and close the sockets."""
+        self.running = False
+        self.socket.close()
+        self.output.close()
+
+
+if __name__ == "__main__":
+    from StructuredLogging import setup_logging
+    try:
+        listen_port = int(sys.argv[1])
+        host, _, port = sys.argv[2].rpartition(':')
+        spec = sys.argv[3] if len(sys.argv) > 3 else ""
+    except (IndexError, ValueError):
+        print("[Usage: NetworkImpairment.py Listen_port Target_host:port "
+              "[loss=0.02,delay=0.04,jitter=0.01,seed=1]]\n")
+        sys.exit(1)
+
+    setup_logging()
+    impairment = NetworkImpairment.from_spec(spec)
+    proxy = ImpairmentProxy((host or '127.0.0.1', int(port)), impairment,
+                            listen=('', listen_port)).start()
+    log.info("impairment proxy started", listen=listen_port, target=sys.argv[2], spec=spec)
+    try:
+        while True:
+            time.sleep(5)
+            log.info("impairment stats", **impairment.get_stats())
+    except KeyboardInterrupt:
+        proxy.stop()
@@ -0,0 +1,279 @@
+"""
+PacketCache.py - Pre-packetized "hint track" files for hot content
+A hint file is built once per media file and stores every RTP payload the
+server would send (fragmentation header + JPEG slice) together with frame
+and packet tables. ServerWorker maps it read-only and streams each packet
+as a freshly packed 12-byte RTP header plus an mmapped slice, skipping the
+JPEG marker scan, fragmentation and payload copies on every play
+"""
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from FragmentationHandler import FragmentationHandler
+from RtpPacket import (EXT_ID_SEND_TIME, EXT_PROFILE_ONE_BYTE, EXT_SEND_TIME_SIZE,
+                       mediaTimestamp)
+from StructuredLogging import get_logger
+
+log = get_logger("PacketCache")
+
+# Version 2: single-packet frames carry a fragmentation header too
+HINT_MAGIC = b"RTPHINT2"
+HINT_EXTENSION = ".hint"
+
+# magic, max payload size, fps, frame count, packet count,
+# source size, source mtime (ns), frame table offset, packet table offset
+_HEADER = struct.Struct("<8sIdIIQQQQ")
+# Per frame: first packet, packet count, frame size, RTP timestamp
+_FRAME = struct.Struct("<IIII")
+# Per packet: offset into the file, length
+_PACKET = struct.Struct("<QI")
+
+_RTP_HEADER = struct.Struct("!BBHII")
+_SEND_TIME_EXT = struct.Struct("!HHBQ3x")
+
+# Sockets without scatter/gather (e.g. Windows) get one joined buffer
+_HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+
+def rtp_header(seqnum: int, timestamp: int, send_time: Optional[float] = None,
+               pt: int = 26, marker: int = 0, ssrc: int = 0) -> bytes:
+    """
+    Pack an RTP header (and send-time extension) identical to RtpPacket.encode().
+
+    Args:
+        seqnum: 16-bit sequence number
+        timestamp: 32-bit media timestamp
+        send_time: Sender monotonic send time, or None for no extension
+        pt: Payload type
+        marker: Marker bit
+        ssrc: Synchronization source
+
+    Returns:
+        Header bytes to prepend to a payload
+    """
+    first = 0x90 if send_time is not None else 0x80  # V=2, X bit
+    header = _RTP_HEADER.pack(first, (marker << 7) | pt, seqnum & 0xFFFF,
+                              timestamp & 0xFFFFFFFF, ssrc)
+    if send_time is None:
+        return header
+    micros = int(send_time * 1000000) & 0xFFFFFFFFFFFFFFFF
+    return header + _SEND_TIME_EXT.pack(
+        EXT_PROFILE_ONE_BYTE, 3, (EXT_ID_SEND_TIME << 4) | (EXT_SEND_TIME_SIZE - 1), micros)
+
+
+def hint_path_for(media_path: str) -> str:
+    """Hint file that belongs to a media file."""
+    return media_path + HINT_EXTENSION
+
+
+def build_hint_file(media_path: str, stream, fps: float,
+                    max_payload_size: int = FragmentationHandler.MAX_PAYLOAD_SIZE,
+                    hint_path: Optional[str] = None) -> str:
+    """
+    Packetize a whole media file once and store the result.
+
+    Args:
+        media_path: Source media file (used for the freshness check)
+        stream: Open FrameSource positioned at the start
+        fps: Frame rate used for RTP timestamps
+        max_payload_size: Payload bytes per packet, as in FragmentationHandler
+        hint_path: Output file (default: media_path + ".hint")
+
+    Returns:
+        Path of the hint file
+    """
+    hint_path = hint_path or hint_path_for(media_path)
+    source = os.stat(media_path)
+    handler = FragmentationHandler()
+    handler.max_payload_size = max_payload_size
+    frames = array("I")
+    packets = array("Q")
+    lengths = array("I")
+
+    tmp_path = hint_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+        while True:
+            data = stream.nextFrame()
+            if not data:
+                break
+            frame_number = stream.frameNbr()
+            # Same payloads ServerWorker.sendFrames produces for this frame
+            bodies = [h + p for h, p in handler.fragment_frame(data, frame_number)]
+            timestamp = stream.frameTimestamp()
+            if timestamp is None:
+                timestamp = mediaTimestamp(frame_number, fps)
+            frames.extend((len(lengths), len(bodies), len(data), timestamp))
+            for body in bodies:
+                f.write(body)
+                packets.append(offset)
+                lengths.append(len(body))
+                offset += len(body)
+
+        frame_table = offset
+        for i in range(0, len(frames), 4):
+            f.write(_FRAME.pack(*frames[i:i + 4]))
+        packet_table = frame_table + _FRAME.size * (len(frames) // 4)
+        for packet_offset, length in zip(packets, lengths):
+            f.write(_PACKET.pack(packet_offset, length))
+
+        f.seek(0)
+        f.write(_HEADER.pack(HINT_MAGIC, max_payload_size, float(fps), len(frames) // 4,
+                             len(lengths), source.st_size, source.st_mtime_ns,
+                             frame_table, packet_table))
+    os.replace(tmp_path, hint_path)
+    return hint_path
+
+
+class HintTrack:
+    """Read-only, mmapped view of a hint file; safe to share between sessions."""
+
+    def __init__(self, path: str):
+        """
+        Open a hint file.
+
+        Args:
+            path: Hint file produced by build_hint_file()
+
+        Raises:
+            ValueError: If the file is not a hint file
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        (magic, self.max_payload_size, self.fps, self.frame_count, self.packet_count,
+         self.source_size, self.source_mtime_ns, self.frame_table,
+         self.packet_table) = _HEADER.unpack_from(self.map, 0)
+        if magic != HINT_MAGIC:
+            self.close()
+            raise ValueError(f"Not a hint file: {path}")
+        if hasattr(self.map, "madvise"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def willneed(self, index: int, count: int):
+        """Ask the kernel to page in frames [index, index + count) ahead of use."""
+        if count <= 0 or index >= self.frame_count or not hasattr(self.map, "madvise"):
+            return
+        last = min(index + count, self.frame_count) - 1
+        first_packet = _FRAME.unpack_from(self.map, self.frame_table + index * _FRAME.size)[0]
+        last_first, last_count = _FRAME.unpack_from(
+            self.map, self.frame_table + last * _FRAME.size)[:2]
+        start = _PACKET.unpack_from(self.map, self.packet_table + first_packet * _PACKET.size)[0]
+        end_offset, end_length = _PACKET.unpack_from(
+            self.map, self.packet_table + (last_first + last_count - 1) * _PACKET.size)
+        start -= start % mmap.PAGESIZE
+        self.map.madvise(mmap.MADV_WILLNEED, start, end_offset + end_length - start)
+
+    def is_fresh(self, media_path: str) -> bool:
+        """True if the media file is unchanged since the hint file was built."""
+        try:
+            source = os.stat(media_path)
+        except OSError:
+            return False
+        return (source.st_size == self.source_size
+                and source.st_mtime_ns == self.source_mtime_ns)
+
+    def frame(self, index: int) -> Tuple[int, int, List[memoryview]]:
+        """
+        Packets of a frame.
+
+        Args:
+            index: 0-based frame index (frame number - 1)
+
+        Returns:
+            (RTP timestamp, frame size, payload slices in send order)
+        """
+        first, count, size, timestamp = _FRAME.unpack_from(
+            self.map, self.frame_table + index * _FRAME.size)
+        view = self.view
+        slices = []
+        position = self.packet_table + first * _PACKET.size
+        for _ in range(count):
+            offset, length = _PACKET.unpack_from(self.map, position)
+            slices.append(view[offset:offset + length])
+            position += _PACKET.size
+        return timestamp, size, slices
+
+    def close(self):
+        """Release the mapping."""
+        self.view.release()
+        self.map.close()
+
+
+def send_packet(sock, header: bytes, body: memoryview, address=None) -> int:
+    """
+    Send header + payload slice as one datagram without joining them when
+    possible. Without an address the socket must be connected.
+    """
+    if _HAS_SENDMSG and isinstance(sock, socket.socket):
+        if address is None:
+            return sock.sendmsg([header, body])
+        return sock.sendmsg([header, body], [], 0, address)
+    if address is None:
+        return sock.send(header + bytes(body))
+    return sock.sendto(header + bytes(body), address)
+
+
+_open_tracks: Dict[str, HintTrack] = {}
+_open_tracks_lock = threading.Lock()
+
+
+def find_hint_track(media_path: str, fps: float, max_payload_size: int) -> Optional[HintTrack]:
+    """
+    Shared hint track for a media file, if a fresh one matching the
+    session's frame rate and payload size exists.
+    """
+    path = hint_path_for(media_path)
+    if not os.path.exists(path):
+        return None
+    with _open_tracks_lock:
+        track = _open_tracks.get(path)
+        if track is not None and not track.is_fresh(media_path):
+            # Rebuilt or stale: let existing sessions keep the old mapping
+            del _open_tracks[path]
+            track = None
+        if track is None:
+            try:
+                track = HintTrack(path)
+            except (OSError, ValueError, struct.error) as e:
+                log.warning("unusable hint file", path=path, error=e)
+                return None
+            if not track.is_fresh(media_path):
+                log.warning("stale hint file ignored", path=path)
+                track.close()
+                return None
+            _open_tracks[path] = track
+    if track.fps != fps or track.max_payload_size != max_payload_size:
+        log.info("hint file does not match session", path=path, fps=track.fps,
+                 max_payload_size=track.max_payload_size)
+        return None
+    return track
+
+
+if __name__ == "__main__":
+    from FrameSource import open_source
+    from HDVideoStream import HDVideoStream
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = [arg.lower() for arg in sys.argv[1:] if arg.startswith("--")]
+    if not args:
+        print("[Usage: PacketCache.py Video_file [--hd]]\n")
+        sys.exit(1)
+
+    # Match what ServerWorker opens: HD sessions stream at 30 fps unless
+    # the file stores its own rate
+    hd = "--hd" in options
+    media_stream = open_source(args[0], fps=30 if hd else None,
+                               resolution=HDVideoStream.RESOLUTION_1080P if hd else None,
+                               cache=None)
+    frame_rate = media_stream.fps or 20
+    written = build_hint_file(args[0], media_stream, frame_rate)
+    print(f"Hint file written: {written}")
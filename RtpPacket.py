@@ -57,20 +57,48 @@
 
 
 import sys
+import struct
 from time import time
 HEADER_SIZE = 12
 
+# Video payloads use a 90 kHz media clock (RFC 3551)
+MEDIA_CLOCK_RATE = 90000
+
+# RFC 5285 one-byte header extension carrying the sender's monotonic
+# send time (8 bytes, microseconds)
+EXT_PROFILE_ONE_BYTE = 0xBEDE
+EXT_ID_SEND_TIME = 1
+EXT_SEND_TIME_SIZE = 8
+
+def mediaTimestamp(frameIndex, fps):
+	"""Return the 32-bit 90 kHz RTP timestamp of a frame index at the given fps."""
+	return int(frameIndex * MEDIA_CLOCK_RATE // fps) & 0xFFFFFFFF
+
 class RtpPacket:	
 	header = bytearray(HEADER_SIZE)
+	extension = b''
+	send_time = None
 	
 	def __init__(self):
 		pass
 		
-	def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload):
-		"""Encode the RTP packet with header fields and payload."""
-		timestamp = int(time())
+	def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload, timestamp=None, sendTime=None):
+		"""Encode the RTP packet with header fields and payload.
+
+		timestamp is the 90 kHz media timestamp of the frame; when omitted the
+		current wall clock is converted to the media clock. When sendTime (a
+		time.monotonic() value) is given it is carried in a one-byte header
+		extension and the X bit is set.
+		"""
+		if timestamp is None:
+			timestamp = int(time() * MEDIA_CLOCK_RATE) & 0xFFFFFFFF
 		header = bytearray(HEADER_SIZE)
 
+		ext = b''
+		if sendTime is not None:
+			extension = 1
+			ext = self.encodeSendTimeExtension(sendTime)
+
 		# RTP Header fields (12 bytes)
 		header[0] = (version << 6) | (padding << 5) | (extension << 4) | cc
 		header[1] = (marker << 7) | pt
@@ -86,13 +114,49 @@ class RtpPacket:
 		header[11] = ssrc & 0xFF
 
 		self.header = header
+		self.extension = ext
 		self.payload = payload
 		self.timestamp_val = timestamp
+		self.send_time = sendTime
+	
+	def encodeSendTimeExtension(self, sendTime):
+		"""Build the RFC 5285 extension block carrying the send time."""
+		# 1 element byte + 8 data bytes, padded to a 32-bit boundary
+		micros = int(sendTime * 1000000) & 0xFFFFFFFFFFFFFFFF
+		element = bytes([(EXT_ID_SEND_TIME << 4) | (EXT_SEND_TIME_SIZE - 1)]) + micros.to_bytes(8, 'big')
+		element += b'\x00' * (-len(element) % 4)
+		return struct.pack('!HH', EXT_PROFILE_ONE_BYTE, len(element) // 4) + element
 		
 	def decode(self, byteStream):
 		"""Decode the RTP packet."""
-		self.header = bytearray(byteStream[:HEADER_SIZE])
-		self.payload = byteStream[HEADER_SIZE:]
+		headerSize = HEADER_SIZE + 4 * (byteStream[0] & 0x0F)
+		self.header = bytearray(byteStream[:headerSize])
+		self.extension = b''
+		self.send_time = None
+		if byteStream[0] & 0x10 and len(byteStream) >= headerSize + 4:
+			profile, words = struct.unpack_from('!HH', byteStream, headerSize)
+			extEnd = headerSize + 4 + 4 * words
+			self.extension = bytes(byteStream[headerSize:extEnd])
+			if profile == EXT_PROFILE_ONE_BYTE:
+				self.decodeSendTimeExtension(self.extension[4:])
+			headerSize = extEnd
+		self.payload = byteStream[headerSize:]
+	
+	def decodeSendTimeExtension(self, elements):
+		"""Extract the send time element from one-byte extension elements."""
+		i = 0
+		while i < len(elements):
+			extId = elements[i] >> 4
+			if extId == 0:
+				# Padding byte
+				i += 1
+				continue
+			if extId == 15:
+				break
+			length = (elements[i] & 0x0F) + 1
+			if extId == EXT_ID_SEND_TIME and length == EXT_SEND_TIME_SIZE:
+				self.send_time = int.from_bytes(elements[i + 1:i + 1 + length], 'big') / 1000000
+			i += 1 + length
 	
 	def version(self):
 		"""Return RTP version."""
@@ -121,6 +185,14 @@ class RtpPacket:
 		"""Return CSRC count."""
 		return self.header[0] & 0x0F
 	
+	def extensionBit(self):
+		"""Return header extension bit."""
+		return (self.header[0] >> 4) & 1
+	
+	def sendTime(self):
+		"""Return sender monotonic send time in seconds, or None."""
+		return self.send_time
+	
 	def getPayload(self):
 		"""Return payload."""
 		return self.payload
@@ -131,8 +203,8 @@ class RtpPacket:
 		
 	def getPacket(self):
 		"""Return RTP packet."""
-		return self.header + self.payload
+		return self.header + self.extension + self.payload
 	
 	def getPacketSize(self):
 		"""Return total packet size."""
-		return len(self.header) + len(self.payload)
+		return len(self.header) + len(self.extension) + len(self.payload)
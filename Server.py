@@ -1,14 +1,79 @@
 import sys, socket
 
 from ServerWorker import ServerWorker
+from MetricsExporter import MetricsExporter
+from FrameCache import FRAME_CACHE
+from FragmentationHandler import FragmentationHandler
+from JpegRtp import PAYLOAD_FORMATS
+from LiveSource import start_ingest
+from SocketOptions import HAS_PMTU_DISCOVERY, SocketOptions
+from StructuredLogging import get_logger, setup_logging
+from StageProfiler import install_signal_handler
+
+log = get_logger("Server")
 
 class Server:	
 	
 	def main(self):
+		setup_logging()
+		# kill -USR1 <pid> toggles send-path profiling for all sessions
+		install_signal_handler()
+		args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+		options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
 		try:
-			SERVER_PORT = int(sys.argv[1])
+			SERVER_PORT = int(args[0])
 		except:
-			print("[Usage: Server.py Server_port]\n")
+			print("[Usage: Server.py Server_port [Metrics_port] [--impair=SPEC] [--frame-cache-mb=N] [--live=PATH] [--fast-start=S] [--rtp-socket=SPEC] [--mtu=N|auto] [--payload-format=fragmented|rfc2435]]\n")
+		
+		# Optional Prometheus metrics endpoint: http://host:Metrics_port/metrics
+		if len(args) > 1:
+			MetricsExporter(int(args[1])).start()
+			log.info("metrics endpoint started", port=int(args[1]), path="/metrics")
+		
+		# Optional simulated bad network on outgoing RTP, e.g. --impair=loss=0.02,delay=0.04
+		for option in options:
+			if option.startswith("--impair="):
+				ServerWorker.impairment_spec = option.split("=", 1)[1]
+				log.info("RTP impairment enabled", spec=ServerWorker.impairment_spec)
+			# Frames shared between sessions; 0 turns the cache off
+			elif option.startswith("--frame-cache-mb="):
+				FRAME_CACHE.resize(int(option.split("=", 1)[1]) * 1024 * 1024)
+				log.info("frame cache sized", max_bytes=FRAME_CACHE.max_bytes)
+			# Start a live feed before any client asks, e.g. camera | Server.py 8554 --live=-
+			# (clients then SETUP "live:-" or "live:PATH"; no other live source is served)
+			elif option.startswith("--live="):
+				start_ingest(option.split("=", 1)[1])
+			# Most media a client may ask to receive ahead of real time on PLAY; 0 turns it off
+			elif option.startswith("--fast-start="):
+				ServerWorker.fast_start_max = float(option.split("=", 1)[1])
+				log.info("fast start limit set", seconds=ServerWorker.fast_start_max)
+			# RTP socket tuning, e.g. --rtp-socket=sndbuf=8388608,dscp=ef,priority=5
+			elif option.startswith("--rtp-socket="):
+				ServerWorker.rtp_socket_options = SocketOptions.from_spec(
+					option.split("=", 1)[1], base=ServerWorker.rtp_socket_options)
+				log.info("RTP socket options set", options=repr(ServerWorker.rtp_socket_options))
+			# Largest RTP packets: --mtu=9000 on jumbo-frame links, --mtu=auto to
+			# follow the kernel's path MTU to each client
+			elif option.startswith("--mtu="):
+				value = option.split("=", 1)[1]
+				if value == "auto" and not HAS_PMTU_DISCOVERY:
+					log.warning("path MTU discovery unsupported here, using the standard MTU",
+								platform=sys.platform, mtu=FragmentationHandler.STANDARD_MTU)
+					ServerWorker.mtu = FragmentationHandler.STANDARD_MTU
+				else:
+					# With discovery the path MTU caps each session; failed lookups fall back to 1500
+					ServerWorker.mtu_discovery = value == "auto"
+					ServerWorker.mtu = FragmentationHandler.MAX_MTU if value == "auto" else int(value)
+				log.info("RTP MTU set", mtu=value)
+			# Payload format for clients that do not name one: rfc2435 lets
+			# standard RTP/JPEG receivers play the stream
+			elif option.startswith("--payload-format="):
+				value = option.split("=", 1)[1].lower()
+				if value not in PAYLOAD_FORMATS:
+					raise ValueError("unknown payload format: %s" % value)
+				ServerWorker.payload_format = value
+				log.info("RTP payload format set", payload_format=value)
+		
 		rtspSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 		rtspSocket.bind(('', SERVER_PORT))
 		rtspSocket.listen(5)        
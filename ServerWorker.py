@@ -1,11 +1,23 @@
 from random import randint
-import sys, traceback, threading, socket, time
+import errno, math, sys, traceback, threading, socket, time
 
-from VideoStream import VideoStream
+from FrameSource import open_source
 from HDVideoStream import HDVideoStream
-from RtpPacket import RtpPacket
-from FragmentationHandler import FragmentationHandler
+from RtpPacket import RtpPacket, mediaTimestamp
+from FragmentationHandler import FragmentationHandler, FragmentationHeader
+from FramePrefetcher import FramePrefetcher
+from FrameScheduler import LATE_TOLERANCE, FrameScheduler, parse_scale
+import JpegRtp
 from NetworkAnalytics import NetworkAnalytics
+from MetricsExporter import REGISTRY
+from NetworkImpairment import ImpairedSocket, NetworkImpairment
+from PacketCache import find_hint_track, rtp_header, send_packet
+from SocketOptions import (DEFAULT_SNDBUF, SocketOptions, effective_options,
+                           enable_pmtu_discovery, path_mtu, rtp_sender_socket)
+from StageProfiler import StageProfiler, set_profiling, stop_and_dump
+from StructuredLogging import get_logger
+
+log = get_logger("ServerWorker")
 
 
 class ServerWorker:
@@ -13,6 +25,7 @@ class ServerWorker:
     PLAY = "PLAY"
     PAUSE = "PAUSE"
     TEARDOWN = "TEARDOWN"
+    SET_PARAMETER = "SET_PARAMETER"
 
     INIT = 0
     READY = 1
@@ -25,13 +38,56 @@ class ServerWorker:
 
     clientInfo = {}
 
+    # Legacy MJPEG files carry no frame rate; the classic loop ran at 20 fps
+    DEFAULT_FPS = 20
+
+    # Impairment spec applied to every session's RTP socket (testing only),
+    # e.g. "loss=0.02,delay=0.04,jitter=0.01,seed=1"
+    impairment_spec = None
+
+    # Stream from a pre-packetized <file>.hint when a fresh one exists
+    use_hint_tracks = True
+
+    # Frames read ahead of the sender by a background thread (0 disables)
+    prefetch_depth = 16
+
+    # Fast start: most media (seconds) sent ahead of real time after PLAY
+    # when the client asks for it, and the byte budget for that burst
+    fast_start_max = 0.5
+    fast_start_bytes = 4 * 1024 * 1024
+
+    # Options for every session's RTP socket (buffer size, DSCP, priority)
+    rtp_socket_options = SocketOptions(sndbuf=DEFAULT_SNDBUF)
+
+    # Largest IP packet RTP may use; clients can ask for less (Blocksize).
+    # With discovery on, the kernel's path MTU to the client also caps it
+    mtu = FragmentationHandler.STANDARD_MTU
+    mtu_discovery = False
+
+    # RTP payload format for clients that do not ask (Payload-Format):
+    # whole JFIF frames behind a FragmentationHeader, or RFC 2435
+    payload_format = JpegRtp.FORMAT_FRAGMENTED
+
     def __init__(self, clientInfo):
         self.clientInfo = clientInfo
         self.fragmentation_handler = FragmentationHandler()
         self.network_analytics = NetworkAnalytics()
+        self.profiler = StageProfiler()
         self.hd_mode = False  # Flag for HD mode
         self.use_adaptive_bitrate = True
-        self.frame_seqnum = 0
+        self.frame_seqnum = randint(0, 0xFFFF)  # RTP sequence number of the next packet
+        self.fps = self.DEFAULT_FPS
+        self.send_time_extension = True  # Stamp packets with sender send time
+        self.hint_track = None  # Shared HintTrack when streaming pre-packetized
+        self.hint_frame = 0     # Next frame index in the hint track
+        self.live = False       # Session follows a live ingest
+        self.burst = 0.0        # Fast-start seconds granted for the current PLAY
+        # The sender thread lives for the whole session and parks between
+        # PLAYs; each PLAY hands it a fresh stop event through this slot
+        self.park = threading.Condition()
+        self.pending_play = None
+        self.closing = False
+        self.scheduler = FrameScheduler(self.fps)
         self.last_bitrate_adjustment = time.time()
         self.bytes_sent_since_last_check = 0
 
@@ -42,9 +98,23 @@ class ServerWorker:
         """Receive RTSP request from the client."""
         connSocket = self.clientInfo["rtspSocket"][0]
         while True:
-            data = connSocket.recv(256)
+            try:
+                data = connSocket.recv(256)
+            except OSError:
+                data = b""  # Reset by the client: handled like a close
+            if not data:
+                # Client closed the connection: stop streaming and exit
+                log.info("RTSP connection closed", session=self.clientInfo.get("session"))
+                self.stopSender()
+                rtpSocket = self.clientInfo.pop("rtpSocket", None)
+                if rtpSocket is not None:
+                    rtpSocket.close()
+                self.closeStream()
+                REGISTRY.unregister(self.clientInfo.get("session"))
+                break
             if data:
-                print("Data received:\n" + data.decode("utf-8"))
+                log.debug("RTSP request received", client=self.clientInfo["rtspSocket"][1][0],
+                          request=data.decode("utf-8"))
                 self.processRtspRequest(data.decode("utf-8"))
 
     def processRtspRequest(self, data):
@@ -74,93 +144,274 @@ class ServerWorker:
 
         # Process SETUP request
         if requestType == self.SETUP:
+            # Find the Transport header line dynamically (instead of assuming it's line 3)
+            for line in request:
+                if "Transport:" in line:
+                    try:
+                        self.clientInfo["rtpPort"] = line.split("client_port=")[1]
+                    except IndexError:
+                        self.clientInfo["rtpPort"] = line.split(" ")[-1]
+                    break
+
             if self.state == self.INIT:
                 # Update state
-                print("processing SETUP\n")
+                log.info("processing SETUP", file=filename)
+
+                # Generate a randomized RTSP session ID
+                self.clientInfo["session"] = randint(100000, 999999)
 
+                headers = {}
                 try:
-                    # Try HD video stream first if HD mode requested
-                    if self.hd_mode:
-                        try:
-                            self.clientInfo["videoStream"] = HDVideoStream(
-                                filename, 
-                                resolution=HDVideoStream.RESOLUTION_1080P,
-                                fps=30
-                            )
-                            print(f"HD Video Stream loaded: 1080p@30fps")
-                        except:
-                            self.clientInfo["videoStream"] = VideoStream(filename)
-                            self.hd_mode = False
-                    else:
-                        self.clientInfo["videoStream"] = VideoStream(filename)
+                    # Format comes from the file itself; HD sessions stream
+                    # formats without stored timing at 1080p30
+                    self.clientInfo["videoStream"] = open_source(
+                        filename,
+                        fps=30 if self.hd_mode else None,
+                        resolution=HDVideoStream.RESOLUTION_1080P if self.hd_mode else None,
+                    )
+                    self.fps = getattr(self.clientInfo["videoStream"], "fps", None) or self.DEFAULT_FPS
+                    self.live = self.clientInfo["videoStream"].live
+                    self.scheduler = FrameScheduler(self.fps)
+                    log.info("video stream loaded", file=filename,
+                             source=type(self.clientInfo["videoStream"]).__name__, fps=self.fps)
+                    if "rtpPort" in self.clientInfo:
+                        self.openRtpSocket()
+                    # Packet size and format are settled before anything is packetized
+                    headers["Blocksize"] = self.negotiateBlocksize(request)
+                    headers["Payload-Format"] = self.negotiatePayloadFormat(request)
+                    # Hint files hold the fragmented format only
+                    if (self.use_hint_tracks and not self.live
+                            and self.payload_format == JpegRtp.FORMAT_FRAGMENTED):
+                        self.hint_track = find_hint_track(
+                            filename, self.fps, self.fragmentation_handler.max_payload_size
+                        )
+                        if self.hint_track is not None:
+                            log.info("streaming from hint file", file=filename,
+                                     frames=self.hint_track.frame_count)
+                    # Frames a fast-start burst may need, staged before PLAY
+                    burst_frames = int(math.ceil(self.fast_start_max * self.fps))
+                    if self.hint_track is not None:
+                        self.hint_track.willneed(0, burst_frames)
+                    elif self.prefetch_depth > 0 and not self.live:
+                        # Keep disk reads off the send loop
+                        self.clientInfo["videoStream"] = FramePrefetcher(
+                            self.clientInfo["videoStream"],
+                            max(self.prefetch_depth, burst_frames),
+                            packetizer=self.packetize, packetize_frames=burst_frames,
+                        )
                     
                     self.state = self.READY
-                except IOError:
+                except (IOError, ValueError):
+                    # Nothing of the session survives; a new SETUP starts over
                     self.replyRtsp(self.FILE_NOT_FOUND_404, seq[1])
+                    self.closeStream()
+                    rtpSocket = self.clientInfo.pop("rtpSocket", None)
+                    if rtpSocket is not None:
+                        rtpSocket.close()
+                    return
 
-                # Generate a randomized RTSP session ID
-                self.clientInfo["session"] = randint(100000, 999999)
+                # Only sessions that exist are exported
+                REGISTRY.register(self.clientInfo["session"], self.network_analytics)
+                self.profiler.session = self.clientInfo["session"]
 
                 # Send RTSP reply
-                self.replyRtsp(self.OK_200, seq[1])
-
-                # Get the RTP/UDP port from the last line
-                # self.clientInfo['rtpPort'] = request[2].split(' ')[3]
-            # Find the Transport header line dynamically (instead of assuming it's line 3)
-            for line in request:
-                if "Transport:" in line:
-                    try:
-                        self.clientInfo["rtpPort"] = line.split("client_port=")[1]
-                    except IndexError:
-                        self.clientInfo["rtpPort"] = line.split(" ")[-1]
-                    break
+                self.replyRtsp(self.OK_200, seq[1], headers)
 
         # Process PLAY request
         elif requestType == self.PLAY:
             if self.state == self.READY:
-                print("processing PLAY\n")
+                log.info("processing PLAY", session=self.clientInfo["session"])
                 self.state = self.PLAYING
 
-                # Create a new socket for RTP/UDP
-                self.clientInfo["rtpSocket"] = socket.socket(
-                    socket.AF_INET, socket.SOCK_DGRAM
-                )
+                # Playback speed from the Scale header; live feeds play at 1x.
+                # Fast-Start asks for that much media ahead of real time.
+                headers = {}
+                self.burst = 0.0
+                for line in request:
+                    if line.startswith("Scale:"):
+                        speed = parse_scale(line.split(":", 1)[1].strip())
+                        if speed is not None and not self.live:
+                            self.scheduler.set_speed(speed)
+                    elif line.startswith("Fast-Start:") and not self.live:
+                        try:
+                            requested = float(line.split(":", 1)[1])
+                        except ValueError:
+                            requested = 0.0
+                        self.burst = max(0.0, min(requested, self.fast_start_max))
+                        headers["Fast-Start"] = "%g" % self.burst
+                headers["Scale"] = "%g" % self.scheduler.speed
 
-                self.replyRtsp(self.OK_200, seq[1])
+                self.replyRtsp(self.OK_200, seq[1], headers)
 
-                # Create a new thread and start sending RTP packets
+                # Wake the session's sender (started on the first PLAY)
                 self.clientInfo["event"] = threading.Event()
-                self.clientInfo["worker"] = threading.Thread(target=self.sendRtp)
-                self.clientInfo["worker"].start()
+                with self.park:
+                    self.pending_play = self.clientInfo["event"]
+                    self.park.notify()
+                if "worker" not in self.clientInfo:
+                    self.clientInfo["worker"] = threading.Thread(target=self.sendRtp, daemon=True)
+                    self.clientInfo["worker"].start()
 
         # Process PAUSE request
         elif requestType == self.PAUSE:
             if self.state == self.PLAYING:
-                print("processing PAUSE\n")
+                log.info("processing PAUSE", session=self.clientInfo["session"])
                 self.state = self.READY
 
                 self.clientInfo["event"].set()
 
                 self.replyRtsp(self.OK_200, seq[1])
 
+        # Process SET_PARAMETER request (runtime profiling switch)
+        elif requestType == self.SET_PARAMETER:
+            if "session" in self.clientInfo:
+                for line in request:
+                    if line.startswith("Profiling:"):
+                        self.setProfiling(line.split(":", 1)[1].strip().lower() == "on")
+                        break
+                self.replyRtsp(self.OK_200, seq[1])
+
         # Process TEARDOWN request
         elif requestType == self.TEARDOWN:
-            print("processing TEARDOWN\n")
+            log.info("processing TEARDOWN", session=self.clientInfo.get("session"))
 
-            self.clientInfo["event"].set()
+            self.stopSender()
 
             self.replyRtsp(self.OK_200, seq[1])
 
             # Close the RTP socket
-            self.clientInfo["rtpSocket"].close()
+            if "rtpSocket" in self.clientInfo:
+                self.clientInfo["rtpSocket"].close()
+            self.closeStream()
+            REGISTRY.unregister(self.clientInfo.get("session"))
+
+    def openRtpSocket(self):
+        """Create the session's RTP socket, connected to the client's RTP port."""
+        address = (self.clientInfo["rtspSocket"][1][0], int(self.clientInfo["rtpPort"]))
+        rtpSocket = rtp_sender_socket(address, self.rtp_socket_options)
+        if self.mtu_discovery:
+            enable_pmtu_discovery(rtpSocket)
+        log.info("RTP socket opened", session=self.clientInfo["session"],
+                 client="%s:%d" % address, **effective_options(rtpSocket))
+        if self.impairment_spec:
+            rtpSocket = ImpairedSocket(rtpSocket, NetworkImpairment.from_spec(self.impairment_spec))
+        self.clientInfo["rtpSocket"] = rtpSocket
+
+    def negotiateBlocksize(self, request):
+        """
+        Settle the session's RTP payload size from the client's Blocksize
+        header, capped by the server MTU and, with discovery on, by the
+        path MTU towards the client.
+
+        Returns:
+            Blocksize to confirm in the SETUP reply
+        """
+        limit = FragmentationHandler.blocksize_for_mtu(self.mtu)
+        if self.mtu_discovery:
+            rtpSocket = self.clientInfo.get("rtpSocket")
+            discovered = None
+            if rtpSocket is not None:
+                discovered = path_mtu(getattr(rtpSocket, "sock", rtpSocket))
+            # No kernel estimate (not Linux, no route yet): assume Ethernet
+            limit = min(limit, FragmentationHandler.blocksize_for_mtu(
+                discovered or FragmentationHandler.STANDARD_MTU))
+        blocksize = limit
+        for line in request:
+            if line.startswith("Blocksize:"):
+                try:
+                    requested = int(line.split(":", 1)[1])
+                except ValueError:
+                    break
+                # A client may ask for smaller packets, never below the IPv4 minimum
+                blocksize = max(FragmentationHandler.blocksize_for_mtu(FragmentationHandler.MIN_MTU),
+                                min(requested, limit))
+                break
+        self.fragmentation_handler.set_blocksize(blocksize)
+        log.info("RTP packet size negotiated", session=self.clientInfo["session"],
+                 blocksize=blocksize, mtu=self.fragmentation_handler.mtu)
+        return blocksize
+
+    def negotiatePayloadFormat(self, request):
+        """
+        Settle the session's RTP payload format from the client's
+        Payload-Format header; unknown formats get the server default.
+
+        Returns:
+            Payload format to confirm in the SETUP reply
+        """
+        for line in request:
+            if line.startswith("Payload-Format:"):
+                requested = line.split(":", 1)[1].strip().lower()
+                if requested in JpegRtp.PAYLOAD_FORMATS:
+                    self.payload_format = requested
+                break
+        return self.payload_format
+
+    def pathMtuChanged(self):
+        """The path to the client shrank (packet too big): packetize smaller from now on."""
+        rtpSocket = self.clientInfo["rtpSocket"]
+        discovered = path_mtu(getattr(rtpSocket, "sock", rtpSocket))
+        if not discovered or discovered >= self.fragmentation_handler.mtu:
+            return
+        if self.hint_track is not None:
+            # Hint files are packetized for one size; packets stay too big
+            log.warning("path MTU below hint file packet size", session=self.clientInfo["session"],
+                        path_mtu=discovered)
+            return
+        self.fragmentation_handler.set_blocksize(FragmentationHandler.blocksize_for_mtu(discovered))
+        log.info("path MTU lowered", session=self.clientInfo["session"], mtu=discovered)
+
+    def stopSender(self):
+        """Stop the current PLAY and wait for the sender thread to exit, so
+        closeStream() never pulls the stream from under a frame being sent."""
+        if "event" in self.clientInfo:
+            self.clientInfo["event"].set()
+        with self.park:
+            self.closing = True
+            self.pending_play = None
+            self.park.notify()
+        worker = self.clientInfo.get("worker")
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout=2.0)
+
+    def closeStream(self):
+        """Stop read-ahead and close the media file (or leave a live feed)."""
+        stream = self.clientInfo.pop("videoStream", None)
+        if stream is not None:
+            stream.close()
+
+    def setProfiling(self, enabled):
+        """Switch stage profiling for this session; switching off dumps the profile."""
+        if enabled:
+            set_profiling(True, [self.profiler])
+            log.info("profiling enabled", session=self.clientInfo["session"])
+        elif self.profiler.enabled:
+            stop_and_dump([self.profiler], "rtp-profile-%d.folded" % self.clientInfo["session"])
 
     def sendRtp(self):
-        """Send RTP packets over UDP with fragmentation and adaptive bitrate control."""
+        """Session sender thread: parked while paused, streaming while playing."""
+        while True:
+            with self.park:
+                while self.pending_play is None and not self.closing:
+                    self.park.wait()
+                if self.closing:
+                    return
+                event, self.pending_play = self.pending_play, None
+            self.sendFrames(event)
+
+    def sendFrames(self, event):
+        """Send RTP packets over UDP with fragmentation and adaptive bitrate control
+        until event is set (PAUSE or TEARDOWN).
+
+        Frames go out when the session's FrameScheduler says they are due;
+        live frames are sent as soon as they arrive.
+        """
+        profiler = self.profiler
+        scheduler = self.scheduler
+        scheduler.start(self.burst, self.fast_start_bytes)
         while True:
-            self.clientInfo["event"].wait(0.05)
-
             # Stop sending if request is PAUSE or TEARDOWN
-            if self.clientInfo["event"].isSet():
+            if event.is_set():
                 break
 
             # Adaptive bitrate control (check every second)
@@ -173,79 +424,182 @@ class ServerWorker:
                 self.bytes_sent_since_last_check = 0
                 self.last_bitrate_adjustment = current_time
 
-            data = self.clientInfo["videoStream"].nextFrame()
-            if data:
-                frameNumber = self.clientInfo["videoStream"].frameNbr()
-                self.frame_seqnum += 1
-                
-                # Record frame sent
-                self.network_analytics.record_frame_sent(frameNumber, len(data))
-                
-                try:
-                    address = self.clientInfo["rtspSocket"][1][0]
-                    port = int(self.clientInfo["rtpPort"])
-                    
-                    # Handle fragmentation if frame exceeds MTU
-                    if len(data) > self.fragmentation_handler.max_payload_size:
-                        fragments = self.fragmentation_handler.fragment_frame(data, frameNumber)
-                        for frag_header, frag_payload in fragments:
-                            # Create RTP packet with fragmentation header prepended
-                            rtp_payload = frag_header + frag_payload
-                            rtp_packet = self.makeRtp(rtp_payload, self.frame_seqnum)
-                            self.clientInfo["rtpSocket"].sendto(rtp_packet, (address, port))
-                            self.bytes_sent_since_last_check += len(rtp_packet)
-                            self.frame_seqnum += 1
-                            # Small delay between fragments for better network handling
-                            time.sleep(0.001)
-                    else:
-                        # Single packet, add minimal fragmentation header
-                        rtp_packet = self.makeRtp(data, self.frame_seqnum)
-                        self.clientInfo["rtpSocket"].sendto(rtp_packet, (address, port))
+            t = profiler.mark()
+            hint = None
+            if self.hint_track is not None:
+                # Pre-packetized: payload slices and timestamp come from the hint file
+                if self.hint_frame < self.hint_track.frame_count:
+                    hint = self.hint_track.frame(self.hint_frame)
+                    self.hint_frame += 1
+                    self.hint_track.willneed(self.hint_frame, self.prefetch_depth)
+                data = hint
+            else:
+                stream = self.clientInfo.get("videoStream")
+                if stream is None:
+                    break  # Closed by TEARDOWN or a dropped connection
+                data = stream.nextFrame()
+            t = profiler.record('read', t)
+            if not data:
+                # End of file or of a live feed: idle until PAUSE/TEARDOWN. A
+                # running live source already waited for its next frame
+                if (not self.live or stream.ended) and event.wait(scheduler.interval):
+                    break
+                continue
+
+            payloads = None  # RTP payloads built ahead of the send loop
+            if hint is not None:
+                frameNumber = self.hint_frame
+                timestamp, frameSize, payloads = hint
+            else:
+                frameNumber = stream.frameNbr()
+                timestamp = stream.frameTimestamp()
+                if timestamp is None:
+                    timestamp = mediaTimestamp(frameNumber, self.fps)
+                frameSize = len(data)
+                # Leading frames were packetized at SETUP for a fast start
+                if isinstance(stream, FramePrefetcher):
+                    payloads = stream.framePayloads()
+                if payloads is None and self.payload_format == JpegRtp.FORMAT_RFC2435:
+                    t = profiler.record('schedule', t)
+                    payloads = self.packetize(data, frameNumber)
+                    t = profiler.record('fragment', t)
+            if payloads is not None and not payloads:
+                continue  # packetize() could not carry this frame
+            if self.live:
+                due = time.monotonic()
+            else:
+                due, timestamp = scheduler.schedule(timestamp, frameSize)
+            t = profiler.record('schedule', t)
+            if scheduler.wait(due, event):
+                break
+            t = profiler.record('pace', t)
+            lateness = scheduler.frame_sent(due)
+
+            # Record frame sent and how far behind schedule it goes out
+            self.network_analytics.record_frame_sent(frameNumber, frameSize)
+            self.network_analytics.record_pacing_lag(lateness, late=lateness > LATE_TOLERANCE)
+
+            try:
+                rtpSocket = self.clientInfo["rtpSocket"]
+
+                if payloads is not None:
+                    self.sendHintedFrame(payloads, timestamp, due, event)
+                    t = profiler.record('send', t)
+                else:
+                    # Every packet carries a fragmentation header, even a frame's only one
+                    fragments = self.fragmentation_handler.fragment_frame(data, frameNumber)
+                    t = profiler.record('fragment', t)
+                    for index, (frag_header, frag_payload) in enumerate(fragments):
+                        # Spread the frame's packets instead of bursting them
+                        if index and scheduler.wait(
+                                scheduler.packet_time(due, index, len(fragments)), event):
+                            break
+                        t = profiler.record('pace', t)
+                        # Create RTP packet with fragmentation header prepended
+                        rtp_payload = frag_header + frag_payload
+                        rtp_packet = self.makeRtp(rtp_payload, self.frame_seqnum, timestamp,
+                                                  marker=index == len(fragments) - 1)
+                        # Numbered even if the send fails: receivers see a gap, not a reuse
+                        self.frame_seqnum += 1
+                        t = profiler.record('encode', t)
+                        rtpSocket.send(rtp_packet)
                         self.bytes_sent_since_last_check += len(rtp_packet)
-                    
-                except Exception as e:
-                    print(f"Connection Error: {e}")
-                    self.network_analytics.record_packet_loss(frameNumber)
-
-    def makeRtp(self, payload, frameNbr):
-        """RTP-packetize the video data."""
+                        t = profiler.record('send', t)
+
+            except Exception as e:
+                # Rate limited: a dead client fails every packet
+                log.warning("RTP send failed", session=self.clientInfo["session"],
+                            frame=frameNumber, error=e)
+                self.network_analytics.record_send_error()
+                self.network_analytics.record_packet_loss(frameNumber)
+                if self.mtu_discovery and getattr(e, "errno", None) == errno.EMSGSIZE:
+                    self.pathMtuChanged()
+                t = profiler.record('send', t)
+
+            # A frame misses its deadline when it is still going out after its slot ends
+            if profiler.enabled:
+                profiler.record_frame(time.monotonic() - (due + scheduler.interval / scheduler.speed))
+
+    def packetize(self, data, frameNumber):
+        """RTP payloads of a frame, as sendRtp would build them."""
+        if self.payload_format == JpegRtp.FORMAT_RFC2435:
+            blocksize = self.fragmentation_handler.max_payload_size + FragmentationHeader.HEADER_SIZE
+            try:
+                return JpegRtp.packetize(data, blocksize)
+            except ValueError as e:
+                # Progressive, 4:4:4, custom Huffman tables...: RFC 2435 cannot carry it
+                log.warning("frame not sendable as RFC 2435", session=self.clientInfo["session"],
+                            frame=frameNumber, error=e)
+                return []
+        return [header + payload for header, payload
+                in self.fragmentation_handler.fragment_frame(data, frameNumber)]
+
+    def sendHintedFrame(self, payloads, timestamp, due, event):
+        """Send a frame's pre-built payloads; only the RTP headers are packed here."""
+        rtpSocket = self.clientInfo["rtpSocket"]
+        payload_type = JpegRtp.PAYLOAD_TYPES[self.payload_format]
+        for index, payload in enumerate(payloads):
+            # Same packet spacing as the live packetizer
+            if index and self.scheduler.wait(
+                    self.scheduler.packet_time(due, index, len(payloads)), event):
+                break
+            sendTime = time.monotonic() if self.send_time_extension else None
+            header = rtp_header(self.frame_seqnum, timestamp, sendTime, pt=payload_type,
+                                marker=int(index == len(payloads) - 1))
+            self.frame_seqnum += 1
+            send_packet(rtpSocket, header, payload)
+            self.bytes_sent_since_last_check += len(header) + len(payload)
+
+    def makeRtp(self, payload, frameNbr, timestamp=None, marker=False):
+        """RTP-packetize the video data.
+
+        All packets of a frame share its 90 kHz media timestamp; the sender's
+        monotonic send time rides in a header extension when enabled. The
+        marker bit is set on the frame's last packet; the payload type tells
+        the session's payload format apart.
+        """
         version = 2
         padding = 0
         extension = 0
         cc = 0
-        marker = 0
-        pt = 26  # MJPEG type
+        marker = int(marker)
+        pt = JpegRtp.PAYLOAD_TYPES[self.payload_format]
         seqnum = frameNbr
         ssrc = 0
 
         rtpPacket = RtpPacket()
 
+        sendTime = time.monotonic() if self.send_time_extension else None
         rtpPacket.encode(
-            version, padding, extension, cc, seqnum, marker, pt, ssrc, payload
+            version, padding, extension, cc, seqnum, marker, pt, ssrc, payload,
+            timestamp=timestamp, sendTime=sendTime
         )
 
         return rtpPacket.getPacket()
 
-    def replyRtsp(self, code, seq):
-        """Send RTSP reply to the client."""
+    def replyRtsp(self, code, seq, headers=None):
+        """Send RTSP reply to the client, with optional extra headers."""
         if code == self.OK_200:
             # print("200 OK")
             hd_info = "\nHD-Mode: 1080p" if self.hd_mode else ""
+            extra = "".join("\n%s: %s" % item for item in (headers or {}).items())
             reply = (
                 "RTSP/1.0 200 OK\nCSeq: "
                 + seq
                 + "\nSession: "
                 + str(self.clientInfo["session"])
                 + hd_info
+                + extra
             )
             connSocket = self.clientInfo["rtspSocket"][0]
             connSocket.send(reply.encode())
 
-        # Error messages
-        elif code == self.FILE_NOT_FOUND_404:
-            print("404 NOT FOUND")
-        elif code == self.CON_ERR_500:
-            print("500 CONNECTION ERROR")
+        # Error messages carry no session: none was established
+        else:
+            status = "404 NOT FOUND" if code == self.FILE_NOT_FOUND_404 else "500 CONNECTION ERROR"
+            log.warning(status, session=self.clientInfo.get("session"))
+            reply = "RTSP/1.0 %s\nCSeq: %s" % (status, seq)
+            self.clientInfo["rtspSocket"][0].send(reply.encode())
     
     def get_analytics_summary(self):
         """Get network analytics summary."""
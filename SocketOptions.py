@@ -0,0 +1,243 @@
+"""
+SocketOptions.py - Tunable options for RTP sockets
+Send/receive buffer sizes, DSCP marking and SO_PRIORITY, set from a spec
+such as "sndbuf=4194304,dscp=ef,priority=5" when the socket is opened.
+Sender sockets are connected to their peer so packets go out with send(),
+which also lets the kernel report the path MTU towards it
+"""
+import socket
+import sys
+from typing import Dict, Optional, Tuple
+
+from StructuredLogging import get_logger
+
+log = get_logger("SocketOptions")
+
+# DSCP is the top six bits of the IPv4 TOS byte
+DSCP_SHIFT = 2
+# Per-hop behaviours accepted by name (RFC 4594 video classes and EF)
+DSCP_NAMES = {
+    'be': 0, 'cs1': 8, 'af41': 34, 'af42': 36, 'af43': 38,
+    'cs4': 32, 'cs5': 40, 'ef': 46,
+}
+# Buffer sizes the sender and receiver ask for unless configured otherwise;
+# a fast-start burst of 1080p frames is a few megabytes
+DEFAULT_SNDBUF = 4 * 1024 * 1024
+DEFAULT_RCVBUF = 4 * 1024 * 1024
+
+# Linux path MTU discovery (<linux/in.h>); the socket module lacks IP_MTU
+_IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+_IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+_IP_MTU = getattr(socket, 'IP_MTU', 14)
+HAS_PMTU_DISCOVERY = sys.platform.startswith('linux')
+
+# Privileged variants that ignore net.core.[rw]mem_max (Linux, CAP_NET_ADMIN)
+_FORCE = {
+    socket.SO_SNDBUF: getattr(socket, 'SO_SNDBUFFORCE', None),
+    socket.SO_RCVBUF: getattr(socket, 'SO_RCVBUFFORCE', None),
+}
+
+
+def parse_dscp(value: str) -> int:
+    """DSCP code point from a number or a PHB name such as "ef"."""
+    value = value.strip().lower()
+    if value in DSCP_NAMES:
+        return DSCP_NAMES[value]
+    dscp = int(value, 0)
+    if not 0 <= dscp < 64:
+        raise ValueError(f"DSCP out of range: {dscp}")
+    return dscp
+
+
+class SocketOptions:
+    """Options applied to an RTP socket; None leaves the system default."""
+
+    def __init__(self, sndbuf: Optional[int] = None, rcvbuf: Optional[int] = None,
+                 dscp: Optional[int] = None, priority: Optional[int] = None):
+        """
+        Initialize socket options.
+
+        Args:
+            sndbuf: SO_SNDBUF in bytes
+            rcvbuf: SO_RCVBUF in bytes
+            dscp: DSCP code point written to IP_TOS (0-63)
+            priority: SO_PRIORITY for the local queueing discipline (0-6
+                without CAP_NET_ADMIN)
+        """
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.dscp = dscp
+        self.priority = priority
+
+    @classmethod
+    def from_spec(cls, spec: str, base: Optional['SocketOptions'] = None) -> 'SocketOptions':
+        """
+        Build from a comma-separated spec, e.g. "sndbuf=4194304,dscp=ef,priority=5".
+        Keys are the constructor argument names; "none" clears an option.
+        Options the spec does not name are taken from base.
+        """
+        kwargs = dict(vars(base)) if base is not None else {}
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            key, _, value = item.partition('=')
+            key = key.strip()
+            if key not in ('sndbuf', 'rcvbuf', 'dscp', 'priority'):
+                raise ValueError(f"unknown socket option: {key}")
+            if value.strip().lower() == 'none':
+                kwargs[key] = None
+            elif key == 'dscp':
+                kwargs[key] = parse_dscp(value)
+            else:
+                kwargs[key] = int(value, 0)
+        return cls(**kwargs)
+
+    def apply(self, sock: socket.socket) -> Dict:
+        """
+        Set the options on a socket. A failure is logged and that option
+        left at its default: the stream still works, just unmarked or with
+        a smaller buffer.
+
+        Returns:
+            Effective values as the kernel reports them
+        """
+        if self.sndbuf is not None:
+            _set_buffer(sock, socket.SO_SNDBUF, self.sndbuf, "sndbuf")
+        if self.rcvbuf is not None:
+            _set_buffer(sock, socket.SO_RCVBUF, self.rcvbuf, "rcvbuf")
+        if self.dscp is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, self.dscp << DSCP_SHIFT)
+            except OSError as e:
+                log.warning("DSCP not set", dscp=self.dscp, error=e)
+        if self.priority is not None:
+            if hasattr(socket, 'SO_PRIORITY'):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY, self.priority)
+                except OSError as e:
+                    log.warning("socket priority not set", priority=self.priority, error=e)
+            else:
+                log.warning("SO_PRIORITY not supported on this platform")
+        return effective_options(sock)
+
+    def __repr__(self):
+        return "SocketOptions(%s)" % ", ".join("%s=%r" % item for item in vars(self).items())
+
+
+def _set_buffer(sock: socket.socket, option: int, size: int, name: str):
+    """Set a socket buffer size, past the sysctl cap when privileged."""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+    except OSError as e:
+        log.warning("socket buffer not set", option=name, requested=size, error=e)
+        return
+    # Linux reports double the requested size (bookkeeping overhead included)
+    if sock.getsockopt(socket.SOL_SOCKET, option) >= size:
+        return
+    force = _FORCE.get(option)
+    if force is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, force, size)
+            return
+        except OSError:
+            pass
+    log.warning("socket buffer capped by the system", option=name, requested=size,
+                effective=sock.getsockopt(socket.SOL_SOCKET, option),
+                hint="raise net.core.%s_max" % ('wmem' if name == 'sndbuf' else 'rmem'))
+
+
+def effective_options(sock: socket.socket) -> Dict:
+    """Buffer sizes, DSCP and priority currently set on a socket."""
+    stats = {
+        'sndbuf': sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+        'rcvbuf': sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        'dscp': sock.getsockopt(socket.IPPROTO_IP, socket.IP_TOS) >> DSCP_SHIFT,
+    }
+    if hasattr(socket, 'SO_PRIORITY'):
+        stats['priority'] = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY)
+    return stats
+
+
+def rtp_sender_socket(address: Tuple[str, int],
+                      options: Optional[SocketOptions] = None) -> socket.socket:
+    """
+    UDP socket connected to a session's RTP receiver.
+
+    Args:
+        address: Client (host, port)
+        options: Options to apply before connecting
+
+    Returns:
+        Socket on which send() reaches the client
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if options is not None:
+        options.apply(sock)
+    sock.connect(address)
+    return sock
+
+
+def rtp_receiver_socket(port: int, options: Optional[SocketOptions] = None,
+                        host: str = "") -> socket.socket:
+    """
+    UDP socket bound to receive RTP.
+
+    Args:
+        port: Local port
+        options: Options to apply before binding
+        host: Local address ("" for all)
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if options is not None:
+        options.apply(sock)
+    try:
+        sock.bind((host, port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def enable_pmtu_discovery(sock: socket.socket) -> bool:
+    """
+    Set the Don't Fragment bit on everything the socket sends, so routers
+    report the path MTU instead of fragmenting (Linux only).
+
+    Returns:
+        True if discovery is on
+    """
+    if not HAS_PMTU_DISCOVERY:
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, _IP_MTU_DISCOVER, _IP_PMTUDISC_DO)
+    except OSError as e:
+        log.warning("path MTU discovery not enabled", error=e)
+        return False
+    return True
+
+
+def path_mtu(sock: socket.socket) -> Optional[int]:
+    """
+    Kernel's current path MTU estimate for a connected socket: the route's
+    interface MTU at first, lowered as ICMP "fragmentation needed" arrives.
+
+    Returns:
+        MTU in bytes, or None where the kernel cannot tell
+    """
+    if not HAS_PMTU_DISCOVERY:
+        return None
+    try:
+        return sock.getsockopt(socket.IPPROTO_IP, _IP_MTU)
+    except OSError:
+        return None  # Not connected, or not an IPv4 socket
+
+
+def discover_mtu(address: Tuple[str, int]) -> Optional[int]:
+    """Path MTU towards a host, from a throwaway connected UDP socket."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        enable_pmtu_discovery(sock)
+        sock.connect(address)
+        return path_mtu(sock)
+    except OSError:
+        return None
+    finally:
+        sock.close()
@@ -0,0 +1,238 @@
+"""
+StageProfiler.py - Low-overhead per-stage timing for the RTP send path
+Each session keeps nanosecond counters for read, schedule, fragment,
+encode, send and pace, switched on at runtime (SIGUSR1 or RTSP SET_PARAMETER) and
+dumped as collapsed stacks that flamegraph.pl / speedscope read directly.
+Only one frame in SAMPLE_EVERY is timed, which keeps the enabled cost
+under 0.5% of a busy send loop (benchmark_streaming.py measures it)
+"""
+import os
+import signal
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from StructuredLogging import get_logger
+
+log = get_logger("StageProfiler")
+
+# Send-path stages in pipeline order: read covers finding the frame in the
+# file (marker scan), schedule the frame metadata and due-time bookkeeping
+STAGES = ('read', 'schedule', 'fragment', 'encode', 'send', 'pace')
+
+# Time one frame in this many; totals are scaled back up. A sampled 1080p
+# frame takes ~90 perf_counter reads (two per packet), so at 1 in 8 that
+# alone was 1.5-2% of the loop; 1 in 32 still samples about once a second
+SAMPLE_EVERY = 32
+
+# Default file written when profiling is switched off
+PROFILE_OUTPUT = "rtp-profile-{pid}.folded"
+
+_perf_counter_ns = time.perf_counter_ns
+_profilers = weakref.WeakSet()
+_profilers_lock = threading.Lock()
+_default_enabled = False
+
+
+class StageProfiler:
+    """Per-session stage timers and frame deadline-miss counter.
+
+    Timing is threaded through the loop as a single integer; mark() starts
+    a frame and returns 0 when the frame is not sampled (or profiling is
+    off), which makes every record() for that frame a no-op:
+
+        t = profiler.mark()
+        data = stream.nextFrame()
+        t = profiler.record('read', t)
+    """
+
+    def __init__(self, name: str = "sendRtp", session=None,
+                 sample_every: int = SAMPLE_EVERY):
+        """
+        Initialize stage profiler.
+
+        Args:
+            name: Root frame of the collapsed stacks
+            session: Session id, added as a stack frame when set
+            sample_every: Time one frame in this many (1 times every frame)
+        """
+        self.name = name
+        self.session = session
+        self.sample_every = sample_every
+        self.tick = 0
+        self.enabled = _default_enabled
+        self.reset()
+        with _profilers_lock:
+            _profilers.add(self)
+
+    def reset(self):
+        """Clear all counters."""
+        self.total_ns = dict.fromkeys(STAGES, 0)
+        self.counts = dict.fromkeys(STAGES, 0)
+        self.max_ns = dict.fromkeys(STAGES, 0)
+        self.frames = 0
+        self.deadline_misses = 0
+        self.max_lateness = 0.0
+
+    def mark(self) -> int:
+        """Start timing a frame; returns 0 when off or not sampled."""
+        if not self.enabled:
+            return 0
+        self.tick += 1
+        if self.tick < self.sample_every:
+            return 0
+        self.tick = 0
+        return _perf_counter_ns()
+
+    def record(self, stage: str, start: int) -> int:
+        """
+        Charge the time since start to a stage.
+
+        Args:
+            stage: One of STAGES
+            start: Value from mark() or a previous record()
+
+        Returns:
+            Start value for the next stage (0 when not timing)
+        """
+        if not start:
+            return 0
+        now = _perf_counter_ns()
+        elapsed = now - start
+        self.total_ns[stage] += elapsed
+        self.counts[stage] += 1
+        if elapsed > self.max_ns[stage]:
+            self.max_ns[stage] = elapsed
+        return now
+
+    def record_frame(self, lateness: float):
+        """
+        Count a sent frame against its deadline.
+
+        Args:
+            lateness: Seconds the frame finished after its slot ended
+                (<= 0 means it made its deadline)
+        """
+        if not self.enabled:
+            return
+        self.frames += 1
+        if lateness > 0:
+            self.deadline_misses += 1
+            if lateness > self.max_lateness:
+                self.max_lateness = lateness
+
+    def collapsed(self) -> List[str]:
+        """Collapsed-stack lines ("a;b;stage weight"), weights in estimated microseconds."""
+        prefix = self.name if self.session is None else f"session_{self.session};{self.name}"
+        lines = []
+        for stage in STAGES:
+            micros = self.total_ns[stage] * self.sample_every // 1000
+            if micros:
+                lines.append(f"{prefix};{stage} {micros}")
+        return lines
+
+    def get_stats(self) -> Dict:
+        """
+        Per-stage statistics in milliseconds, plus deadline misses.
+        Totals are estimates (sampled time scaled by sample_every); means
+        and maxima are over the sampled calls.
+        """
+        stats = {
+            'frames': self.frames,
+            'deadline_misses': self.deadline_misses,
+            'max_lateness_ms': self.max_lateness * 1000,
+        }
+        for stage in STAGES:
+            count = self.counts[stage]
+            stats[f'{stage}_total_ms'] = self.total_ns[stage] * self.sample_every / 1e6
+            stats[f'{stage}_mean_ms'] = self.total_ns[stage] / count / 1e6 if count else 0.0
+            stats[f'{stage}_max_ms'] = self.max_ns[stage] / 1e6
+        return stats
+
+
+def profilers() -> List[StageProfiler]:
+    """All live profilers."""
+    with _profilers_lock:
+        return list(_profilers)
+
+
+def set_profiling(enabled: bool, profiler_list: Optional[List[StageProfiler]] = None):
+    """
+    Switch profiling on or off.
+
+    Args:
+        enabled: New state
+        profiler_list: Profilers to switch (default: all, including
+            sessions created later)
+    """
+    global _default_enabled
+    if profiler_list is None:
+        _default_enabled = enabled
+        profiler_list = profilers()
+    for profiler in profiler_list:
+        if enabled and not profiler.enabled:
+            profiler.reset()
+            profiler.tick = profiler.sample_every - 1  # Sample the next frame
+        profiler.enabled = enabled
+
+
+def dump_collapsed(path: Optional[str] = None,
+                   profiler_list: Optional[List[StageProfiler]] = None) -> str:
+    """
+    Write collapsed stacks for flamegraph tools.
+
+    Args:
+        path: Output file (default PROFILE_OUTPUT)
+        profiler_list: Profilers to dump (default: all)
+
+    Returns:
+        The path written
+    """
+    path = path or PROFILE_OUTPUT.format(pid=os.getpid())
+    if profiler_list is None:
+        profiler_list = profilers()
+    with open(path, 'w') as f:
+        for profiler in profiler_list:
+            for line in profiler.collapsed():
+                f.write(line + "\n")
+    return path
+
+
+def stop_and_dump(profiler_list: Optional[List[StageProfiler]] = None,
+                  path: Optional[str] = None) -> str:
+    """Switch profiling off, log a summary per session and write the stacks."""
+    set_profiling(False, profiler_list)
+    if profiler_list is None:
+        profiler_list = profilers()
+    for profiler in profiler_list:
+        stats = profiler.get_stats()
+        log.info("stage profile", session=profiler.session,
+                 **{k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()})
+    path = dump_collapsed(path, profiler_list)
+    log.info("profile written", path=path)
+    return path
+
+
+def install_signal_handler(signum: Optional[int] = None) -> bool:
+    """
+    Toggle profiling of all sessions on a signal (SIGUSR1 by default).
+    Switching off writes the collapsed stacks. Must be called from the main
+    thread; returns False where the signal does not exist (e.g. Windows).
+    """
+    if signum is None:
+        signum = getattr(signal, 'SIGUSR1', None)
+        if signum is None:
+            return False
+
+    def toggle(received, frame):
+        if _default_enabled:
+            set_profiling(False)
+            # File I/O and logging stay off the interrupted thread
+            threading.Thread(target=stop_and_dump, daemon=True).start()
+        else:
+            set_profiling(True)
+            log.info("profiling enabled", sessions=len(profilers()))
+
+    signal.signal(signum, toggle)
+    return True
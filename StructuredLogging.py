@@ -0,0 +1,204 @@
+"""
+StructuredLogging.py - Non-blocking, rate-limited structured logging
+Log records carry key=value fields, are rate limited per message template
+in the calling thread, and are handed to a background listener through a
+bounded queue so RTP sender threads never wait on console or file I/O
+"""
+import atexit
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+ROOT_LOGGER = "streaming"
+
+# Keyword arguments the logging API itself understands
+_LOGGING_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger adapter that turns keyword arguments into structured fields.
+
+    Example:
+        log.warning("send failed", session=123456, error=e)
+    """
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        # Rate limit before a LogRecord is even built
+        if _rate_limiter is not None:
+            suppressed = _rate_limiter.check((self.logger.name, msg))
+            if suppressed is None:
+                return
+            if suppressed:
+                kwargs['suppressed'] = suppressed
+        super().log(level, msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _LOGGING_KWARGS}
+        extra = dict(kwargs.get('extra') or {})
+        extra['fields'] = fields
+        kwargs['extra'] = extra
+        return msg, kwargs
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per (logger, message template); reports suppressed counts."""
+
+    def __init__(self, rate: float = 5.0, burst: int = 10):
+        """
+        Initialize rate limiter.
+
+        Args:
+            rate: Records per second allowed for each message template
+            burst: Records allowed back-to-back before limiting starts
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.buckets: Dict[Tuple[str, str], list] = {}  # key -> [tokens, last, suppressed]
+
+    def check(self, key: Tuple[str, str]) -> Optional[int]:
+        """
+        Take a token for a message template.
+
+        Returns:
+            None if the record must be suppressed, otherwise the number of
+            records suppressed since the last one that got through
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return None
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+            return suppressed
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Records from StructuredLogger were already limited at the call site
+        if getattr(record, 'fields', None) is not None:
+            return True
+        suppressed = self.check((record.name, str(record.msg)))
+        if suppressed is None:
+            return False
+        if suppressed:
+            fields = getattr(record, 'fields', None)
+            if fields is None:
+                fields = record.fields = {}
+            fields['suppressed'] = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that never blocks: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens in the listener thread; only tracebacks are
+        # rendered here, while the frames they reference are still alive
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class KeyValueFormatter(logging.Formatter):
+    """logfmt-style output: ts=... level=... logger=... msg="..." key=value"""
+
+    @staticmethod
+    def _quote(value) -> str:
+        text = str(value)
+        if not text or any(c in text for c in ' ="\n'):
+            return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        return text
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            f"level={record.levelname}",
+            f"logger={record.name}",
+            f"msg={self._quote(record.getMessage())}",
+        ]
+        for key, value in (getattr(record, 'fields', None) or {}).items():
+            parts.append(f"{key}={self._quote(value)}")
+        line = " ".join(parts)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+_rate_limiter: Optional[RateLimitFilter] = None
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Get a structured logger under the streaming namespace."""
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+def setup_logging(level=logging.INFO, stream=None, rate: float = 5.0, burst: int = 10,
+                  queue_size: int = 10000) -> NonBlockingQueueHandler:
+    """
+    Route streaming logs through a rate limiter and a background writer.
+
+    Args:
+        level: Minimum level (name or number)
+        stream: Output stream for the listener (default stderr)
+        rate: Per-message-template records per second
+        burst: Per-message-template burst allowance
+        queue_size: Records buffered before new ones are dropped
+
+    Returns:
+        The queue handler (exposes the dropped-record count)
+    """
+    global _listener, _handler, _rate_limiter
+    shutdown_logging()
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(KeyValueFormatter())
+    _listener = QueueListener(log_queue, output, respect_handler_level=False)
+
+    _rate_limiter = RateLimitFilter(rate, burst)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(_rate_limiter)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [_handler]
+    root.setLevel(level)
+    root.propagate = False
+    _listener.start()
+    return _handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer."""
+    global _listener, _rate_limiter
+    _rate_limiter = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -1,14 +1,31 @@
-class VideoStream:
-	def __init__(self, filename):
+from FrameCache import FRAME_CACHE, file_identity
+from FrameSource import FrameSource
+
+class VideoStream(FrameSource):
+	def __init__(self, filename, cache=FRAME_CACHE):
 		self.filename = filename
 		try:
 			self.file = open(filename, 'rb')
 		except:
 			raise IOError
 		self.frameNum = 0
+		# Frames are shared with other sessions playing the same file
+		self.cache = cache
+		self.identity = file_identity(filename, self.file) if cache is not None else None
+		self.position = 0 # File offset of the next frame
 		
 	def nextFrame(self):
 		"""Get next frame."""
+		if self.cache is not None:
+			cached = self.cache.get((self.identity, self.frameNum + 1))
+			if cached:
+				data, self.position = cached
+				if data: # Empty entry marks the end of the file
+					self.frameNum += 1
+				return data
+			# Earlier frames may have come from the cache: catch the file up
+			if self.file.tell() != self.position:
+				self.file.seek(self.position)
 		data = self.file.read(5) # Get the framelength from the first 5 bits
 		if data: 
 			framelength = int(data)
@@ -16,6 +33,11 @@ class VideoStream:
 			# Read the current frame
 			data = self.file.read(framelength)
 			self.frameNum += 1
+			if self.cache is not None:
+				self.position = self.file.tell()
+				self.cache.put((self.identity, self.frameNum), data, self.position)
+		elif self.cache is not None:
+			self.cache.put((self.identity, self.frameNum + 1), b'', self.position)
 		return data
 		
 	def frameNbr(self):
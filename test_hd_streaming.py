@@ -2,12 +2,25 @@
 test_hd_streaming.py - Test script for HD video streaming system
 Validates fragmentation, reassembly, and network analytics
 """
+import os
 import sys
 import unittest
 from io import BytesIO
 from FragmentationHandler import FragmentationHandler, FragmentationHeader
+from FrameSource import FrameSource
 from NetworkAnalytics import NetworkAnalytics
-from RtpPacket import RtpPacket
+from RtpPacket import RtpPacket, mediaTimestamp
+from JitterBuffer import JitterBuffer
+from NetworkImpairment import ImpairedSocket, NetworkImpairment
+from LatencyHistogram import LatencyHistogram, merge_histograms
+from MetricsExporter import MetricsExporter, MetricsRegistry, render_metrics
+from StageProfiler import STAGES, StageProfiler, dump_collapsed, set_profiling
+from StructuredLogging import RateLimitFilter, get_logger, setup_logging, shutdown_logging
+try:
+    from PIL import Image
+    from FrameDecoder import FrameDecoder, decode_jpeg
+except ImportError:  # Pillow not installed
+    Image = None
 import time
 
 
@@ -37,6 +50,24 @@ class TestFragmentation(unittest.TestCase):
             )
         print(f"✓ All fragments within size limits ({self.handler.max_payload_size} bytes)")
     
+    def test_packets_fit_mtu(self):
+        """Test a full packet (IP/UDP/RTP with send time) fits the MTU it was sized for."""
+        from RtpPacket import RtpPacket
+        for mtu in (FragmentationHandler.STANDARD_MTU, FragmentationHandler.JUMBO_MTU):
+            handler = FragmentationHandler(mtu)
+            header, payload = handler.fragment_frame(b'X' * 20000, frame_id=1)[0]
+            packet = RtpPacket()
+            packet.encode(2, 0, 0, 0, 1, 0, 26, 0, header + payload, timestamp=0, sendTime=1.0)
+            self.assertEqual(len(packet.getPacket()) + FragmentationHandler.IP_UDP_HEADER_SIZE, mtu)
+        handler.set_blocksize(FragmentationHandler.blocksize_for_mtu(1400))
+        self.assertEqual(handler.mtu, 1400)
+        # Nonsense from the wire is clamped to packets an IP network can carry
+        handler.set_blocksize(-5)
+        self.assertEqual(handler.mtu, FragmentationHandler.MIN_MTU)
+        handler.set_blocksize(10 ** 9)
+        self.assertEqual(handler.mtu, FragmentationHandler.MAX_MTU)
+        print(f"✓ Packets fill a {FragmentationHandler.JUMBO_MTU}-byte MTU exactly")
+    
     def test_reassembly(self):
         """Test frame reassembly from fragments."""
         fragments = self.handler.fragment_frame(self.test_frame, frame_id=42)
@@ -125,6 +156,82 @@ class TestNetworkAnalytics(unittest.TestCase):
         self.assertLess(latency, 200, f"Latency {latency}ms should be < 200ms")
         print(f"✓ Latency: {latency:.2f}ms")
     
+    def test_receiver_timing(self):
+        """Test one-way delay, interarrival jitter and glass-to-glass."""
+        # The sender's clock is 1000s ahead: only transit above the fastest frame counts
+        for i, transit in enumerate((0.03, 0.01, 0.05, 0.01, 0.03)):
+            send_time = time.monotonic() + 1000 - transit
+            self.analytics.record_frame_received(
+                i, 1024, rtp_timestamp=mediaTimestamp(i, 30), send_time=send_time
+            )
+            self.analytics.record_frame_displayed(send_time)
+        
+        self.assertAlmostEqual(self.analytics.get_one_way_base(), -1000 * 1000 + 10, delta=2)
+        # The first frame is 0 against itself; later ones are measured above 10ms
+        self.assertAlmostEqual(self.analytics.get_average_latency(), (0 + 0 + 40 + 0 + 20) / 5, delta=2)
+        self.assertAlmostEqual(self.analytics.get_max_latency(), 40, delta=2)
+        self.assertEqual(self.analytics.get_window_summary()['frames'], 5)
+        self.assertGreater(self.analytics.get_interarrival_jitter(), 0)
+        percentiles = self.analytics.get_latency_percentiles()
+        self.assertGreaterEqual(percentiles['glass_to_glass'][99],
+                                percentiles['glass_to_glass'][50])
+        print(f"✓ Receiver timing: p50 g2g {percentiles['glass_to_glass'][50]:.2f}ms")
+    
+    def test_negative_latency_rejected(self):
+        """Test a negative latency (clock stepped back) never enters the window."""
+        self.analytics.record_frame_sent(1, 1024, 1)
+        ring = self.analytics.frame_stats
+        ring.sent_time[ring.slot(self.analytics.frame_index[1])] += 60  # Clock stepped back
+        self.analytics.record_frame_received(1, 1024)
+        self.assertEqual(self.analytics.latency_window.count, 0)
+        self.assertEqual(self.analytics.latency_histogram.total_count, 0)
+        self.assertIsNone(list(ring)[0].latency_ms)
+        print(f"✓ Negative latency rejected")
+    
+    def test_incremental_window_matches_rescan(self):
+        """Test O(1) accumulators against a full rescan of the window."""
+        import random
+        rng = random.Random(7)
+        analytics = NetworkAnalytics(window_size=50)
+        for i in range(400):
+            analytics.record_frame_sent(i, rng.randint(500, 5000), 2)
+            if rng.random() < 0.8:
+                ring = analytics.frame_stats
+                slot = ring.slot(analytics.frame_index[i])
+                ring.sent_time[slot] -= rng.random() * 0.1  # Simulated latency
+                analytics.record_frame_received(i, ring.frame_size[slot])
+        
+        window = list(analytics.frame_stats)
+        latencies = [s.latency_ms for s in window if s.latency_ms]
+        mean = sum(latencies) / len(latencies)
+        std = (sum((l - mean) ** 2 for l in latencies) / len(latencies)) ** 0.5
+        lost = sum(1 for s in window if not s.is_complete)
+        
+        self.assertAlmostEqual(analytics.get_average_latency(), mean, places=6)
+        self.assertAlmostEqual(analytics.get_jitter(), std, places=6)
+        self.assertAlmostEqual(analytics.get_max_latency(), max(latencies), places=6)
+        self.assertAlmostEqual(analytics.get_frame_loss_rate(), lost / len(window) * 100)
+        self.assertEqual(analytics.window_bytes, sum(s.frame_size for s in window))
+        print(f"✓ Incremental window stats match rescan ({len(window)} frames)")
+    
+    def test_columnar_window_summary(self):
+        """Test the vectorized summary over the columnar frame ring."""
+        analytics = NetworkAnalytics(window_size=8)
+        for i in range(20):
+            analytics.record_frame_sent(i, 1000 + i, 3)
+        for i in (14, 16, 19):
+            analytics.record_frame_received(i, 1000 + i)
+        analytics.record_packet_loss(15, 2)
+        
+        summary = analytics.get_window_summary()
+        self.assertEqual(summary['frames'], 8)
+        self.assertEqual(summary['complete_frames'], 3)
+        self.assertEqual(summary['bytes'], sum(1000 + i for i in range(12, 20)))
+        self.assertEqual(summary['lost_fragments'], 2)
+        self.assertAlmostEqual(summary['frame_loss_rate'], analytics.get_frame_loss_rate())
+        self.assertEqual(summary['bytes'], analytics.window_bytes)
+        print(f"✓ Columnar window summary: {summary['frames']} frames")
+    
     def test_adaptive_bitrate(self):
         """Test adaptive bitrate calculation."""
         # Simulate high packet loss
@@ -158,6 +265,1202 @@ class TestNetworkAnalytics(unittest.TestCase):
             print(f"  {key}: {value}")
 
 
+class TestLatencyHistogram(unittest.TestCase):
+    """Test fixed-memory latency histograms."""
+    
+    def test_percentile_accuracy(self):
+        """Test percentiles stay within bucket precision."""
+        histogram = LatencyHistogram()
+        samples = list(range(1, 100001))
+        for value in samples:
+            histogram.record(value)
+        for p in (50, 95, 99):
+            exact = samples[int(p / 100 * len(samples)) - 1]
+            self.assertAlmostEqual(histogram.percentile(p), exact, delta=exact * 0.02)
+        print(f"✓ Histogram p99: {histogram.percentile(99)} (exact 99000)")
+    
+    def test_constant_memory(self):
+        """Test bucket storage does not grow with sample count."""
+        histogram = LatencyHistogram()
+        buckets = len(histogram.counts)
+        for value in range(0, 10_000_000, 997):
+            histogram.record(value)
+        self.assertEqual(len(histogram.counts), buckets)
+        print(f"✓ Histogram uses {buckets} buckets regardless of samples")
+    
+    def test_merge_and_serialize(self):
+        """Test merging sessions and shipping histograms between processes."""
+        a, b = LatencyHistogram(), LatencyHistogram()
+        for value in range(1000):
+            a.record(value)
+            b.record(value + 1000)
+        restored = LatencyHistogram.from_dict(b.to_dict())
+        merged = merge_histograms([a, restored])
+        self.assertEqual(merged.total_count, 2000)
+        self.assertEqual(merged.min_value, 0)
+        self.assertEqual(merged.max_value, 1999)
+        self.assertAlmostEqual(merged.percentile(50), 1000, delta=20)
+        print(f"✓ Merged histogram p50: {merged.percentile(50)}")
+
+
+class TestMetricsExporter(unittest.TestCase):
+    """Test Prometheus metrics export."""
+    
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        for session_id in (111111, 222222):
+            analytics = NetworkAnalytics()
+            analytics.record_frame_sent(1, 1000, 2)
+            analytics.record_frame_received(1, 1000)
+            analytics.record_send_error()
+            self.registry.register(session_id, analytics)
+    
+    def test_render_sessions_and_aggregates(self):
+        """Test per-session and aggregated series."""
+        text = render_metrics(self.registry)
+        self.assertIn('rtp_active_sessions 2', text)
+        self.assertIn('rtp_session_bytes_sent_total{session="111111"} 1000', text)
+        self.assertIn('rtp_bytes_sent_total 2000', text)
+        self.assertIn('rtp_send_errors_total 2', text)
+        self.assertIn('rtp_latency_seconds_count 2', text)
+        self.assertIn('rtp_latency_seconds_bucket{le="+Inf"} 2', text)
+        print(f"✓ Rendered {len(text.splitlines())} metric lines")
+    
+    def test_retired_sessions_keep_counters(self):
+        """Test aggregates stay monotonic after teardown."""
+        self.registry.unregister(111111)
+        text = render_metrics(self.registry)
+        self.assertIn('rtp_active_sessions 1', text)
+        self.assertIn('rtp_bytes_sent_total 2000', text)
+        self.assertNotIn('session="111111"', text)
+        print(f"✓ Retired session counters folded into totals")
+    
+    def test_http_endpoint(self):
+        """Test /metrics over HTTP."""
+        from urllib.request import urlopen
+        exporter = MetricsExporter(0, self.registry, host='127.0.0.1').start()
+        try:
+            with urlopen(f"http://127.0.0.1:{exporter.port}/metrics", timeout=5) as response:
+                body = response.read().decode()
+        finally:
+            exporter.stop()
+        self.assertIn('# TYPE rtp_bytes_sent_total counter', body)
+        print(f"✓ Metrics served over HTTP ({len(body)} bytes)")
+
+
+class TestNetworkImpairment(unittest.TestCase):
+    """Test the seeded network impairment simulator."""
+    
+    def run_pattern(self, impairment, count=2000):
+        return [tuple(impairment.process(1000, i * 0.001)) for i in range(count)]
+    
+    def test_seeded_patterns_repeat(self):
+        """Test the same seed replays the same loss/reorder/duplicate pattern."""
+        spec = "loss=0.05,delay=0.02,jitter=0.005,reorder=0.02,dup=0.01,seed=42"
+        first = self.run_pattern(NetworkImpairment.from_spec(spec))
+        second = self.run_pattern(NetworkImpairment.from_spec(spec))
+        other = self.run_pattern(NetworkImpairment.from_spec(spec.replace("seed=42", "seed=43")))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        lost = sum(1 for times in first if not times)
+        self.assertTrue(60 < lost < 140)
+        print(f"✓ Seeded impairment repeatable ({lost}/2000 lost)")
+    
+    def test_gilbert_elliott_bursts(self):
+        """Test burst loss matches the model's rate and burst length."""
+        impairment = NetworkImpairment(ge_p=0.01, ge_r=0.25, seed=1)
+        lost = [not times for times in self.run_pattern(impairment, 50000)]
+        bursts, run = [], 0
+        for packet_lost in lost:
+            if packet_lost:
+                run += 1
+            elif run:
+                bursts.append(run)
+                run = 0
+        mean_burst = sum(bursts) / len(bursts)
+        self.assertAlmostEqual(sum(lost) / len(lost), impairment.loss_model.mean_loss, delta=0.01)
+        self.assertAlmostEqual(mean_burst, 4.0, delta=0.6)
+        print(f"✓ Gilbert-Elliott mean burst {mean_burst:.2f} packets")
+    
+    def test_bandwidth_cap(self):
+        """Test serialization delay and tail drop on a capped link."""
+        impairment = NetworkImpairment(bandwidth=8_000_000, queue_delay=0.0105)
+        times = [impairment.process(1000, 0.0) for _ in range(20)]
+        # 1000 bytes at 8 Mbit/s take 1 ms each
+        self.assertAlmostEqual(times[0][0], 0.001)
+        self.assertAlmostEqual(times[9][0], 0.010)
+        self.assertEqual(impairment.packets_queue_dropped, 9)
+        print(f"✓ Bandwidth cap: {impairment.packets_queue_dropped} packets tail-dropped")
+    
+    def test_impaired_socket_delay(self):
+        """Test an impaired socket delivers after the configured delay."""
+        import socket
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(2)
+        sender = ImpairedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM),
+                                NetworkImpairment(delay=0.05, duplicate=1.0))
+        try:
+            start = time.monotonic()
+            sender.sendto(b"frame", receiver.getsockname())
+            self.assertEqual(receiver.recv(100), b"frame")
+            elapsed = time.monotonic() - start
+            self.assertEqual(receiver.recv(100), b"frame")
+        finally:
+            sender.close()
+            receiver.close()
+        self.assertGreaterEqual(elapsed, 0.045)
+        print(f"✓ Impaired socket delivered duplicate after {elapsed * 1000:.0f} ms")
+
+
+class TestFrameCache(unittest.TestCase):
+    """Test the shared LRU frame cache."""
+    
+    def test_lru_eviction_and_counters(self):
+        """Test the byte bound, LRU order and hit/miss counters."""
+        from FrameCache import FrameCache
+        cache = FrameCache(max_bytes=300)
+        for i in range(3):
+            cache.put(('f', i), b'x' * 100, i)
+        self.assertIsNotNone(cache.get(('f', 0)))  # Most recently used now
+        cache.put(('f', 3), b'x' * 100, 3)
+        self.assertIsNone(cache.get(('f', 1)))     # Least recently used went
+        self.assertIsNotNone(cache.get(('f', 0)))
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+        self.assertLessEqual(stats['bytes'], 300)
+        print(f"✓ LRU cache: {stats['entries']} entries, {stats['bytes']} bytes")
+    
+    def test_streams_share_frames(self):
+        """Test a second viewer is served from cache and resumes disk reads correctly."""
+        import tempfile
+        from FrameCache import FrameCache
+        from HDVideoStream import HDVideoStream
+        from VideoStream import VideoStream
+        from benchmark_streaming import write_mjpeg_fixture
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            for stream_class, prefixed in ((VideoStream, True), (HDVideoStream, False)):
+                path = os.path.join(tmp, f"{stream_class.__name__}.mjpeg")
+                write_mjpeg_fixture(path, 20_000, frames=6, length_prefixed=prefixed)
+                expected = []
+                reference = stream_class(path, cache=None)
+                for _ in range(6):
+                    expected.append(reference.nextFrame())
+                reference.file.close()
+                
+                cache = FrameCache()
+                leader = stream_class(path, cache=cache)
+                follower = stream_class(path, cache=cache)
+                first = [leader.nextFrame() for _ in range(3)]
+                # Follower: 3 cache hits, then disk from the right offset
+                second = [follower.nextFrame() for _ in range(6)]
+                self.assertEqual(first, expected[:3])
+                self.assertEqual(second, expected)
+                self.assertEqual(follower.frameNbr(), 6)
+                self.assertFalse(follower.nextFrame())
+                self.assertEqual(cache.hits, 3)
+                leader.file.close()
+                follower.file.close()
+        print(f"✓ Streams share cached frames and resume from disk")
+
+
+class SlowStream(FrameSource):
+    """Stream stand-in whose reads take a fixed time, like a cold disk."""
+    
+    def __init__(self, frames, read_delay):
+        self.frames = frames
+        self.read_delay = read_delay
+        self.frameNum = 0
+        self.file = BytesIO()
+    
+    def nextFrame(self):
+        time.sleep(self.read_delay)
+        if self.frameNum >= self.frames:
+            return None
+        self.frameNum += 1
+        return b"frame%d" % self.frameNum
+    
+    def frameNbr(self):
+        return self.frameNum
+
+
+class TestFramePrefetcher(unittest.TestCase):
+    """Test background read-ahead."""
+    
+    def test_frames_and_numbers_preserved(self):
+        """Test the prefetcher returns the stream's frames, numbers and EOF."""
+        from FramePrefetcher import FramePrefetcher
+        prefetcher = FramePrefetcher(SlowStream(20, 0), depth=4)
+        try:
+            for n in range(1, 21):
+                self.assertEqual(prefetcher.nextFrame(), b"frame%d" % n)
+                self.assertEqual(prefetcher.frameNbr(), n)
+            self.assertIsNone(prefetcher.nextFrame())
+            self.assertIsNone(prefetcher.nextFrame())
+        finally:
+            prefetcher.close()
+        print(f"✓ Prefetched 20 frames in order, EOF preserved")
+    
+    def test_sender_does_not_wait_on_slow_reads(self):
+        """Test frames already read ahead are returned without waiting on I/O."""
+        from FramePrefetcher import FramePrefetcher
+        prefetcher = FramePrefetcher(SlowStream(50, 0.01), depth=8)
+        try:
+            deadline = time.time() + 2
+            while prefetcher.buffered() < 8 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(prefetcher.buffered(), 8)
+            start = time.perf_counter()
+            for _ in range(8):
+                self.assertTrue(prefetcher.nextFrame())
+            elapsed = time.perf_counter() - start
+            self.assertLess(elapsed, 0.02)   # 8 direct reads would take 80 ms
+            self.assertEqual(prefetcher.stalls, 0)
+        finally:
+            prefetcher.close()
+        print(f"✓ 8 frames taken in {elapsed * 1000:.2f} ms from read-ahead")
+    
+    def test_leading_frames_packetized(self):
+        """Test the first frames come with payloads built ahead of time."""
+        from FramePrefetcher import FramePrefetcher
+        prefetcher = FramePrefetcher(SlowStream(6, 0), depth=4,
+                                     packetizer=lambda data, n: [data[:3], data[3:]],
+                                     packetize_frames=2)
+        try:
+            prefetcher.nextFrame()
+            self.assertEqual(prefetcher.framePayloads(), [b"fra", b"me1"])
+            prefetcher.nextFrame()
+            prefetcher.nextFrame()
+            self.assertIsNone(prefetcher.framePayloads())
+        finally:
+            prefetcher.close()
+        print(f"✓ First 2 frames pre-packetized")
+
+
+class TestFrameSource(unittest.TestCase):
+    """Test format detection and the binary container."""
+    
+    def setUp(self):
+        import tempfile
+        from benchmark_streaming import write_mjpeg_fixture
+        self.tmp = tempfile.TemporaryDirectory()
+        self.classic = os.path.join(self.tmp.name, "classic.mjpeg")
+        self.mjpeg = os.path.join(self.tmp.name, "raw.mjpeg")
+        write_mjpeg_fixture(self.classic, 20_000, frames=5, length_prefixed=True)
+        write_mjpeg_fixture(self.mjpeg, 150_000, frames=5)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def read_all(self, source):
+        frames = []
+        while True:
+            data = source.nextFrame()
+            if not data:
+                break
+            frames.append(bytes(data))
+        source.close()
+        return frames
+    
+    def test_detect_format(self):
+        """Test each format is recognized from its magic bytes."""
+        from FrameSource import convert, detect_format
+        container = os.path.join(self.tmp.name, "out.rtpf")
+        convert(self.classic, container)
+        self.assertEqual(detect_format(self.classic), "classic")
+        self.assertEqual(detect_format(self.mjpeg), "mjpeg")
+        self.assertEqual(detect_format(container), "container")
+        junk = os.path.join(self.tmp.name, "junk.bin")
+        with open(junk, "wb") as f:
+            f.write(b"not video")
+        with self.assertRaises(ValueError):
+            detect_format(junk)
+        print(f"✓ classic, mjpeg and container formats detected")
+    
+    def test_convert_round_trip(self):
+        """Test converted containers yield the source frames, timing and size."""
+        from ContainerStream import ContainerStream
+        from FrameSource import convert, open_source
+        for src, fps in ((self.classic, 20), (self.mjpeg, 29.97)):
+            expected = self.read_all(open_source(src, fps=fps, cache=None))
+            container = os.path.join(self.tmp.name, os.path.basename(src) + ".rtpf")
+            self.assertEqual(convert(src, container, fps=fps, resolution=(1920, 1080)), 5)
+            stream = open_source(container, cache=None)
+            self.assertIsInstance(stream, ContainerStream)
+            self.assertAlmostEqual(stream.fps, fps)
+            self.assertEqual(stream.resolution, (1920, 1080))
+            self.assertEqual(stream.frame_count, 5)
+            self.assertTrue(stream.nextFrame())
+            self.assertEqual(stream.frameTimestamp(), mediaTimestamp(1, fps))
+            stream.close()
+            self.assertEqual(self.read_all(open_source(container, cache=None)), expected)
+        # Raw MJPEG frames of 150 KB would not fit the classic 5-digit prefix
+        self.assertGreater(len(expected[0]), 99_999)
+        print(f"✓ Classic and {len(expected[0]) // 1000} KB MJPEG frames round-trip")
+    
+    def test_container_shares_frame_cache(self):
+        """Test a second reader is served from cache and resumes from disk."""
+        from FrameCache import FrameCache
+        from FrameSource import convert, open_source
+        container = os.path.join(self.tmp.name, "shared.rtpf")
+        convert(self.mjpeg, container, fps=30)
+        expected = self.read_all(open_source(container, cache=None))
+        cache = FrameCache()
+        leader = open_source(container, cache=cache)
+        follower = open_source(container, cache=cache)
+        for _ in range(3):
+            leader.nextFrame()
+        self.assertEqual(self.read_all(follower), expected)
+        self.assertEqual(follower.frameNbr(), 5)
+        self.assertEqual(cache.hits, 3)
+        leader.close()
+        print(f"✓ Container follower: {cache.hits} cache hits, then disk")
+
+
+class TestLiveSource(unittest.TestCase):
+    """Test live ingest from growing files and FIFOs."""
+    
+    def setUp(self):
+        import tempfile
+        from benchmark_streaming import make_mjpeg_frame
+        self.tmp = tempfile.TemporaryDirectory()
+        self.frames = [make_mjpeg_frame(5_000, seed=n) for n in range(6)]
+    
+    def tearDown(self):
+        import LiveSource
+        LiveSource.stop_all()
+        self.tmp.cleanup()
+    
+    def next_frames(self, source, count, timeout=2.0):
+        frames = []
+        deadline = time.monotonic() + timeout
+        while len(frames) < count and time.monotonic() < deadline:
+            data = source.nextFrame()
+            if data:
+                frames.append(data)
+        return frames
+    
+    def test_scanner_split_reads(self):
+        """Test frames split at every byte boundary are found exactly once."""
+        from LiveSource import MjpegScanner
+        stream = b"garbage" + b"".join(self.frames[:3])
+        scanner = MjpegScanner()
+        found = []
+        for i in range(len(stream)):
+            found.extend(scanner.feed(stream[i:i + 1]))
+        self.assertEqual(found, self.frames[:3])
+        self.assertEqual(scanner.discarded, len(b"garbage"))
+        print(f"✓ Byte-at-a-time scan found {len(found)} frames")
+    
+    def test_tail_growing_file(self):
+        """Test frames appended to a file reach every subscriber."""
+        from LiveSource import live_source
+        path = os.path.join(self.tmp.name, "camera.mjpeg")
+        with open(path, "wb") as f:
+            f.write(self.frames[0])  # Written before ingest: not replayed
+        first = live_source("live:" + path, depth=4, start=True)
+        second = live_source("live:" + path, depth=4, start=True)
+        self.assertTrue(first.live)
+        start = time.monotonic()
+        with open(path, "ab") as f:
+            for frame in self.frames[1:4]:
+                f.write(frame)
+                f.flush()
+        self.assertEqual(self.next_frames(first, 3), self.frames[1:4])
+        latency = time.monotonic() - start
+        self.assertEqual(self.next_frames(second, 3), self.frames[1:4])
+        self.assertEqual(first.frameNbr(), 3)
+        self.assertLess(latency, 0.5)
+        first.close()
+        second.close()
+        print(f"✓ Tailed 3 frames to 2 subscribers in {latency * 1000:.1f} ms")
+    
+    def test_fifo_and_lagging_subscriber(self):
+        """Test FIFO ingest and that a lagging subscriber drops its oldest frames."""
+        from FrameSource import detect_format, open_source
+        from LiveSource import start_ingest
+        path = os.path.join(self.tmp.name, "camera.fifo")
+        os.mkfifo(path)
+        self.assertEqual(detect_format(path), "live")
+        start_ingest(path)
+        lagging = open_source(path)
+        writer = os.open(path, os.O_WRONLY)
+        try:
+            for frame in self.frames:
+                os.write(writer, frame)
+            deadline = time.monotonic() + 2
+            while lagging.ingest.frames < len(self.frames) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            os.close(writer)
+        # Depth 2: only the two newest frames are left
+        self.assertEqual(self.next_frames(lagging, 2), self.frames[-2:])
+        self.assertEqual(lagging.get_stats()['dropped'], len(self.frames) - 2)
+        self.assertIsNone(lagging.nextFrame(timeout=0.01))
+        lagging.close()
+        print(f"✓ FIFO ingest: lagging subscriber kept newest 2, dropped {lagging.dropped}")
+    
+    def test_sender_idles_after_ingest_ends(self):
+        """Test a PLAYing session whose feed ends waits instead of spinning."""
+        import socket
+        from LiveSource import start_ingest
+        from ServerWorker import ServerWorker
+        path = os.path.join(self.tmp.name, "camera.fifo")
+        os.mkfifo(path)
+        start_ingest(path)
+        server_end, client_end = socket.socketpair()
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        for sock in (server_end, client_end, receiver):
+            self.addCleanup(sock.close)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        worker.processRtspRequest(f"SETUP live:{path} RTSP/1.0\nCSeq: 1\nTransport: RTP/UDP; "
+                                  f"client_port= {receiver.getsockname()[1]}")
+        client_end.recv(1024)
+        stream = worker.clientInfo["videoStream"]
+        stream.ingest.stop()
+        stream.ingest.thread.join(2)
+        self.assertTrue(stream.ended)
+        calls = []
+        next_frame = stream.nextFrame
+        stream.nextFrame = lambda: calls.append(1) or next_frame()
+        worker.processRtspRequest("PLAY x RTSP/1.0\nCSeq: 2\nSession: 0")
+        time.sleep(0.3)
+        worker.processRtspRequest("TEARDOWN x RTSP/1.0\nCSeq: 3\nSession: 0")
+        # One wait per frame interval, not a busy loop
+        self.assertLess(len(calls), 0.3 * worker.fps + 5)
+        print(f"✓ Ended live feed: {len(calls)} frame polls in 300 ms")
+    
+    def test_ingest_stops_with_last_subscriber(self):
+        """Test an unserved ingest is released with its last subscriber; a served one stays."""
+        import LiveSource
+        path = os.path.join(self.tmp.name, "camera.mjpeg")
+        open(path, "wb").close()
+        first = LiveSource.live_source(path, start=True)
+        second = LiveSource.live_source(path, start=True)  # Joins the running ingest
+        ingest = first.ingest
+        self.assertIs(second.ingest, ingest)
+        first.close()
+        first.close()  # Closing twice releases once
+        self.assertFalse(ingest.stopped.is_set())
+        second.close()
+        self.assertTrue(ingest.stopped.is_set())
+        self.assertIsNone(ingest.watch_fd)
+        self.assertNotIn(ingest.key, LiveSource._ingests)
+        
+        served = LiveSource.start_ingest(path)
+        LiveSource.live_source(path).close()
+        self.assertFalse(served.stopped.is_set())
+        print(f"✓ Ingest stopped with its last subscriber; --live ingest kept")
+    
+    def test_setup_unserved_live_source(self):
+        """Test SETUP of a live source the server was not started with is refused."""
+        import socket
+        import LiveSource
+        from ServerWorker import ServerWorker
+        server_end, client_end = socket.socketpair()
+        for sock in (server_end, client_end):
+            self.addCleanup(sock.close)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        for name in ("live:-", "live:" + os.path.join(self.tmp.name, "camera.mjpeg")):
+            open(os.path.join(self.tmp.name, "camera.mjpeg"), "wb").close()
+            worker.processRtspRequest(f"SETUP {name} RTSP/1.0\nCSeq: 1\n"
+                                      f"Transport: RTP/UDP; client_port= 9")
+            self.assertTrue(client_end.recv(1024).decode().startswith("RTSP/1.0 404"))
+        self.assertEqual(LiveSource._ingests, {})
+        print(f"✓ SETUP of unserved live sources refused")
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 100.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestFrameScheduler(unittest.TestCase):
+    """Test real-time frame scheduling from media timestamps."""
+    
+    def test_frames_due_on_timestamp_grid(self):
+        """Test frame n is due at start + n / fps, whatever the send cost."""
+        from FrameScheduler import FrameScheduler
+        clock = FakeClock()
+        scheduler = FrameScheduler(25, clock=clock)
+        scheduler.start()
+        for n in range(1, 51):
+            due, timestamp = scheduler.schedule(mediaTimestamp(n, 25))
+            self.assertAlmostEqual(due, 100.0 + (n - 1) * 0.04)
+            self.assertEqual(timestamp, mediaTimestamp(n, 25))
+            clock.now = due + 0.001  # Sent promptly
+            scheduler.frame_sent(due)
+            clock.now += 0.01        # Variable work per frame doesn't drift the grid
+        self.assertEqual(scheduler.late_frames, 0)
+        print(f"✓ 50 frames on a 40 ms grid, no drift")
+    
+    def test_speed_and_rtp_timestamps(self):
+        """Test 2x speed halves frame spacing and RTP timestamps follow wall clock."""
+        from FrameScheduler import FrameScheduler, parse_scale
+        clock = FakeClock()
+        scheduler = FrameScheduler(30, speed=parse_scale("2"), clock=clock)
+        scheduler.start()
+        first, ts0 = scheduler.schedule(3000)
+        second, ts1 = scheduler.schedule(6000)
+        self.assertAlmostEqual(second - first, 1 / 60)
+        self.assertEqual(ts1 - ts0, 1500)
+        self.assertIsNone(parse_scale("-1"))
+        self.assertIsNone(parse_scale("fast"))
+        print(f"✓ 2x: {1000 * (second - first):.1f} ms frame spacing")
+    
+    def test_overrun_catch_up_is_deterministic(self):
+        """Test a short stall is caught up and a long one moves the schedule."""
+        from FrameScheduler import FrameScheduler
+        clock = FakeClock()
+        scheduler = FrameScheduler(10, max_catch_up=0.25, clock=clock)
+        scheduler.start()
+        due, _ = scheduler.schedule(0)
+        scheduler.frame_sent(due)
+        clock.now += 0.15   # Frame 2 (due +0.1) goes out 50 ms late
+        due, _ = scheduler.schedule(9000)
+        self.assertAlmostEqual(scheduler.frame_sent(due), 0.05)
+        due, _ = scheduler.schedule(18000)
+        self.assertAlmostEqual(due, 100.2)  # Catch-up: grid unchanged
+        clock.now = 101.0   # Stall far beyond the catch-up limit
+        scheduler.frame_sent(due)
+        due, _ = scheduler.schedule(27000)
+        self.assertAlmostEqual(due, 101.1)  # Schedule moved, no burst
+        self.assertEqual((scheduler.late_frames, scheduler.resyncs), (2, 1))
+        print(f"✓ Late frames: {scheduler.late_frames}, schedule moves: {scheduler.resyncs}")
+    
+    def test_timestamp_wrap_and_resume(self):
+        """Test 32-bit timestamp wrap and that a resume continues the RTP clock."""
+        from FrameScheduler import FrameScheduler
+        clock = FakeClock()
+        scheduler = FrameScheduler(30, clock=clock)
+        scheduler.start()
+        first, ts0 = scheduler.schedule(0xFFFFFFFF - 1000)
+        second, ts1 = scheduler.schedule(2000)  # Wrapped: 3001 ticks later
+        self.assertAlmostEqual(second - first, 3001 / 90000)
+        self.assertEqual((ts1 - ts0) & 0xFFFFFFFF, 3001)
+        clock.now += 5.0    # PAUSE for 5 s, then PLAY
+        scheduler.start()
+        resumed, ts2 = scheduler.schedule(5000)
+        self.assertEqual(resumed, clock.now)
+        self.assertAlmostEqual((ts2 - ts1) & 0xFFFFFFFF, 5.0 * 90000, delta=90000 * 0.04)
+        print(f"✓ Timestamp wrap handled, resume advanced RTP clock by 5 s")
+    
+    def test_fast_start_burst(self):
+        """Test burst frames leave early at BURST_RATE without moving the grid."""
+        from FrameScheduler import FrameScheduler, BURST_RATE
+        clock = FakeClock()
+        scheduler = FrameScheduler(10, clock=clock)
+        scheduler.start(burst=0.3)
+        dues = [scheduler.schedule(mediaTimestamp(n, 10), 1000) for n in range(6)]
+        for n, (due, timestamp) in enumerate(dues[:3]):
+            self.assertAlmostEqual(due, 100.0 + n * 0.1 / BURST_RATE)
+            self.assertEqual(timestamp, mediaTimestamp(n, 10))  # RTP clock untouched
+        self.assertAlmostEqual(dues[5][0], 100.5)  # Back on the grid
+        self.assertEqual(scheduler.burst_frames, 3)
+        
+        scheduler = FrameScheduler(10, clock=clock)
+        scheduler.start(burst=0.3, burst_bytes=1500)
+        dues = [scheduler.schedule(mediaTimestamp(n, 10), 1000)[0] for n in range(3)]
+        self.assertAlmostEqual(dues[2] - dues[0], 0.2)  # Budget spent after one frame
+        print(f"✓ Fast start: {BURST_RATE:g}x burst, grid unchanged, byte budget honoured")
+
+
+class TestSessionPipeline(unittest.TestCase):
+    """Test that a session's sender survives PAUSE/PLAY."""
+    
+    def test_pause_resume_reuses_sender(self):
+        """Test PLAY after PAUSE wakes the same thread and socket; TEARDOWN ends it."""
+        import socket, tempfile
+        from ServerWorker import ServerWorker
+        from benchmark_streaming import write_mjpeg_fixture
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "movie.mjpeg")
+            write_mjpeg_fixture(path, 5_000, frames=100, length_prefixed=True)
+            server_end, client_end = socket.socketpair()
+            rtp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            rtp.bind(("127.0.0.1", 0))
+            rtp.settimeout(2.0)
+            worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+            try:
+                worker.processRtspRequest(f"SETUP {path} RTSP/1.0\nCSeq: 1\n"
+                                          f"Transport: RTP/UDP; client_port= {rtp.getsockname()[1]}")
+                rtp_socket = worker.clientInfo["rtpSocket"]  # Opened and connected at SETUP
+                self.assertEqual(rtp_socket.getpeername(), rtp.getsockname())
+                worker.processRtspRequest("PLAY x RTSP/1.0\nCSeq: 2\nSession: 0")
+                rtp.recv(65536)
+                sender = worker.clientInfo["worker"]
+                worker.processRtspRequest("PAUSE x RTSP/1.0\nCSeq: 3\nSession: 0")
+                worker.processRtspRequest("PLAY x RTSP/1.0\nCSeq: 4\nSession: 0")
+                rtp.recv(65536)
+                self.assertIs(worker.clientInfo["worker"], sender)
+                self.assertIs(worker.clientInfo["rtpSocket"], rtp_socket)
+                self.assertTrue(sender.is_alive())
+                worker.processRtspRequest("TEARDOWN x RTSP/1.0\nCSeq: 5\nSession: 0")
+                sender.join(1.0)
+                self.assertFalse(sender.is_alive())
+            finally:
+                server_end.close()
+                client_end.close()
+                rtp.close()
+        print(f"✓ PAUSE/PLAY parked and woke the same sender thread")
+    
+    def test_setup_missing_file(self):
+        """Test a failed SETUP gets one 404 reply and leaves no session behind."""
+        import socket
+        from MetricsExporter import REGISTRY
+        from ServerWorker import ServerWorker
+        server_end, client_end = socket.socketpair()
+        self.addCleanup(server_end.close)
+        self.addCleanup(client_end.close)
+        client_end.settimeout(0.2)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        worker.processRtspRequest("SETUP /no/such/movie.mjpeg RTSP/1.0\nCSeq: 1\n"
+                                  "Transport: RTP/UDP; client_port= 9")
+        self.assertEqual(client_end.recv(1024).decode(), "RTSP/1.0 404 NOT FOUND\nCSeq: 1")
+        with self.assertRaises(socket.timeout):
+            client_end.recv(1024)  # No 200 after the 404
+        self.assertEqual(worker.state, ServerWorker.INIT)
+        self.assertNotIn(worker.clientInfo["session"], REGISTRY.sessions)
+        self.assertNotIn("rtpSocket", worker.clientInfo)
+        print("✓ SETUP of a missing file: single 404, nothing registered")
+    
+    def test_teardown_during_frame(self):
+        """Test TEARDOWN while the sender is mid-frame waits for it instead of racing it."""
+        import socket, tempfile, threading
+        from ServerWorker import ServerWorker
+        from benchmark_streaming import write_mjpeg_fixture
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "movie.mjpeg")
+        write_mjpeg_fixture(path, 5_000, frames=100, length_prefixed=True)
+        server_end, client_end = socket.socketpair()
+        for sock in (server_end, client_end):
+            self.addCleanup(sock.close)
+        errors = []
+        excepthook = threading.excepthook
+        threading.excepthook = errors.append
+        self.addCleanup(setattr, threading, "excepthook", excepthook)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        worker.processRtspRequest(f"SETUP {path} RTSP/1.0\nCSeq: 1\n"
+                                  f"Transport: RTP/UDP; client_port= 9")
+        stream = worker.clientInfo["videoStream"]
+        reading = threading.Event()
+        next_frame = stream.nextFrame
+        
+        def slow_next_frame():
+            reading.set()
+            time.sleep(0.2)
+            return next_frame()
+        
+        stream.nextFrame = slow_next_frame
+        worker.processRtspRequest("PLAY x RTSP/1.0\nCSeq: 2\nSession: 0")
+        self.assertTrue(reading.wait(2.0))
+        worker.processRtspRequest("TEARDOWN x RTSP/1.0\nCSeq: 3\nSession: 0")
+        self.assertFalse(worker.clientInfo["worker"].is_alive())
+        self.assertEqual(errors, [])
+        print("✓ TEARDOWN mid-frame: sender finished before the stream closed")
+    
+    def test_disconnect_closes_rtp_socket(self):
+        """Test a client dropping without TEARDOWN releases the session's RTP socket."""
+        import socket, tempfile
+        from ServerWorker import ServerWorker
+        from benchmark_streaming import write_mjpeg_fixture
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "movie.mjpeg")
+        write_mjpeg_fixture(path, 5_000, frames=5, length_prefixed=True)
+        server_end, client_end = socket.socketpair()
+        self.addCleanup(server_end.close)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        worker.processRtspRequest(f"SETUP {path} RTSP/1.0\nCSeq: 1\n"
+                                  f"Transport: RTP/UDP; client_port= 9")
+        rtp_socket = worker.clientInfo["rtpSocket"]
+        client_end.close()
+        worker.recvRtspRequest()  # Returns on the closed connection
+        self.assertNotIn("rtpSocket", worker.clientInfo)
+        self.assertEqual(getattr(rtp_socket, "sock", rtp_socket).fileno(), -1)
+        print("✓ Dropped connection closed the RTP socket")
+
+
+class TestMtuNegotiation(unittest.TestCase):
+    """Test the SETUP Blocksize exchange."""
+    
+    def setup_session(self, blocksize=None, mtu=FragmentationHandler.STANDARD_MTU,
+                      discovery=False):
+        import socket, tempfile
+        from ServerWorker import ServerWorker
+        from benchmark_streaming import write_mjpeg_fixture
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "movie.mjpeg")
+        write_mjpeg_fixture(path, 5_000, frames=5, length_prefixed=True)
+        server_end, client_end = socket.socketpair()
+        self.addCleanup(server_end.close)
+        self.addCleanup(client_end.close)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        worker.mtu = mtu
+        worker.mtu_discovery = discovery
+        header = f"\nBlocksize: {blocksize}" if blocksize else ""
+        worker.processRtspRequest(f"SETUP {path} RTSP/1.0\nCSeq: 1\n"
+                                  f"Transport: RTP/UDP; client_port= 9{header}")
+        self.addCleanup(worker.processRtspRequest, "TEARDOWN x RTSP/1.0\nCSeq: 2\nSession: 0")
+        reply = client_end.recv(1024).decode()
+        return worker, int(reply.split("Blocksize: ")[1].split("\n")[0])
+    
+    def test_blocksize_negotiated(self):
+        """Test the server grants a smaller Blocksize and caps a larger one at its MTU."""
+        vpn = FragmentationHandler.blocksize_for_mtu(1400)
+        jumbo = FragmentationHandler.blocksize_for_mtu(FragmentationHandler.JUMBO_MTU)
+        worker, granted = self.setup_session(vpn)
+        self.assertEqual(granted, vpn)
+        self.assertEqual(worker.fragmentation_handler.max_payload_size,
+                         vpn - FragmentationHeader.HEADER_SIZE)
+        _, granted = self.setup_session(jumbo)
+        self.assertEqual(granted, FragmentationHandler.blocksize_for_mtu(1500))
+        _, granted = self.setup_session(jumbo, mtu=FragmentationHandler.JUMBO_MTU)
+        self.assertEqual(granted, jumbo)
+        _, granted = self.setup_session(10)
+        self.assertEqual(granted, FragmentationHandler.blocksize_for_mtu(FragmentationHandler.MIN_MTU))
+        print(f"✓ Blocksize negotiated: VPN {vpn}, jumbo {jumbo}")
+    
+    def test_discovery_failure_falls_back(self):
+        """Test --mtu=auto without a kernel path MTU grants the standard Blocksize."""
+        import ServerWorker as server_worker
+        path_mtu = server_worker.path_mtu
+        server_worker.path_mtu = lambda sock: None
+        self.addCleanup(setattr, server_worker, "path_mtu", path_mtu)
+        jumbo = FragmentationHandler.blocksize_for_mtu(FragmentationHandler.JUMBO_MTU)
+        _, granted = self.setup_session(jumbo, mtu=FragmentationHandler.MAX_MTU, discovery=True)
+        self.assertEqual(granted, FragmentationHandler.blocksize_for_mtu(FragmentationHandler.STANDARD_MTU))
+        print(f"✓ Failed path MTU discovery falls back to Blocksize {granted}")
+
+
+class TestSocketOptions(unittest.TestCase):
+    """Test RTP socket option specs."""
+    
+    def test_spec_parsing(self):
+        """Test spec keys, DSCP names, "none" and inherited defaults."""
+        from SocketOptions import SocketOptions
+        options = SocketOptions.from_spec("dscp=af41,priority=5,rcvbuf=none",
+                                          base=SocketOptions(sndbuf=1 << 20, rcvbuf=1 << 20))
+        self.assertEqual((options.sndbuf, options.rcvbuf, options.dscp, options.priority),
+                         (1 << 20, None, 34, 5))
+        self.assertEqual(SocketOptions.from_spec("dscp=0x2e").dscp, 46)
+        with self.assertRaises(ValueError):
+            SocketOptions.from_spec("dscp=64")
+        with self.assertRaises(ValueError):
+            SocketOptions.from_spec("ttl=4")
+        print(f"✓ Socket option spec parsed: {options!r}")
+    
+    def test_applied_to_connected_socket(self):
+        """Test options are set before the sender socket connects."""
+        import socket
+        from SocketOptions import SocketOptions, effective_options, rtp_sender_socket
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        sender = rtp_sender_socket(receiver.getsockname(), SocketOptions(sndbuf=65536, dscp=46))
+        try:
+            effective = effective_options(sender)
+            self.assertEqual(effective['dscp'], 46)
+            self.assertGreaterEqual(effective['sndbuf'], 65536)
+            sender.send(b"rtp")
+            self.assertEqual(receiver.recv(16), b"rtp")
+        finally:
+            sender.close()
+            receiver.close()
+        print(f"✓ Connected RTP socket: {effective}")
+    
+    def test_refused_buffer_size_logged(self):
+        """Test a buffer size the kernel refuses leaves the default and the other options set."""
+        import socket
+        from SocketOptions import SocketOptions
+        
+        class RefusingSocket:
+            def __init__(self, sock):
+                self.sock = sock
+            
+            def setsockopt(self, level, option, value):
+                if option == socket.SO_SNDBUF:
+                    raise OSError(22, "Invalid argument")
+                self.sock.setsockopt(level, option, value)
+            
+            def getsockopt(self, level, option):
+                return self.sock.getsockopt(level, option)
+        
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        default = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        effective = SocketOptions(sndbuf=1 << 20, dscp=46).apply(RefusingSocket(sock))
+        self.assertEqual(effective['sndbuf'], default)
+        self.assertEqual(effective['dscp'], 46)
+        print(f"✓ Refused SO_SNDBUF logged, DSCP still set: {effective}")
+
+
+class TestFrameAssembler(unittest.TestCase):
+    """Test marker- and sequence-driven frame assembly."""
+    
+    def packets(self, frame, seq, timestamp, pt=96, blocksize=1000):
+        from PacketCache import rtp_header
+        handler = FragmentationHandler()
+        handler.set_blocksize(blocksize)
+        payloads = [h + p for h, p in handler.fragment_frame(frame, timestamp)]
+        packets = []
+        for index, payload in enumerate(payloads):
+            packet = RtpPacket()
+            packet.decode(rtp_header(seq + index, timestamp, 1.0, pt=pt,
+                                     marker=int(index == len(payloads) - 1)) + payload)
+            packets.append(packet)
+        return packets
+    
+    def frame(self, n, size=3000):
+        return b"\xff\xd8" + bytes([n]) * (size - 4) + b"\xff\xd9"
+    
+    def test_sequence_wrap(self):
+        """Test frames assemble across the 16-bit sequence wrap, single packets included."""
+        from FrameAssembler import FrameAssembler, seq_delta
+        self.assertEqual(seq_delta(2, 65534), 4)
+        self.assertEqual(seq_delta(65534, 2), -4)
+        assembler = FrameAssembler()
+        seq, out = 65530, []
+        for n, size in enumerate((3000, 500, 3000, 3000)):
+            packets = self.packets(self.frame(n, size), seq, 3000 * n)
+            seq += len(packets)
+            out += [result for result in map(assembler.add, packets) if result]
+        self.assertEqual([data for data, _, _ in out],
+                         [self.frame(n, size) for n, size in enumerate((3000, 500, 3000, 3000))])
+        self.assertEqual(assembler.get_stats()['packets_lost'], 0)
+        print(f"✓ Sequence wrap: {len(out)} frames from seq 65530")
+    
+    def test_loss_and_reorder(self):
+        """Test a frame with a lost packet is dropped and reordered packets still assemble."""
+        from FrameAssembler import FrameAssembler
+        dropped = []
+        assembler = FrameAssembler(on_drop=dropped.append)
+        first = self.packets(self.frame(1), 100, 3000)
+        second = self.packets(self.frame(2), 104, 6000)
+        third = self.packets(self.frame(3), 108, 9000)
+        results = [assembler.add(p) for p in first[:1] + first[2:]]
+        # Head of the third frame arrives after its marker
+        results += [assembler.add(p) for p in second + third[1:] + third[:1]]
+        frames = [result[1] for result in results if result]
+        self.assertEqual(frames, [6000, 9000])
+        self.assertEqual(dropped, [3000])
+        self.assertEqual(assembler.get_stats()['packets_lost'], 1)
+        print(f"✓ Loss and reorder: {assembler.get_stats()}")
+    
+    def test_malformed_frames_dropped(self):
+        """Test payloads that are not what their payload type says never come out."""
+        from FrameAssembler import FrameAssembler
+        from PacketCache import rtp_header
+        assembler = FrameAssembler()
+        # A bare JPEG under PT 96 (the old single-packet format) is not a fragment
+        bare = RtpPacket()
+        bare.decode(rtp_header(1, 3000, pt=96, marker=1) + self.frame(1, 400))
+        # Unknown payload type
+        unknown = self.packets(self.frame(2), 2, 6000, pt=97)
+        # Fragment headers that disagree on the frame size
+        mixed = self.packets(self.frame(3), 6, 9000)[:2] + self.packets(self.frame(3, 4000), 6, 9000)[2:]
+        for packet in [bare] + unknown + mixed:
+            self.assertIsNone(assembler.add(packet))
+        self.assertEqual(assembler.get_stats()['frames_malformed'], 3)
+        self.assertIsNotNone([assembler.add(p) for p in self.packets(self.frame(4), 11, 12000)][-1])
+        print(f"✓ Malformed frames dropped: {assembler.get_stats()['frames_malformed']}")
+
+
+@unittest.skipIf(Image is None, "Pillow not installed")
+class TestJpegRtp(unittest.TestCase):
+    """Test the RFC 2435 packetizer and depacketizer."""
+    
+    def make_jpeg(self, size=(320, 240), **options):
+        out = BytesIO()
+        Image.effect_noise(size, 40).convert("RGB").save(out, format="JPEG", **options)
+        return out.getvalue()
+    
+    def depacketize(self, depacketizer, timestamp, payloads):
+        frames = [depacketizer.add(timestamp, index == len(payloads) - 1, payload)
+                  for index, payload in enumerate(payloads)]
+        return frames[-1]
+    
+    def test_round_trip(self):
+        """Test a frame decodes to the same pixels after the headers are rebuilt."""
+        import JpegRtp
+        for options in ({'quality': 75}, {'quality': 90, 'subsampling': 1},
+                        {'qtables': [[3] * 64, [7] * 64]}):
+            jpeg = self.make_jpeg(**options)
+            payloads = JpegRtp.packetize(jpeg, 1400)
+            self.assertTrue(all(len(payload) <= 1400 for payload in payloads))
+            frame = self.depacketize(JpegRtp.JpegDepacketizer(), 9000, payloads)
+            self.assertEqual(Image.open(BytesIO(frame)).tobytes(), Image.open(BytesIO(jpeg)).tobytes())
+        # Standard scaled tables travel as a Q factor, others in-band
+        self.assertEqual(JpegRtp.packetize(self.make_jpeg(quality=75), 1400)[0][5], 75)
+        self.assertEqual(payloads[0][5], JpegRtp.Q_DYNAMIC)
+        print(f"✓ RFC 2435 round trip: {len(payloads)} packets, {len(jpeg)} byte frame")
+    
+    def test_lost_fragment_drops_frame(self):
+        """Test a frame missing a packet is dropped and the next one still assembles."""
+        import JpegRtp
+        depacketizer = JpegRtp.JpegDepacketizer()
+        payloads = JpegRtp.packetize(self.make_jpeg(), 1400)
+        self.assertIsNone(self.depacketize(depacketizer, 1, payloads[:2] + payloads[3:]))
+        # Marker packet lost: the frame is given up when the next one starts
+        for payload in payloads[:-1]:
+            self.assertIsNone(depacketizer.add(2, False, payload))
+        self.assertIsNotNone(self.depacketize(depacketizer, 3, payloads))
+        self.assertEqual(depacketizer.get_stats(), {'frames': 1, 'frames_dropped': 2})
+        print(f"✓ Incomplete frames dropped: {depacketizer.get_stats()}")
+    
+    def test_unsupported_frames(self):
+        """Test frames RFC 2435 cannot carry are refused, and skipped by the server."""
+        import JpegRtp
+        from ServerWorker import ServerWorker
+        for options in ({'subsampling': 0}, {'optimize': True}, {'progressive': True}):
+            with self.assertRaises(ValueError):
+                JpegRtp.packetize(self.make_jpeg(**options), 1400)
+        worker = ServerWorker({"session": 1})
+        worker.payload_format = JpegRtp.FORMAT_RFC2435
+        self.assertEqual(worker.packetize(self.make_jpeg(progressive=True), 1), [])
+        blocksize = worker.fragmentation_handler.max_payload_size + FragmentationHeader.HEADER_SIZE
+        payloads = worker.packetize(self.make_jpeg(), 1)
+        self.assertEqual(len(payloads[0]), blocksize)
+        print(f"✓ Unsupported JPEGs refused; RFC 2435 packets of {blocksize} bytes")
+    
+    def test_payload_format_negotiated(self):
+        """Test SETUP echoes the format and the marker bit ends each frame."""
+        import socket, tempfile
+        import JpegRtp
+        from ServerWorker import ServerWorker
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "movie.mjpeg")
+        with open(path, "wb") as f:
+            for _ in range(3):
+                jpeg = self.make_jpeg()
+                f.write(b"%05d" % len(jpeg) + jpeg)
+        server_end, client_end = socket.socketpair()
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(2)
+        for sock in (server_end, client_end, receiver):
+            self.addCleanup(sock.close)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        worker.processRtspRequest(f"SETUP {path} RTSP/1.0\nCSeq: 1\nTransport: RTP/UDP; "
+                                  f"client_port= {receiver.getsockname()[1]}\nPayload-Format: rfc2435")
+        self.addCleanup(worker.processRtspRequest, "TEARDOWN x RTSP/1.0\nCSeq: 3\nSession: 0")
+        self.assertIn("Payload-Format: rfc2435", client_end.recv(1024).decode())
+        self.assertIsNone(worker.hint_track)
+        worker.processRtspRequest("PLAY x RTSP/1.0\nCSeq: 2\nSession: 0")
+        from FrameAssembler import FrameAssembler
+        assembler = FrameAssembler()
+        assembled = None
+        while assembled is None:
+            packet = RtpPacket()
+            packet.decode(receiver.recv(65536))
+            assembled = assembler.add(packet)
+        frame = assembled[0]
+        self.assertEqual(packet.payloadType(), JpegRtp.PT_JPEG)
+        self.assertEqual(Image.open(BytesIO(frame)).size, (320, 240))
+        print(f"✓ RFC 2435 session: first frame {len(frame)} bytes")
+    
+    def test_unpacketizable_frame_skipped(self):
+        """Test a frame pre-packetized to no payloads at SETUP is skipped, not sent empty."""
+        import socket, tempfile
+        import JpegRtp
+        from FrameAssembler import FrameAssembler
+        from ServerWorker import ServerWorker
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "movie.mjpeg")
+        with open(path, "wb") as f:
+            for options in ({'progressive': True}, {}, {}):
+                jpeg = self.make_jpeg(**options)
+                f.write(b"%05d" % len(jpeg) + jpeg)
+        server_end, client_end = socket.socketpair()
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(2)
+        for sock in (server_end, client_end, receiver):
+            self.addCleanup(sock.close)
+        worker = ServerWorker({"rtspSocket": (server_end, ("127.0.0.1", 0))})
+        sent = []
+        send = worker.sendHintedFrame
+        worker.sendHintedFrame = lambda payloads, *args: sent.append(len(payloads)) or \
+            send(payloads, *args)
+        worker.processRtspRequest(f"SETUP {path} RTSP/1.0\nCSeq: 1\nTransport: RTP/UDP; "
+                                  f"client_port= {receiver.getsockname()[1]}\nPayload-Format: rfc2435")
+        self.addCleanup(worker.processRtspRequest, "TEARDOWN x RTSP/1.0\nCSeq: 3\nSession: 0")
+        client_end.recv(1024)
+        worker.processRtspRequest("PLAY x RTSP/1.0\nCSeq: 2\nSession: 0")
+        assembler = FrameAssembler()
+        assembled = None
+        while assembled is None:
+            packet = RtpPacket()
+            packet.decode(receiver.recv(65536))
+            assembled = assembler.add(packet)
+        self.assertEqual(assembled[1], mediaTimestamp(2, worker.fps))
+        self.assertNotIn(0, sent)
+        print(f"✓ Unpacketizable frame skipped: {sent[0]} packets in the first frame sent")
+
+
+class TestPacketCache(unittest.TestCase):
+    """Test pre-packetized hint files."""
+    
+    def setUp(self):
+        import tempfile
+        from benchmark_streaming import write_mjpeg_fixture
+        self.tmp = tempfile.TemporaryDirectory()
+        self.media = os.path.join(self.tmp.name, "movie.mjpeg")
+        write_mjpeg_fixture(self.media, 30_000, frames=4, length_prefixed=True)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_hinted_packets_match_live_packetizer(self):
+        """Test hint-track packets are byte-identical to sendRtp's packets."""
+        from PacketCache import HintTrack, build_hint_file, rtp_header
+        from VideoStream import VideoStream
+        path = build_hint_file(self.media, VideoStream(self.media), 20)
+        track = HintTrack(path)
+        handler = FragmentationHandler()
+        stream = VideoStream(self.media)
+        try:
+            self.assertEqual(track.frame_count, 4)
+            for index in range(track.frame_count):
+                data = stream.nextFrame()
+                timestamp, size, payloads = track.frame(index)
+                self.assertEqual(size, len(data))
+                self.assertEqual(timestamp, mediaTimestamp(index + 1, 20))
+                fragments = handler.fragment_frame(data, index + 1)
+                self.assertEqual(len(payloads), len(fragments))
+                for seq, (payload, (header, chunk)) in enumerate(zip(payloads, fragments)):
+                    live = RtpPacket()
+                    live.encode(2, 0, 0, 0, seq, 0, 26, 0, header + chunk,
+                                timestamp=timestamp, sendTime=12.5)
+                    hinted = rtp_header(seq, timestamp, 12.5) + bytes(payload)
+                    self.assertEqual(hinted, bytes(live.getPacket()))
+            del payloads, payload
+        finally:
+            stream.file.close()
+            track.close()
+        print(f"✓ Hinted packets identical to live packetizer")
+    
+    def test_stale_or_mismatched_hint_ignored(self):
+        """Test hint files are only used when fresh and matching the session."""
+        from PacketCache import build_hint_file, find_hint_track
+        from VideoStream import VideoStream
+        build_hint_file(self.media, VideoStream(self.media), 20)
+        payload_size = FragmentationHandler.MAX_PAYLOAD_SIZE
+        self.assertIsNotNone(find_hint_track(self.media, 20, payload_size))
+        self.assertIsNone(find_hint_track(self.media, 30, payload_size))
+        self.assertIsNone(find_hint_track(self.media, 20, 1000))
+        
+        stat = os.stat(self.media)
+        os.utime(self.media, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertIsNone(find_hint_track(self.media, 20, payload_size))
+        print(f"✓ Stale and mismatched hint files ignored")
+
+
+class TestStageProfiler(unittest.TestCase):
+    """Test send-path stage profiling."""
+    
+    def test_disabled_records_nothing(self):
+        """Test a disabled profiler never starts timing."""
+        profiler = StageProfiler()
+        t = profiler.mark()
+        t = profiler.record('read', t)
+        self.assertEqual(t, 0)
+        self.assertEqual(sum(profiler.counts.values()), 0)
+        print(f"✓ Disabled profiler records nothing")
+    
+    def test_stage_timing_and_collapsed_output(self):
+        """Test per-stage counters and flamegraph-compatible lines."""
+        profiler = StageProfiler(session=123456, sample_every=1)
+        set_profiling(True, [profiler])
+        t = profiler.mark()
+        for stage in STAGES:
+            time.sleep(0.002)
+            t = profiler.record(stage, t)
+        set_profiling(False, [profiler])
+        
+        stats = profiler.get_stats()
+        for stage in STAGES:
+            self.assertGreaterEqual(stats[f'{stage}_total_ms'], 1.5)
+        lines = profiler.collapsed()
+        self.assertEqual(len(lines), len(STAGES))
+        self.assertTrue(lines[0].startswith("session_123456;sendRtp;read "))
+        self.assertGreater(int(lines[0].split()[-1]), 1500)
+        
+        import tempfile, os
+        with tempfile.TemporaryDirectory() as tmp:
+            path = dump_collapsed(os.path.join(tmp, "out.folded"), [profiler])
+            with open(path) as f:
+                self.assertEqual(f.read().splitlines(), lines)
+        print(f"✓ Collapsed stacks: {lines[0]}")
+    
+    def test_deadline_misses(self):
+        """Test frames finishing after their slot are counted."""
+        profiler = StageProfiler()
+        profiler.record_frame(0.5)  # Off: nothing is counted
+        self.assertEqual((profiler.frames, profiler.deadline_misses), (0, 0))
+        set_profiling(True, [profiler])
+        for lateness in (-0.01, 0.0, 0.005, 0.02):
+            profiler.record_frame(lateness)
+        self.assertEqual(profiler.frames, 4)
+        self.assertEqual(profiler.deadline_misses, 2)
+        self.assertAlmostEqual(profiler.get_stats()['max_lateness_ms'], 20.0)
+        print(f"✓ Deadline misses: {profiler.deadline_misses}/{profiler.frames}")
+    
+    def test_sampling(self):
+        """Test only one frame in sample_every is timed."""
+        profiler = StageProfiler(sample_every=4)
+        set_profiling(True, [profiler])
+        starts = [profiler.mark() for _ in range(8)]
+        self.assertEqual([bool(t) for t in starts], [True, False, False, False] * 2)
+        print(f"✓ Sampled 2 of 8 frames")
+
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test rate-limited, queued structured logging."""
+    
+    def tearDown(self):
+        shutdown_logging()
+        import logging
+        logging.getLogger("streaming").handlers = []
+    
+    def test_rate_limit_and_fields(self):
+        """Test per-template rate limiting and key=value output."""
+        import io
+        stream = io.StringIO()
+        setup_logging(stream=stream, rate=0.001, burst=3)
+        log = get_logger("test")
+        for i in range(100):
+            log.warning("RTP send failed", session=123456, frame=i)
+        log.info("processing PLAY", session=123456)
+        shutdown_logging()
+        
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('msg="RTP send failed" session=123456 frame=0', lines[0])
+        self.assertIn('level=INFO', lines[3])
+        print(f"✓ 101 records rate limited to {len(lines)} lines")
+    
+    def test_suppressed_count_reported(self):
+        """Test the next allowed record reports how many were suppressed."""
+        limiter = RateLimitFilter(rate=1000, burst=1)
+        key = ("streaming.test", "msg")
+        self.assertEqual(limiter.check(key), 0)
+        self.assertIsNone(limiter.check(key))
+        time.sleep(0.01)
+        self.assertEqual(limiter.check(key), 1)
+        print(f"✓ Suppressed count carried to next record")
+
+
 class TestRtpPacket(unittest.TestCase):
     """Test RTP packet functionality."""
     
@@ -194,6 +1497,206 @@ class TestRtpPacket(unittest.TestCase):
         total_size = packet.getPacketSize()
         self.assertEqual(total_size, 12 + len(payload))
         print(f"✓ Packet size calculated: {total_size} bytes")
+    
+    def test_media_clock_timestamp(self):
+        """Test 90 kHz media timestamps derived from frame index."""
+        packet = RtpPacket()
+        packet.encode(2, 0, 0, 0, 1, 0, 26, 0, b"x",
+                      timestamp=mediaTimestamp(30, 30))
+        
+        packet2 = RtpPacket()
+        packet2.decode(packet.getPacket())
+        self.assertEqual(packet2.timestamp(), 90000)
+        self.assertEqual(mediaTimestamp(1, 30) - mediaTimestamp(0, 30), 3000)
+        print(f"✓ Media clock timestamp: {packet2.timestamp()}")
+    
+    def test_send_time_extension(self):
+        """Test RFC 5285 send-time header extension round trip."""
+        packet = RtpPacket()
+        payload = b"Payload after extension"
+        packet.encode(2, 0, 0, 0, 7, 1, 26, 0, payload,
+                      timestamp=3000, sendTime=1234.567891)
+        
+        packet2 = RtpPacket()
+        packet2.decode(packet.getPacket())
+        self.assertEqual(packet2.extensionBit(), 1)
+        self.assertAlmostEqual(packet2.sendTime(), 1234.567891, places=6)
+        self.assertEqual(packet2.getPayload(), payload)
+        self.assertEqual(packet2.seqNum(), 7)
+        print(f"✓ Send-time extension decoded: {packet2.sendTime():.6f}s")
+
+
+class TestJitterBuffer(unittest.TestCase):
+    """Test adaptive jitter buffer playout."""
+    
+    def setUp(self):
+        self.buffer = JitterBuffer(min_delay=0.02, max_delay=0.5)
+    
+    def test_reorders_by_timestamp(self):
+        """Test frames are played in RTP timestamp order."""
+        self.buffer.push(mediaTimestamp(1, 30), b'f1', arrival=0.00)
+        self.buffer.push(mediaTimestamp(0, 30), b'f0', arrival=0.01)
+        self.buffer.push(mediaTimestamp(2, 30), b'f2', arrival=0.07)
+        
+        played = []
+        now = 0.0
+        while len(played) < 3 and now < 1.0:
+            frame = self.buffer.pop(now)
+            if frame:
+                played.append(frame.data)
+            now += 0.005
+        self.assertEqual(played, [b'f0', b'f1', b'f2'])
+        print(f"✓ Jitter buffer reordered frames: {played}")
+    
+    def test_not_due_before_deadline(self):
+        """Test frames are held until their playout deadline."""
+        self.buffer.push(0, b'f0', arrival=10.0)
+        self.assertIsNone(self.buffer.pop(10.0))
+        self.assertIsNotNone(self.buffer.pop(10.0 + self.buffer.target_delay))
+        print(f"✓ Frame held for target delay {self.buffer.target_delay * 1000:.0f}ms")
+    
+    def test_late_frames_dropped(self):
+        """Test frames arriving after a newer frame was played are dropped."""
+        self.buffer.push(mediaTimestamp(1, 30), b'f1', arrival=0.0)
+        self.assertIsNotNone(self.buffer.pop(1.0))
+        accepted = self.buffer.push(mediaTimestamp(0, 30), b'f0', arrival=1.0)
+        self.assertFalse(accepted)
+        self.assertEqual(self.buffer.get_stats()['frames_dropped_late'], 1)
+        print(f"✓ Late frame dropped")
+    
+    def test_target_delay_follows_jitter(self):
+        """Test that bursty arrival raises the target delay."""
+        arrival = 0.0
+        for i in range(60):
+            # Alternate early and late arrivals around the 30 fps cadence
+            arrival = i / 30 + (0.04 if i % 2 else 0.0)
+            self.buffer.push(mediaTimestamp(i, 30), b'f', arrival=arrival)
+        self.assertGreater(self.buffer.target_delay, self.buffer.min_delay)
+        print(f"✓ Target delay adapted to {self.buffer.target_delay * 1000:.1f}ms")
+    
+    def test_timestamp_wraparound(self):
+        """Test ordering across 32-bit RTP timestamp wrap."""
+        self.buffer.push(0xFFFFF000, b'before', arrival=0.0)
+        self.buffer.push(0x00000800, b'after', arrival=0.03)
+        first = self.buffer.pop(1.0)
+        self.assertEqual(first.data, b'after')  # Newest due frame wins
+        self.assertEqual(self.buffer.get_stats()['frames_dropped_late'], 1)
+        self.assertEqual(self.buffer.get_stats()['frames_skipped'], 0)  # No catch-up
+        print(f"✓ Timestamp wrap-around handled")
+    
+    def test_catch_up_jumps_to_newest(self):
+        """Test catch-up mode skips the backlog and reports it."""
+        skipped = []
+        buffer = JitterBuffer(catch_up_threshold=0.2, on_skip=skipped.append)
+        for i in range(15):
+            # Half a second of frames delivered in one burst
+            buffer.push(mediaTimestamp(i, 30), b'f%d' % i, arrival=1.0)
+        frame = buffer.pop(1.0)
+        self.assertEqual(frame.data, b'f14')
+        self.assertEqual(sum(skipped), 14)
+        self.assertEqual(buffer.get_stats()['frames_skipped'], 14)
+        self.assertEqual(buffer.get_stats()['frames_dropped_late'], 0)
+        self.assertEqual(len(buffer), 0)
+        print(f"✓ Catch-up skipped {sum(skipped)} frames")
+    
+    def test_reset_keeps_learned_delay(self):
+        """Test a resume reset keeps the adapted target delay."""
+        for i in range(60):
+            self.buffer.push(mediaTimestamp(i, 30), b'f', arrival=i / 30 + (0.04 if i % 2 else 0.0))
+        learned = self.buffer.target_delay
+        self.buffer.reset(keep_delay=True)
+        self.assertEqual((len(self.buffer), self.buffer.target_delay), (0, learned))
+        self.buffer.reset()
+        self.assertEqual(self.buffer.target_delay, self.buffer.min_delay)
+        print(f"✓ Target delay {learned * 1000:.1f}ms kept across pause")
+    
+    def test_fast_start_burst_playout(self):
+        """Test a burst plays from its first frame and does not skew the clock."""
+        self.buffer.expect_burst(0.5)
+        for i in range(10):
+            # Half a second of 30 fps media delivered 4x faster than real time
+            self.buffer.push(mediaTimestamp(i, 30), b'f%d' % i, arrival=1.0 + i / 120)
+        self.assertEqual(self.buffer.pop(1.0).data, b'f0')
+        self.assertIsNone(self.buffer.pop(1.01))
+        # Frame 9 is due where real-time delivery would have put it
+        self.assertAlmostEqual(self.buffer.time_until_next(1.0), 1 / 30 + self.buffer.target_delay)
+        self.assertEqual(self.buffer.jitter, 0.0)
+        self.buffer.push(mediaTimestamp(15, 30), b'f15', arrival=1.5)
+        self.assertLess(self.buffer.jitter, 0.005)
+        print(f"✓ Burst played from first frame, jitter {self.buffer.jitter * 1000:.1f}ms")
+
+
+@unittest.skipIf(Image is None, "Pillow not installed")
+class TestFrameDecoder(unittest.TestCase):
+    """Test off-main-thread decode and resize."""
+    
+    def make_frame(self, size=(1920, 1080)):
+        out = BytesIO()
+        Image.new("RGB", size, (10, 120, 200)).save(out, format="JPEG")
+        return out.getvalue()
+    
+    def test_decode_fits_target(self):
+        """Test that HD frames are decoded down to the widget size."""
+        image = decode_jpeg(self.make_frame(), (512, 288))
+        self.assertLessEqual(image.width, 512)
+        self.assertLessEqual(image.height, 288)
+        print(f"✓ 1080p frame decoded to {image.width}x{image.height}")
+    
+    def test_memory_decode_matches_file(self):
+        """Test the in-memory decode gives the same pixels as the cache-file round trip."""
+        import tempfile
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        
+        def open_cached(data):
+            # What Client.openCachedFrame does in --cache-frames mode
+            path = os.path.join(tmp.name, "cache-1.jpg")
+            with open(path, "wb") as f:
+                f.write(data)
+            return Image.open(path)
+        
+        gradient = Image.linear_gradient("L").resize((1280, 720))
+        frame = BytesIO()
+        Image.merge("RGB", (gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT),
+                            gradient.transpose(Image.FLIP_TOP_BOTTOM))).save(frame, format="JPEG")
+        frame = frame.getvalue()
+        for target in ((1280, 720), (512, 288)):
+            memory = decode_jpeg(frame, target)
+            cached = decode_jpeg(frame, target, opener=open_cached)
+            self.assertEqual(memory.size, cached.size)
+            self.assertEqual(memory.tobytes(), cached.tobytes())
+        
+        decoded = []
+        for opener in (None, open_cached):
+            decoder = FrameDecoder(workers=1, target_size=(512, 288), opener=opener)
+            try:
+                decoder.submit(frame, 1.0)
+                deadline = time.time() + 5
+                while decoder.pending() and time.time() < deadline:
+                    time.sleep(0.01)
+                decoded.append(decoder.take_ready().image)
+            finally:
+                decoder.shutdown()
+        self.assertEqual(decoded[0].size, decoded[1].size)
+        self.assertEqual(decoded[0].tobytes(), decoded[1].tobytes())
+        print(f"✓ In-memory decode identical to cache file at {decoded[0].size}")
+    
+    def test_pool_returns_newest(self):
+        """Test that the worker pool publishes the newest decoded frame."""
+        decoder = FrameDecoder(workers=2, target_size=(320, 180))
+        try:
+            for send_time in (1.0, 2.0, 3.0):
+                decoder.submit(self.make_frame((640, 360)), send_time)
+            deadline = time.time() + 5
+            while decoder.pending() and time.time() < deadline:
+                time.sleep(0.01)
+            frame = decoder.take_ready()
+            self.assertIsNotNone(frame)
+            self.assertEqual(frame.send_time, 3.0)
+            self.assertIsNone(decoder.take_ready())
+        finally:
+            decoder.shutdown()
+        print(f"✓ Decoder pool returned newest frame")
 
 
 class TestHDVideoStream(unittest.TestCase):
@@ -212,6 +1715,52 @@ class TestHDVideoStream(unittest.TestCase):
         print(f"✓ Resolution presets verified")
 
 
+class TestBenchmarkSuite(unittest.TestCase):
+    """Test benchmark fixtures and baseline comparison."""
+    
+    def test_fixtures_parse(self):
+        """Test synthetic MJPEG fixtures split into the right frames."""
+        import os, tempfile
+        from HDVideoStream import HDVideoStream
+        from VideoStream import VideoStream
+        from benchmark_streaming import make_mjpeg_frame, write_mjpeg_fixture
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            for stream_class, prefixed in ((HDVideoStream, False), (VideoStream, True)):
+                path = os.path.join(tmp, f"{stream_class.__name__}.mjpeg")
+                write_mjpeg_fixture(path, 30_000, frames=5, length_prefixed=prefixed)
+                stream = stream_class(path)
+                frames = []
+                while True:
+                    frame = stream.nextFrame()
+                    if not frame:
+                        break
+                    frames.append(frame)
+                stream.file.close()
+                self.assertEqual(len(frames), 5)
+                self.assertEqual(frames[1], make_mjpeg_frame(30_000 + 97, seed=1))
+        print(f"✓ Fixtures parse with HDVideoStream and VideoStream")
+    
+    def test_regressions_flagged(self):
+        """Test metrics below baseline tolerance are flagged."""
+        from benchmark_streaming import compare_to_baseline
+        baseline = {'parse_sd_fps': 1000.0, 'packetize_sd_pps': 5000.0, 'removed': 1.0}
+        results = {'parse_sd_fps': 900.0, 'packetize_sd_pps': 3000.0}
+        regressions = compare_to_baseline(results, baseline, tolerance=0.15)
+        self.assertEqual([r[0] for r in regressions], ['packetize_sd_pps'])
+        print(f"✓ Regression flagged: {regressions[0][0]} {regressions[0][3]:+.0%}")
+    
+    def test_session_memory_measured(self):
+        """Test per-session analytics memory is measured, histograms and window included."""
+        from benchmark_streaming import bench_session_memory
+        memory = bench_session_memory(sessions=5)
+        self.assertLess(memory['window_bytes'], memory['object_window_bytes'])
+        self.assertGreater(memory['session_bytes'],
+                           memory['histogram_bytes'] + memory['window_bytes'])
+        print(f"✓ Analytics session: {memory['session_bytes'] / 1024:.1f} KB "
+              f"({memory['histogram_bytes'] / 1024:.1f} KB histograms)")
+
+
 def run_performance_test():
     """Run performance test for fragmentation."""
     print("\n" + "="*60)
@@ -292,8 +1841,27 @@ if __name__ == "__main__":
     
     suite.addTests(loader.loadTestsFromTestCase(TestFragmentation))
     suite.addTests(loader.loadTestsFromTestCase(TestNetworkAnalytics))
+    suite.addTests(loader.loadTestsFromTestCase(TestLatencyHistogram))
+    suite.addTests(loader.loadTestsFromTestCase(TestMetricsExporter))
+    suite.addTests(loader.loadTestsFromTestCase(TestNetworkImpairment))
+    suite.addTests(loader.loadTestsFromTestCase(TestFrameCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestFramePrefetcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestFrameSource))
+    suite.addTests(loader.loadTestsFromTestCase(TestLiveSource))
+    suite.addTests(loader.loadTestsFromTestCase(TestFrameScheduler))
+    suite.addTests(loader.loadTestsFromTestCase(TestSessionPipeline))
+    suite.addTests(loader.loadTestsFromTestCase(TestMtuNegotiation))
+    suite.addTests(loader.loadTestsFromTestCase(TestSocketOptions))
+    suite.addTests(loader.loadTestsFromTestCase(TestJpegRtp))
+    suite.addTests(loader.loadTestsFromTestCase(TestFrameAssembler))
+    suite.addTests(loader.loadTestsFromTestCase(TestPacketCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestStageProfiler))
+    suite.addTests(loader.loadTestsFromTestCase(TestStructuredLogging))
     suite.addTests(loader.loadTestsFromTestCase(TestRtpPacket))
+    suite.addTests(loader.loadTestsFromTestCase(TestJitterBuffer))
+    suite.addTests(loader.loadTestsFromTestCase(TestFrameDecoder))
     suite.addTests(loader.loadTestsFromTestCase(TestHDVideoStream))
+    suite.addTests(loader.loadTestsFromTestCase(TestBenchmarkSuite))
     
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)